@@ -0,0 +1,133 @@
+"""
+Menu images, validated and loaded into memory once at startup.
+
+Every image in utils.IMAGE_PATHS is read when the bot starts. A file that is
+there but isn't a usable photo stops startup, like a broken catalog file; a
+missing one is skipped, and its menus fall back to text as before. After
+that, sends never touch the disk: they get the asset's bytes from memory,
+the same immutable bytes object every time.
+
+The PNGs are stored losslessly, but Telegram recompresses every photo to
+JPEG anyway. So when Pillow is installed, each image is re-encoded as an
+optimized JPEG (downscaled to ASSET_MAX_SIDE if larger) and that is what
+gets uploaded, if it comes out smaller. Images with transparency are kept
+as they are. Without Pillow the original files are sent.
+"""
+
+import hashlib
+import io
+import os
+from typing import Dict, Iterable, Optional
+
+import config
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+JPEG_SIGNATURE = b"\xff\xd8\xff"
+
+# Telegram's limits for an uploaded photo
+PHOTO_MAX_BYTES = 10 * 1024 * 1024
+PHOTO_MAX_DIMENSIONS = 10000  # width + height
+
+
+class Asset:
+    """One image as it is sent."""
+
+    __slots__ = ("path", "filename", "data", "digest", "original_size")
+
+    def __init__(self, path: str, filename: str, data: bytes, original_size: int):
+        self.path = path
+        # Name the upload is sent under; its extension matches `data`
+        self.filename = filename
+        self.data = data
+        # Content hash of `data`, the key of its cached Telegram file_id
+        self.digest = hashlib.sha256(data).hexdigest()
+        self.original_size = original_size
+
+
+def validate(path: str, data: bytes):
+    """Raise ValueError if `data` can't be sent as a Telegram photo."""
+    if not data.startswith((PNG_SIGNATURE, JPEG_SIGNATURE)):
+        raise ValueError(f"{path} is not a PNG or JPEG image")
+    if len(data) > PHOTO_MAX_BYTES:
+        raise ValueError(f"{path} is {len(data)} bytes, over Telegram's {PHOTO_MAX_BYTES}-byte photo limit")
+    if Image is not None:
+        try:
+            with Image.open(io.BytesIO(data)) as image:
+                image.verify()
+                width, height = image.size
+        except Exception as e:
+            raise ValueError(f"{path} is not a valid image: {e}") from e
+        if width + height > PHOTO_MAX_DIMENSIONS:
+            raise ValueError(f"{path} is {width}x{height}, over Telegram's photo size limit")
+
+
+def optimize(data: bytes) -> Optional[bytes]:
+    """Re-encode an image as a JPEG for sending, or None if that doesn't make it smaller."""
+    if Image is None:
+        return None
+    with Image.open(io.BytesIO(data)) as image:
+        if image.mode in ("RGBA", "LA", "PA") or "transparency" in image.info:
+            return None
+        image = image.convert("RGB")
+    if max(image.size) > config.ASSET_MAX_SIDE:
+        image.thumbnail((config.ASSET_MAX_SIDE, config.ASSET_MAX_SIDE), Image.LANCZOS)
+    out = io.BytesIO()
+    image.save(out, "JPEG", quality=config.ASSET_JPEG_QUALITY, optimize=True, progressive=True)
+    optimized = out.getvalue()
+    return optimized if len(optimized) < len(data) else None
+
+
+def load_asset(path: str) -> Asset:
+    with open(path, 'rb') as f:
+        data = f.read()
+    validate(path, data)
+    optimized = optimize(data)
+    if optimized is None:
+        return Asset(path, os.path.basename(path), data, len(data))
+    filename = os.path.splitext(os.path.basename(path))[0] + ".jpg"
+    return Asset(path, filename, optimized, len(data))
+
+
+class AssetBundle:
+    """Loaded assets by path."""
+
+    def __init__(self, paths: Iterable[str]):
+        self.assets: Dict[str, Asset] = {}
+        for path in paths:
+            if not os.path.exists(path):
+                print(f"Image {path} not found, its menus will be sent as text")
+                continue
+            self.assets[path] = load_asset(path)
+
+    def get(self, path: str) -> Optional[Asset]:
+        return self.assets.get(path)
+
+
+_bundle: Optional[AssetBundle] = None
+
+
+def load() -> AssetBundle:
+    """Load (or reload) every menu image. Raises ValueError for an unusable one."""
+    global _bundle
+    import utils
+
+    if Image is None:
+        print("Pillow is not installed, images are sent unoptimized")
+    bundle = AssetBundle(utils.IMAGE_PATHS.values())
+    _bundle = bundle
+    return bundle
+
+
+def get(path: str) -> Optional[Asset]:
+    """Get a loaded image, or None if there is no such image."""
+    bundle = _bundle if _bundle is not None else load()
+    return bundle.get(path)
+
+
+def exists(path: str) -> bool:
+    return get(path) is not None
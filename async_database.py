@@ -0,0 +1,130 @@
+"""
+Async wrappers around the database module for use in handlers.
+
+Storage backends do blocking file/SQLite I/O, so every call is run in a
+dedicated thread pool instead of on the asyncio event loop. One user's slow
+save then no longer stalls updates from everyone else.
+"""
+
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple, TypeVar
+
+import config
+import database
+from collection import Page, CollectionSummary
+from models import User, Card
+
+T = TypeVar("T")
+
+_executor = ThreadPoolExecutor(max_workers=config.DATABASE_THREADS, thread_name_prefix="database")
+
+
+async def run(func: Callable[..., T], *args, **kwargs) -> T:
+    """Run a blocking function (usually one that touches the database) in the database thread pool."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, functools.partial(func, *args, **kwargs))
+
+
+async def transaction(user_id: int, func: Callable[[database.Transaction], T]) -> T:
+    """Run `func(tx)` inside `database.transaction(user_id)` in the thread pool.
+
+    Returns whatever `func` returns; nothing is written if it raises.
+    """
+    def run_transaction():
+        with database.transaction(user_id) as tx:
+            return func(tx)
+    return await run(run_transaction)
+
+
+async def close():
+    """Flush and close the storage backend, then stop the thread pool."""
+    await run(database.close)
+    _executor.shutdown(wait=True)
+
+
+async def get_user(user_id: int) -> User:
+    """Get user data, create if doesn't exist."""
+    return await run(database.get_user, user_id)
+
+
+async def update_user(user_id: int, **kwargs):
+    """Update user data."""
+    return await run(database.update_user, user_id, **kwargs)
+
+
+async def add_coins(user_id: int, amount: int) -> int:
+    """Add coins to user."""
+    return await run(database.add_coins, user_id, amount)
+
+
+async def get_user_cards(user_id: int) -> List[Card]:
+    """Get all cards for a user."""
+    return await run(database.get_user_cards, user_id)
+
+
+async def add_card(user_id: int, gadget_name: str, category: str, purchase_price: int, rarity: str) -> int:
+    """Add a new card to user's collection. Returns card_id."""
+    return await run(database.add_card, user_id, gadget_name, category, purchase_price, rarity)
+
+
+async def add_cards(user_id: int, gadget_list: List[Dict], draw_seeds: Optional[List[int]] = None) -> List[int]:
+    """Add a card for each gadget in one write. Returns the card_ids in order."""
+    return await run(database.add_cards, user_id, gadget_list, draw_seeds)
+
+
+async def remove_card(user_id: int, card_id: int) -> bool:
+    """Remove a card from user's collection. Returns True if removed."""
+    return await run(database.remove_card, user_id, card_id)
+
+
+async def get_card(user_id: int, card_id: int) -> Optional[Card]:
+    """Get a specific card by ID."""
+    return await run(database.get_card, user_id, card_id)
+
+
+async def get_cards(user_id: int, card_ids: List[int]) -> List[Card]:
+    """Get several cards by ID in one read. Missing IDs are skipped."""
+    return await run(database.get_cards, user_id, card_ids)
+
+
+async def update_card(user_id: int, card_id: int, **kwargs):
+    """Update card data."""
+    return await run(database.update_card, user_id, card_id, **kwargs)
+
+
+async def get_available_pc_parts(user_id: int) -> Dict[str, List[Card]]:
+    """Get available PC parts (not in a PC) grouped by category."""
+    return await run(database.get_available_pc_parts, user_id)
+
+
+async def browse_cards(user_id: int, gadget_type: str, rarity: str, sort: str,
+                       cursor_id: Optional[int] = None, backward: bool = False) -> Page:
+    """Get a page of user's free cards of a gadget type and rarity (see collection.py)."""
+    return await run(database.browse_cards, user_id, gadget_type, rarity, sort, cursor_id, backward)
+
+
+async def get_summary(user_id: int) -> CollectionSummary:
+    """Get the card counts and collection value of a user."""
+    return await run(database.get_summary, user_id)
+
+
+async def get_built_pcs(user_id: int) -> List[Card]:
+    """Get all built PCs for a user."""
+    return await run(database.get_built_pcs, user_id)
+
+
+async def get_built_pcs_with_components(user_id: int) -> List[Tuple[Card, List[Card]]]:
+    """Get all built PCs for a user as (pc_card, component_cards) pairs."""
+    return await run(database.get_built_pcs_with_components, user_id)
+
+
+async def get_pc_with_components(user_id: int, pc_id: int) -> Tuple[Optional[Card], List[Card]]:
+    """Get a PC and its component cards. Returns (None, []) if there is no such PC."""
+    return await run(database.get_pc_with_components, user_id, pc_id)
+
+
+async def user_has_gadget(user_id: int, gadget_name: str) -> bool:
+    """Check if user already has a specific gadget."""
+    return await run(database.user_has_gadget, user_id, gadget_name)
@@ -0,0 +1,1034 @@
+"""
+Offline benchmarks for the Telegram Gadget Card Bot.
+
+Run against a throwaway data directory, never the live one:
+
+    python benchmarks.py latency [--backend json] [--users 200] [--cards 20]
+    python benchmarks.py card-format [--users 1000] [--cards 100]
+    python benchmarks.py memory [--users 10000] [--cards 100]
+    python benchmarks.py catalog [--size 50000] [--draws 100000]
+    python benchmarks.py draws [--draws 20000000] [--seed 1]
+    python benchmarks.py pc-specs [--builds 1000000]
+    python benchmarks.py auto-build [--parts 3000]
+    python benchmarks.py collection [--cards 100000]
+    python benchmarks.py callbacks [--presses 200000]
+    python benchmarks.py assets [--sends 1000]
+    python benchmarks.py card-render [--faces 40] [--font DejaVuSans-Bold.ttf]
+    python benchmarks.py send-scheduler [--seconds 5] [--broadcast 300]
+    python benchmarks.py edits [--users 50] [--bursts 10]
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+# The benchmarks never talk to Telegram, but config insists on a token
+os.environ.setdefault("BOT_TOKEN", "benchmark")
+
+
+def percentile(values, fraction):
+    """Get the value below which `fraction` of the sorted values fall."""
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(fraction * len(ordered)))
+    return ordered[index]
+
+
+def format_latencies(name, values):
+    return (
+        f"{name:<10} n={len(values):<6} "
+        f"p50={percentile(values, 0.50) * 1000:8.2f}ms "
+        f"p99={percentile(values, 0.99) * 1000:8.2f}ms "
+        f"max={max(values) * 1000:8.2f}ms"
+    )
+
+
+def populate(users, cards_per_user):
+    """Fill the configured backend with random users and cards. Returns user ids."""
+    import database
+    import gadgets
+
+    user_ids = list(range(1, users + 1))
+    batch = {}
+    for user_id in user_ids:
+        cards = []
+        for i in range(cards_per_user):
+            gadget = random.choice(gadgets.get_catalog().gadgets)
+            cards.append(database.new_card(
+                database.generate_card_id(i), gadget["name"], gadget["category"], gadget["price"], gadget["rarity"]
+            ))
+        batch[user_id] = (database.new_user(), cards)
+    storage = database.get_storage()
+    storage.write_users(batch)
+    storage.flush()
+    return user_ids
+
+
+async def simulate_load(user_ids, clients, requests, think_time, use_async):
+    """Simulate players pressing buttons concurrently.
+
+    Each client waits a random think time, then sends a request: a card view
+    (read), a card draw (write) or a help screen (no database access). Latency
+    is measured from when the request should have arrived, so time spent
+    queued behind a blocked event loop counts.
+    """
+    import async_database
+    import database
+    import gadgets
+
+    latencies = {"read": [], "write": [], "no-db": []}
+
+    def draw(tx, gadget):
+        tx.add_card(gadget["name"], gadget["category"], gadget["price"], gadget["rarity"])
+        tx.update_user(last_card_time=time.time())
+
+    async def handle(kind, user_id):
+        if kind == "read":
+            if use_async:
+                cards = await async_database.get_user_cards(user_id)
+            else:
+                cards = database.get_user_cards(user_id)
+            if cards:
+                card_id = random.choice(cards).card_id
+                if use_async:
+                    await async_database.get_card(user_id, card_id)
+                else:
+                    database.get_card(user_id, card_id)
+        elif kind == "write":
+            gadget = gadgets.get_random_gadget()
+            if use_async:
+                await async_database.transaction(user_id, lambda tx: draw(tx, gadget))
+            else:
+                with database.transaction(user_id) as tx:
+                    draw(tx, gadget)
+        else:
+            await asyncio.sleep(0)
+
+    async def client():
+        loop = asyncio.get_running_loop()
+        arrival = loop.time()
+        for _ in range(requests):
+            arrival += random.expovariate(1 / think_time)
+            delay = arrival - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            kind = random.choices(["read", "write", "no-db"], weights=[5, 3, 2])[0]
+            await handle(kind, random.choice(user_ids))
+            latencies[kind].append(loop.time() - arrival)
+            arrival = max(arrival, loop.time())
+
+    await asyncio.gather(*(client() for _ in range(clients)))
+    return latencies
+
+
+def run_latency(args):
+    data_dir = tempfile.mkdtemp(prefix="gadget-bench-")
+    os.environ["STORAGE_BACKEND"] = args.backend
+    os.environ["DATA_DIR"] = data_dir
+    os.environ["SQLITE_PATH"] = os.path.join(data_dir, "bot.db")
+    os.environ["SHARD_DIR"] = os.path.join(data_dir, "users")
+
+    import async_database
+    import database
+
+    random.seed(args.seed)
+    print(f"Populating {args.backend} backend in {data_dir}: {args.users} users x {args.cards} cards...")
+    user_ids = populate(args.users, args.cards)
+
+    for label, use_async in (("blocking (before)", False), ("thread pool (after)", True)):
+        random.seed(args.seed)
+        latencies = asyncio.run(simulate_load(user_ids, args.clients, args.requests, args.think, use_async))
+        everything = [value for values in latencies.values() for value in values]
+        print(f"\n{label}:")
+        for kind, values in latencies.items():
+            print("  " + format_latencies(kind, values))
+        print("  " + format_latencies("all", everything))
+
+    asyncio.run(async_database.close())
+    database.close()
+
+
+def random_cards(users, cards_per_user):
+    """Build a user_id -> cards dict of random cards; every tenth card is a PC."""
+    import gadgets
+    import pc_generator
+    from models import Card
+
+    parts = {
+        category: gadgets.get_catalog().find(category=category)
+        for category in ("Graphics Card", "Processor", "Motherboard")
+    }
+    cards = {}
+    for user_id in range(1, users + 1):
+        user_cards = []
+        for i in range(cards_per_user):
+            card_id = 1_700_000_000_000 + i
+            obtained_at = time.time()
+            if i % 10 == 9:
+                gpu, cpu, mb = (random.choice(parts[category]) for category in parts)
+                specs, rarity, spec_price = pc_generator.generate_pc_specs(gpu["rarity"], cpu["rarity"], mb["rarity"])
+                card = Card.create(
+                    card_id, f"Custom Gaming PC ({gpu['name']})", "PC", spec_price, rarity, obtained_at,
+                    components=[card_id - 3, card_id - 2, card_id - 1], specs=specs
+                )
+            else:
+                gadget = random.choice(gadgets.get_catalog().gadgets)
+                card = Card.create(card_id, gadget["name"], gadget["category"], gadget["price"], gadget["rarity"], obtained_at)
+            user_cards.append(card)
+        cards[str(user_id)] = user_cards
+    return cards
+
+
+def measure_file(path):
+    """Return (size in bytes, parse seconds, bytes allocated by the parsed data)."""
+    size = os.path.getsize(path)
+    start = time.perf_counter()
+    with open(path, 'r') as f:
+        json.load(f)
+    parse_time = time.perf_counter() - start
+
+    tracemalloc.start()
+    with open(path, 'r') as f:
+        data = json.load(f)
+    memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del data
+    return size, parse_time, memory
+
+
+def run_card_format(args):
+    import storage
+    from models import Card, cards_to_json
+
+    random.seed(args.seed)
+    total = args.users * args.cards
+    print(f"Generating {args.users} users x {args.cards} cards ({total} cards)...")
+    cards = random_cards(args.users, args.cards)
+    data_dir = tempfile.mkdtemp(prefix="gadget-bench-")
+
+    full_path = os.path.join(data_dir, "cards-full.json")
+    with open(full_path, 'w') as f:
+        json.dump({user_id: [card.to_dict() for card in user_cards] for user_id, user_cards in cards.items()}, f, indent=2)
+    packed_path = os.path.join(data_dir, "cards-packed.json")
+    storage.atomic_write_json(packed_path, {user_id: cards_to_json(user_cards) for user_id, user_cards in cards.items()})
+
+    results = {}
+    for label, path in (("full, indent=2 (before)", full_path), ("packed (after)", packed_path)):
+        size, parse_time, memory = measure_file(path)
+        results[label] = (size, parse_time, memory)
+        print(
+            f"{label:<24} file={size / 1024 / 1024:8.2f}MB ({size / total:6.1f}B/card) "
+            f"parse={parse_time * 1000:8.1f}ms "
+            f"memory={memory / 1024 / 1024:8.2f}MB ({memory / total:6.1f}B/card)"
+        )
+    before, after = results.values()
+    print(
+        f"\nfile size x{before[0] / after[0]:.1f} smaller, parse x{before[1] / after[1]:.1f} faster, "
+        f"memory x{before[2] / after[2]:.1f} smaller"
+    )
+
+    start = time.perf_counter()
+    for user_cards in cards.values():
+        for card in user_cards:
+            Card.from_packed(card.to_packed())
+    print(f"pack+unpack: {(time.perf_counter() - start) / total * 1e6:.2f}us per card")
+
+
+def run_memory(args):
+    from models import cards_from_json, cards_to_json
+
+    random.seed(args.seed)
+    total = args.users * args.cards
+    print(f"Generating {args.users} users x {args.cards} cards ({total} cards)...")
+    cards = random_cards(args.users, args.cards)
+    full_json = [json.dumps([card.to_dict() for card in user_cards]) for user_cards in cards.values()]
+    packed_json = [json.dumps(cards_to_json(user_cards)) for user_cards in cards.values()]
+    del cards
+
+    # Each representation is built from JSON one user at a time, the way the
+    # backends load it; only what stays referenced counts.
+    representations = (
+        ("dicts (before)", full_json, json.loads),
+        ("packed dicts", packed_json, json.loads),
+        ("Card/PC objects (after)", packed_json, lambda text: cards_from_json(json.loads(text))),
+    )
+    for label, texts, load in representations:
+        tracemalloc.start()
+        loaded = [load(text) for text in texts]
+        memory = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        del loaded
+        print(f"{label:<24} {memory / 1024 / 1024:9.1f}MB  {memory / total:6.1f}B/card")
+
+
+def linear_random_gadget(gadget_list):
+    """The draw as it was before the Catalog: buckets and weights rebuilt on every call."""
+    import gadgets
+
+    rarities = list(gadgets.RARITY_PROBABILITIES.keys())
+    weights = list(gadgets.RARITY_PROBABILITIES.values())
+    selected_rarity = random.choices(rarities, weights=weights, k=1)[0]
+    gadgets_by_rarity = [g for g in gadget_list if g["rarity"] == selected_rarity]
+    if gadgets_by_rarity:
+        return random.choice(gadgets_by_rarity)
+    return random.choice(gadget_list)
+
+
+def linear_gadget_by_name(gadget_list, name):
+    """The name lookup as it was before the Catalog."""
+    for gadget in gadget_list:
+        if gadget["name"] == name:
+            return gadget
+    return None
+
+
+def synthetic_catalog(size):
+    """Make a catalog of `size` gadgets by repeating the real one under new names."""
+    import gadgets
+
+    catalog_gadgets = gadgets.get_catalog().gadgets
+    return [
+        {**gadget, "name": f"{gadget['name']} #{i}"}
+        for i in range(size // len(catalog_gadgets) + 1)
+        for gadget in catalog_gadgets
+    ][:size]
+
+
+def run_catalog(args):
+    import gadgets
+
+    random.seed(args.seed)
+    for gadget_list in (gadgets.get_catalog().gadgets, synthetic_catalog(args.size)):
+        start = time.perf_counter()
+        catalog = gadgets.Catalog(gadget_list, gadgets.RARITY_PROBABILITIES)
+        build_time = time.perf_counter() - start
+        names = [random.choice(gadget_list)["name"] for _ in range(1000)]
+        print(f"\n{len(gadget_list)} gadgets (Catalog built in {build_time * 1000:.1f}ms):")
+
+        # The linear versions get fewer iterations so big catalogs finish in reasonable time
+        linear_draws = max(100, args.draws * 100 // len(gadget_list))
+        timings = (
+            ("draw, rebuild per call (before)", linear_draws, lambda: linear_random_gadget(gadget_list)),
+            ("draw, alias sampler (after)", args.draws, catalog.random_gadget),
+            ("name lookup, linear (before)", min(len(names), linear_draws),
+             lambda: linear_gadget_by_name(gadget_list, random.choice(names))),
+            ("name lookup, index (after)", args.draws, lambda: catalog.get(random.choice(names))),
+        )
+        for label, n, func in timings:
+            start = time.perf_counter()
+            for _ in range(n):
+                func()
+            elapsed = time.perf_counter() - start
+            print(f"  {label:<34} {elapsed / n * 1e6:10.2f}us/op  {n / elapsed:12.0f} ops/s")
+
+
+def chi_square_p_value(statistic, dof):
+    """P(X >= statistic) for a chi-square distribution with `dof` degrees of freedom.
+
+    This is the regularized upper incomplete gamma function Q(dof/2, statistic/2),
+    via its series or continued fraction (Numerical Recipes, 6.2).
+    """
+    a, x = dof / 2, statistic / 2
+    if x <= 0:
+        return 1.0
+    log_prefix = a * math.log(x) - x - math.lgamma(a)
+    if x < a + 1:
+        term = total = 1 / a
+        n = a
+        while abs(term) > abs(total) * 1e-15:
+            n += 1
+            term *= x / n
+            total += term
+        return 1 - total * math.exp(log_prefix)
+    tiny = 1e-300
+    b = x + 1 - a
+    c = 1 / tiny
+    d = 1 / b
+    h = d
+    for i in range(1, 1000):
+        an = -i * (i - a)
+        b += 2
+        d = an * d + b
+        d = tiny if abs(d) < tiny else d
+        c = b + an / c
+        c = tiny if abs(c) < tiny else c
+        d = 1 / d
+        h *= d * c
+        if abs(d * c - 1) < 1e-15:
+            break
+    return math.exp(log_prefix) * h
+
+
+def chi_square(observed, expected):
+    """Return (statistic, degrees of freedom, p-value) for observed vs expected counts."""
+    statistic = sum((observed.get(key, 0) - count) ** 2 / count for key, count in expected.items())
+    dof = len(expected) - 1
+    return statistic, dof, chi_square_p_value(statistic, dof)
+
+
+def run_draws(args):
+    import gadgets
+
+    catalog = gadgets.get_catalog()
+    rng = gadgets.DrawRng(args.seed)
+    probabilities = gadgets.RARITY_PROBABILITIES
+    missing = [rarity for rarity in probabilities if not catalog.find(rarity=rarity)]
+    if missing:
+        print(f"Warning: catalog v{catalog.version} has no {', '.join(missing)} gadgets; their draws fall back to any gadget")
+
+    print(f"Drawing {args.draws} gadgets from catalog v{catalog.version} ({len(catalog.gadgets)} gadgets), seed {args.seed}...")
+    gadget_counts = dict.fromkeys(range(len(catalog.gadgets)), 0)
+    positions = {id(gadget): i for i, gadget in enumerate(catalog.gadgets)}
+    seed_time = draw_time = 0.0
+    remaining = args.draws
+    while remaining:
+        batch = min(args.batch, remaining)
+        remaining -= batch
+        start = time.perf_counter()
+        seeds = rng.next_seeds(batch)
+        seed_time += time.perf_counter() - start
+        start = time.perf_counter()
+        drawn = catalog.draw_many(seeds)
+        draw_time += time.perf_counter() - start
+        for gadget in drawn:
+            gadget_counts[positions[id(gadget)]] += 1
+
+    total_time = seed_time + draw_time
+    print(
+        f"\n{args.draws / total_time:12.0f} draws/s including seeds "
+        f"({args.draws / draw_time:.0f} draws/s sampling only, {total_time / args.draws * 1e9:.0f}ns per draw)"
+    )
+
+    # Same seed, same gadget: a stored seed replays its draw
+    seeds = gadgets.DrawRng(args.seed).next_seeds(1000)
+    assert catalog.draw_many(seeds) == [catalog.draw(seed) for seed in seeds]
+
+    rarity_counts = {}
+    for i, count in gadget_counts.items():
+        rarity = catalog.gadgets[i]["rarity"]
+        rarity_counts[rarity] = rarity_counts.get(rarity, 0) + count
+    total_probability = sum(probabilities.values())
+    expected = {rarity: args.draws * probability / total_probability for rarity, probability in probabilities.items()}
+    print(f"\n{'rarity':<10} {'observed':>12} {'expected':>14} {'observed %':>11} {'target %':>9}")
+    for rarity, count in expected.items():
+        observed = rarity_counts.get(rarity, 0)
+        print(
+            f"{rarity:<10} {observed:>12} {count:>14.1f} "
+            f"{observed / args.draws * 100:>10.4f}% {probabilities[rarity] / total_probability * 100:>8.4f}%"
+        )
+
+    statistic, dof, p_value = chi_square(rarity_counts, expected)
+    verdict = "OK" if p_value >= args.alpha else "MISMATCH"
+    print(f"\nrarity chi-square={statistic:.2f} dof={dof} p={p_value:.4f}: {verdict} at alpha={args.alpha}")
+
+    # Within a rarity every gadget should be equally likely
+    weights = catalog._draw_weights()
+    expected = {i: args.draws * weight for i, weight in enumerate(weights)}
+    statistic, dof, p_value = chi_square(gadget_counts, expected)
+    verdict = "OK" if p_value >= args.alpha else "MISMATCH"
+    print(f"per-gadget chi-square={statistic:.2f} dof={dof} p={p_value:.4f}: {verdict} at alpha={args.alpha}")
+
+
+def run_pc_specs(args):
+    import pc_generator
+
+    # tests/test_pc_specs.py checks the table against the legacy generator
+    random.seed(args.seed)
+    builds = [random.choice(list(pc_generator.PC_SPECS_TABLE)) for _ in range(1000)]
+    timings = (
+        ("computed per build (before)", pc_generator.build_pc_specs),
+        ("table lookup (after)", pc_generator.generate_pc_specs),
+    )
+    for label, func in timings:
+        start = time.perf_counter()
+        for i in range(args.builds):
+            func(*builds[i % len(builds)])
+        elapsed = time.perf_counter() - start
+        print(f"  {label:<28} {elapsed / args.builds * 1e9:8.0f}ns per build  {args.builds / elapsed:12.0f} builds/s")
+
+
+def run_auto_build(args):
+    import itertools
+    import gadgets
+    import pc_builder
+    import pc_generator
+    from models import Card
+
+    random.seed(args.seed)
+    catalog = gadgets.get_catalog()
+
+    def random_parts(count):
+        parts = {}
+        for category in pc_builder.PART_CATEGORIES:
+            choices = catalog.find(category=category)
+            parts[category] = []
+            for i in range(count):
+                gadget = random.choice(choices)
+                parts[category].append(Card.create(
+                    len(parts) * count + i, gadget["name"], category, gadget["price"], gadget["rarity"], 0
+                ))
+        return parts
+
+    def brute_force(parts):
+        best = None
+        for gpu, cpu, mb in itertools.product(*parts.values()):
+            _, _, spec_price = pc_generator.generate_pc_specs(gpu.rarity, cpu.rarity, mb.rarity)
+            price = pc_builder.calculate_pc_price(gpu.purchase_price + cpu.purchase_price + mb.purchase_price, spec_price)
+            best = price if best is None else max(best, price)
+        return best
+
+    small = random_parts(min(args.parts, 40))
+    start = time.perf_counter()
+    expected = brute_force(small)
+    brute_time = time.perf_counter() - start
+    start = time.perf_counter()
+    found = pc_builder.plan_builds(small, limit=1)[0][0]
+    top_k_time = time.perf_counter() - start
+    assert found == expected, (found, expected)
+    print(f"{len(small['Processor'])} parts per category: brute force {brute_time * 1000:.1f}ms, top-k {top_k_time * 1000:.2f}ms (same best price {found})")
+
+    parts = random_parts(args.parts)
+    for label, limit in (("best PC", 1), ("auto-build all", None)):
+        start = time.perf_counter()
+        builds = pc_builder.plan_builds(parts, limit=limit)
+        elapsed = time.perf_counter() - start
+        print(f"{args.parts} parts per category, {label}: {len(builds)} PCs in {elapsed * 1000:.1f}ms")
+
+
+def run_collection(args):
+    import collection
+    import gadgets
+    from storage import index_cards
+
+    random.seed(args.seed)
+    cards = random_cards(1, args.cards)["1"]
+    # The biggest bucket is the one a page render would have to filter out
+    buckets = {}
+    for card in cards:
+        buckets[collection.bucket_key(card)] = buckets.get(collection.bucket_key(card), 0) + 1
+    gadget_type, rarity, _ = max((key for key in buckets if not key[2]), key=buckets.get)
+    categories = gadgets.get_gadget_type_groups()[gadget_type]["categories"]
+    print(f"{args.cards} cards, browsing {gadget_type}/{rarity} ({buckets[(gadget_type, rarity, False)]} cards)")
+
+    def filter_page(sort):
+        # What the collection screen did before: filter everything, then sort
+        matching = [card for card in cards if card.category in categories and card.rarity == rarity and card.in_pc is None]
+        return sorted(matching, key=collection.SORT_KEYS[sort])[:args.page]
+
+    card_map = index_cards(cards)
+    start = time.perf_counter()
+    card_map.collection_index()
+    print(f"  index build                  {(time.perf_counter() - start) * 1000:8.1f}ms once per loaded user")
+    for sort in collection.SORTS:
+        expected = filter_page(sort)
+        page = card_map.browse(gadget_type, rarity, sort, limit=args.page)
+        assert page.cards == expected, sort
+        for label, render in (
+            ("filter + sort", lambda: filter_page(sort)),
+            ("index, first page", lambda: card_map.browse(gadget_type, rarity, sort, limit=args.page)),
+            ("index, next page", lambda: card_map.browse(gadget_type, rarity, sort, expected[-1].card_id, limit=args.page)),
+        ):
+            start = time.perf_counter()
+            for _ in range(args.renders):
+                render()
+            elapsed = time.perf_counter() - start
+            print(f"  {sort:<5} {label:<22} {elapsed / args.renders * 1e6:10.1f}us per page")
+
+    # Profile totals: walking every card vs reading the summary's buckets
+    card_map.summary()
+    for label, read in (
+        ("profile: scan all cards", lambda: (len(cards), sum(card.purchase_price for card in cards),
+                                             sum(card.category == "PC" for card in cards))),
+        ("profile: summary", lambda: card_map.summary().total_value),
+    ):
+        start = time.perf_counter()
+        for _ in range(args.renders):
+            read()
+        elapsed = time.perf_counter() - start
+        print(f"  {label:<28} {elapsed / args.renders * 1e6:10.1f}us")
+
+    # Keeping the index and summary current costs a few bisects per changed card
+    card_ids = list(card_map)
+    start = time.perf_counter()
+    for i in range(args.renders):
+        card_id = card_ids[i % len(card_ids)]
+        card_map[card_id] = card_map[card_id].replace(purchase_price=random.randint(1, 10000))
+    elapsed = time.perf_counter() - start
+    print(f"  card update                  {elapsed / args.renders * 1e6:10.1f}us")
+
+
+# The prefix checks of the old if/elif callback handler, in its order
+LEGACY_PREFIXES = (
+    "get_card", "view_gadgets", "gadget_type_", "profile", "build_pc", "view_pcs", "help", "back_to_start",
+    "cl_", "vc_", "confirm_sell_", "sell_", "build_gpu_", "build_cpu_", "build_mb_", "auto_build_",
+    "pc_", "eject_", "confirm_sell_pc_", "sell_pc_",
+)
+
+
+def legacy_resolve(data):
+    """Find the branch of the old handler for callback data and split its
+    arguments, like the old handler did."""
+    for prefix in LEGACY_PREFIXES:
+        if data == prefix or (prefix.endswith("_") and data.startswith(prefix)):
+            return prefix, data[len(prefix):].split("_")
+    return None, []
+
+
+def run_callbacks(args):
+    import collection
+    import pc_builder
+    import routes
+    from callbacks import router
+    from config import RARITY_ORDER
+
+    random.seed(args.seed)
+    # Card ids are millisecond timestamps times 1000 plus a counter
+    card_id = lambda: int(time.time() * 1000) * 1000 + random.randint(0, 999)
+    gadget_types = ("phones", "tablets", "pcs", "pc_parts", "laptops")
+    samples = {
+        routes.START: lambda: (),
+        routes.HELP: lambda: (),
+        routes.PROFILE: lambda: (),
+        routes.GET_CARD: lambda: (random.choice((1, 10, 100)),),
+        routes.VIEW_GADGETS: lambda: (),
+        routes.GADGET_TYPE: lambda: (random.choice(gadget_types),),
+        routes.COLLECTION_PAGE: lambda: (
+            random.choice(gadget_types), random.choice(RARITY_ORDER), random.choice(collection.SORTS),
+            random.choice((None, (card_id(), random.random() < 0.5)))
+        ),
+        routes.VIEW_CARD: lambda: (
+            card_id(),
+            random.choice((None, (random.choice(gadget_types), random.choice(RARITY_ORDER), random.choice(collection.SORTS))))
+        ),
+        routes.CONFIRM_SELL: lambda: (card_id(),),
+        routes.SELL: lambda: (card_id(),),
+        routes.BUILD_PC: lambda: (),
+        routes.BUILD_GPU: lambda: (card_id(),),
+        routes.BUILD_CPU: lambda: (card_id(), card_id()),
+        routes.BUILD_MB: lambda: (card_id(), card_id(), card_id()),
+        routes.AUTO_BUILD: lambda: (random.choice(pc_builder.GOALS + (routes.AUTO_BUILD_ALL,)),),
+        routes.VIEW_PCS: lambda: (),
+        routes.VIEW_PC: lambda: (card_id(),),
+        routes.EJECT: lambda: (card_id(), card_id()),
+        routes.CONFIRM_SELL_PC: lambda: (card_id(),),
+        routes.SELL_PC: lambda: (card_id(),),
+    }
+    registered = {route.action for route, _ in router.routes.values()}
+    missing = [route.action for route in samples if route.action not in registered]
+    if missing:
+        print(f"Routes without a handler: {missing}")
+        return 1
+
+    # Every route must give back exactly the values it was built from
+    presses = []
+    for route, sample in samples.items():
+        longest = 0
+        for _ in range(args.round_trips):
+            values = sample()
+            data = route.data(*values)
+            func, decoded = router.resolve(data)
+            if func is not router.routes[route.action][1] or decoded != values:
+                print(f"MISMATCH for {route}: {values} -> {data!r} -> {decoded}")
+                return 1
+            longest = max(longest, len(data.encode("utf-8")))
+            presses.append(data)
+        print(f"  {route.action} {len(route.fields)} fields  longest callback data {longest:2} bytes")
+    print(f"All routes round-trip {args.round_trips} random payloads each, all under {routes.CALLBACK_DATA_LIMIT} bytes")
+
+    # Old-format data must be refused, not misrouted
+    for data in ("get_card", "view_gadgets", "vc_123_ph_T_p", "confirm_sell_pc_123", "pc_123"):
+        try:
+            router.resolve(data)
+        except routes.CallbackDataError:
+            continue
+        print(f"Old-format callback data {data!r} was routed")
+        return 1
+
+    # What the old handler saw for the same presses: each route's legacy string
+    legacy = {
+        "st": "back_to_start", "hp": "help", "pf": "profile", "gc": "get_card_10", "vg": "view_gadgets",
+        "gt": "gadget_type_phones", "cl": "cl_ph_T_p_n1760000000000123", "vc": "vc_1760000000000123_ph_T_p",
+        "cs": "confirm_sell_1760000000000123", "sl": "sell_1760000000000123", "bp": "build_pc",
+        "bg": "build_gpu_1760000000000123", "bc": "build_cpu_1760000000000123_1760000000000124",
+        "bm": "build_mb_1760000000000123_1760000000000124_1760000000000125", "ab": "auto_build_value",
+        "vp": "view_pcs", "pc": "pc_1760000000000123", "ej": "eject_1760000000000123_1760000000000124",
+        "cp": "confirm_sell_pc_1760000000000123", "sp": "sell_pc_1760000000000123",
+    }
+    legacy_presses = [legacy[data.partition(routes.SEPARATOR)[0]] for data in presses]
+    random.shuffle(presses)
+    random.shuffle(legacy_presses)
+    presses = (presses * (args.presses // len(presses) + 1))[:args.presses]
+    legacy_presses = (legacy_presses * (args.presses // len(legacy_presses) + 1))[:args.presses]
+    for label, resolve, data in (
+        ("if/elif prefix chain (before)", legacy_resolve, legacy_presses),
+        ("route table + payload (after)", router.resolve, presses),
+    ):
+        start = time.perf_counter()
+        for press in data:
+            resolve(press)
+        elapsed = time.perf_counter() - start
+        total = sum(len(press.encode("utf-8")) for press in data)
+        print(f"  {label:<30} {elapsed / len(data) * 1e9:8.0f}ns per press  {total / len(data):5.1f} bytes average")
+
+
+def run_assets(args):
+    import assets
+    import utils
+
+    start = time.perf_counter()
+    bundle = assets.load()
+    print(f"Loaded {len(bundle.assets)} images in {(time.perf_counter() - start) * 1000:.0f}ms"
+          f"{'' if assets.Image is not None else ' (Pillow not installed, sent unoptimized)'}")
+
+    # A send by cached file_id carries the ID instead of the image
+    file_id_bytes = 90
+    before = after_upload = 0
+    for asset in bundle.assets.values():
+        before += asset.original_size
+        after_upload += len(asset.data)
+        print(f"  {asset.path:<28} {asset.original_size:>9} bytes -> {asset.filename:<22} {len(asset.data):>9} bytes"
+              f"  ({len(asset.data) / asset.original_size:.0%})")
+    count = len(bundle.assets)
+    if not count:
+        return 1
+    sends = args.sends
+    print(f"Bytes per send, averaged over {sends} sends of each image:")
+    print(f"  upload the PNG every send (before)    {before / count:>10.0f}")
+    print(f"  upload the PNG once, then file_id     {(before + (sends - 1) * count * file_id_bytes) / (sends * count):>10.0f}")
+    print(f"  upload the optimized image once       {(after_upload + (sends - 1) * count * file_id_bytes) / (sends * count):>10.0f}")
+
+    # What each send did on the event loop before: check, open and read the file
+    paths = [path for path in utils.IMAGE_PATHS.values() if path in bundle.assets]
+
+    def read_file(path):
+        if os.path.exists(path):
+            with open(path, 'rb') as f:
+                return f.read()
+
+    for label, fetch in (("exists + open + read (before)", read_file), ("in-memory bundle (after)", assets.get)):
+        start = time.perf_counter()
+        for i in range(args.reads):
+            fetch(paths[i % len(paths)])
+        elapsed = time.perf_counter() - start
+        print(f"  {label:<30} {elapsed / args.reads * 1e6:10.1f}us per send")
+
+
+def run_card_render(args):
+    import card_render
+    import gadgets
+    from models import Card
+
+    if card_render.Image is None:
+        print("Pillow is not installed")
+        return 1
+    random.seed(args.seed)
+    catalog = gadgets.get_catalog()
+    cards = [
+        Card.create(i, gadget["name"], gadget["category"], gadget["price"], gadget["rarity"], 0)
+        for i, gadget in enumerate(random.sample(catalog.gadgets, min(args.faces, len(catalog.gadgets))))
+    ]
+
+    face = card_render.card_face(cards[0])
+    start = time.perf_counter()
+    card_render.render(face, card_render.TEMPLATE_PATH, args.font, 85)
+    print(f"One face in this process: {(time.perf_counter() - start) * 1000:.0f}ms")
+
+    async def views(renderer, repeat):
+        start = time.perf_counter()
+        for _ in range(repeat):
+            await asyncio.gather(*(renderer.get(card) for card in cards))
+        return (time.perf_counter() - start) / (repeat * len(cards))
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        renderer = card_render.CardRenderer(cache_dir, args.font, args.processes, lru_size=len(cards))
+        # Start the workers outside the timings
+        list(renderer.pool().map(time.sleep, [0.1] * args.processes))
+        cold = asyncio.run(views(renderer, 1))
+        hot = asyncio.run(views(renderer, 20))
+        renderer._lru.clear()
+        disk = asyncio.run(views(renderer, 1))
+        renderer.close()
+    print(f"{len(cards)} faces, {args.processes} render processes:")
+    print(f"  render (pool)            {cold * 1000:8.2f}ms per face")
+    print(f"  disk cache               {disk * 1000:8.2f}ms per face")
+    print(f"  in-memory LRU            {hot * 1e6:8.2f}us per face")
+
+
+def run_send_scheduler(args):
+    """Simulated traffic against a fake Telegram that answers 429 past its
+    flood limits (modelled as token buckets a bit looser than the scheduler's):
+    one chat hammering buttons, other chats tapping now and then, and a
+    broadcast sent in the bulk lane at the same time."""
+    from telegram.error import RetryAfter
+
+    import send_scheduler
+
+    random.seed(args.seed)
+
+    class FakeTelegram:
+        def __init__(self):
+            now = time.monotonic()
+            self.global_bucket = send_scheduler.TokenBucket(args.global_rate * 1.1, args.global_rate * 1.1, now)
+            self.chats = {}
+            self.flood_errors = 0
+
+        async def send(self, chat_id):
+            now = time.monotonic()
+            bucket = self.chats.get(chat_id)
+            if bucket is None:
+                bucket = self.chats[chat_id] = send_scheduler.TokenBucket(1.2, 5, now)
+            if self.global_bucket.delay(now) > 0 or bucket.delay(now) > 0:
+                self.flood_errors += 1
+                raise RetryAfter(1)
+            self.global_bucket.take(now)
+            bucket.take(now)
+            await asyncio.sleep(0.005)
+            return True
+
+    async def traffic(scheduler):
+        telegram = FakeTelegram()
+        # Waits by kind of traffic; queue depth by lane
+        latencies = {"busy chat": [], "other chats": [], "broadcast": []}
+        failed = dict.fromkeys(latencies, 0)
+        max_depth = dict.fromkeys(send_scheduler.LANES.values(), 0)
+
+        async def request(kind, chat_id, priority):
+            start = time.monotonic()
+            try:
+                if scheduler is None:
+                    await telegram.send(chat_id)
+                else:
+                    await scheduler.process_request(
+                        telegram.send, (chat_id,), {}, "editMessageText", {"chat_id": chat_id}, {"priority": priority}
+                    )
+            except RetryAfter:
+                failed[kind] += 1
+                return
+            latencies[kind].append(time.monotonic() - start)
+
+        async def hot_chat():
+            # A user pressing buttons several times a second
+            while time.monotonic() < end:
+                tasks.append(asyncio.ensure_future(request("busy chat", 1, send_scheduler.PRIORITY_INTERACTIVE)))
+                await asyncio.sleep(random.expovariate(args.hot_rate))
+
+        async def other_chats():
+            while time.monotonic() < end:
+                chat_id = random.randint(2, 1000)
+                tasks.append(asyncio.ensure_future(request("other chats", chat_id, send_scheduler.PRIORITY_INTERACTIVE)))
+                await asyncio.sleep(random.expovariate(args.chat_rate))
+
+        async def watch():
+            while time.monotonic() < end and scheduler is not None:
+                for priority, lane in send_scheduler.LANES.items():
+                    max_depth[lane] = max(max_depth[lane], scheduler.lanes[priority].depth)
+                await asyncio.sleep(0.05)
+
+        if scheduler is not None:
+            await scheduler.initialize()
+        end = time.monotonic() + args.seconds
+        tasks = [
+            asyncio.ensure_future(request("broadcast", 10000 + i, send_scheduler.PRIORITY_BULK)) for i in range(args.broadcast)
+        ]
+        await asyncio.gather(hot_chat(), other_chats(), watch())
+        await asyncio.gather(*tasks)
+        if scheduler is not None:
+            await scheduler.shutdown()
+        return telegram.flood_errors, latencies, failed, max_depth
+
+    for name, scheduler in (
+        ("direct calls", None),
+        ("send scheduler", send_scheduler.SendScheduler(
+            global_rate=args.global_rate, max_retries=3, metrics_interval=0)),
+    ):
+        flood_errors, latencies, failed, max_depth = asyncio.run(traffic(scheduler))
+        print(f"{name}: {flood_errors} 429s from Telegram")
+        for kind, values in latencies.items():
+            if not values:
+                print(f"  {kind:12} sent     0, failed {failed[kind]:4}")
+                continue
+            print(
+                f"  {kind:12} sent {len(values):5}, failed {failed[kind]:4}, "
+                f"wait p50 {percentile(values, 0.5) * 1000:7.1f}ms  p99 {percentile(values, 0.99) * 1000:7.1f}ms"
+            )
+        if scheduler is not None:
+            print("  max queue depth: " + ", ".join(f"{lane} {depth}" for lane, depth in max_depth.items()))
+
+
+def run_edits(args):
+    """Users tapping a message's buttons in bursts of 1-4 taps, each tap
+    re-rendering one of a few views (often the one already shown), against a
+    fake Telegram with a varying edit latency: one edit per tap vs the coalescer."""
+    from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+    from telegram.error import BadRequest
+
+    import edit_coalescer
+
+    random.seed(args.seed)
+    views = [
+        (f"View {i}", InlineKeyboardMarkup([[InlineKeyboardButton(f"Button {j}", callback_data=f"b{i}.{j}")] for j in range(5)]))
+        for i in range(args.views)
+    ]
+    # Each user's taps: (seconds after the previous tap, view)
+    plans = []
+    for _ in range(args.users):
+        plan = []
+        for _ in range(args.bursts):
+            plan.append((random.uniform(1, 3), random.randrange(args.views)))
+            for _ in range(random.randint(0, 3)):
+                plan.append((random.uniform(0.05, 0.25), random.randrange(args.views)))
+        plans.append(plan)
+
+    async def simulate(coalescer):
+        shown = {}
+        calls = {"edits": 0, "not modified": 0}
+
+        async def telegram_edit(user, view):
+            calls["edits"] += 1
+            await asyncio.sleep(args.latency * random.uniform(0.5, 1.5))
+            if shown.get(user) == view:
+                calls["not modified"] += 1
+                raise BadRequest("Message is not modified: specified new message content and reply markup are exactly the same")
+            shown[user] = view
+
+        async def tap(user, view):
+            if coalescer is None:
+                try:
+                    await telegram_edit(user, view)
+                except BadRequest:
+                    pass
+                return
+            text, markup = views[view]
+            digest = edit_coalescer.content_digest("text", text, "HTML", False, reply_markup=markup)
+            await coalescer.edit(user, digest, lambda: telegram_edit(user, view))
+
+        async def user(user_id, plan):
+            tasks = []
+            for delay, view in plan:
+                await asyncio.sleep(delay)
+                # With concurrent updates, each tap's handler runs on its own
+                tasks.append(asyncio.ensure_future(tap(user_id, view)))
+            await asyncio.gather(*tasks)
+
+        await asyncio.gather(*(user(user_id, plan) for user_id, plan in enumerate(plans)))
+        # Does every message end up showing the last tap's view?
+        wrong = sum(shown.get(user_id) != plan[-1][1] for user_id, plan in enumerate(plans))
+        return calls, wrong
+
+    taps = sum(len(plan) for plan in plans)
+    print(f"{args.users} users, {taps} taps, {args.latency * 1000:.0f}ms per edit on average:")
+    for name, coalescer in (
+        ("one edit per tap", None),
+        ("edit coalescer", edit_coalescer.EditCoalescer(args.debounce, args.users)),
+    ):
+        calls, wrong = asyncio.run(simulate(coalescer))
+        print(
+            f"  {name:18} {calls['edits']:6} edit calls, {calls['not modified']:5} 'not modified' errors, "
+            f"{wrong} messages left showing a stale view"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Gadget bot benchmarks")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    latency = subparsers.add_parser("latency", help="p50/p99 handler latency with blocking vs thread-pool database calls")
+    latency.add_argument("--backend", default="json")
+    latency.add_argument("--users", type=int, default=200)
+    latency.add_argument("--cards", type=int, default=20)
+    latency.add_argument("--clients", type=int, default=20)
+    latency.add_argument("--requests", type=int, default=10)
+    latency.add_argument("--think", type=float, default=0.5, help="mean seconds between a client's requests")
+    latency.add_argument("--seed", type=int, default=1)
+    latency.set_defaults(func=run_latency)
+
+    card_format = subparsers.add_parser("card-format", help="cards.json size, parse time and memory: full vs packed cards")
+    card_format.add_argument("--users", type=int, default=1000)
+    card_format.add_argument("--cards", type=int, default=100)
+    card_format.add_argument("--seed", type=int, default=1)
+    card_format.set_defaults(func=run_card_format)
+
+    memory = subparsers.add_parser("memory", help="tracemalloc per-card memory: dicts vs packed dicts vs Card objects")
+    memory.add_argument("--users", type=int, default=10000)
+    memory.add_argument("--cards", type=int, default=100)
+    memory.add_argument("--seed", type=int, default=1)
+    memory.set_defaults(func=run_memory)
+
+    catalog = subparsers.add_parser("catalog", help="random draw and name lookup: linear scans vs the indexed Catalog")
+    catalog.add_argument("--size", type=int, default=50000, help="gadgets in the synthetic large catalog")
+    catalog.add_argument("--draws", type=int, default=100000)
+    catalog.add_argument("--seed", type=int, default=1)
+    catalog.set_defaults(func=run_catalog)
+
+    draws = subparsers.add_parser("draws", help="draws/s of the production sampler and chi-square checks of its drop rates")
+    draws.add_argument("--draws", type=int, default=20_000_000)
+    draws.add_argument("--batch", type=int, default=1_000_000, help="draws per draw_many call")
+    draws.add_argument("--alpha", type=float, default=0.001, help="significance level of the chi-square checks")
+    draws.add_argument("--seed", type=int, default=1)
+    draws.set_defaults(func=run_draws)
+
+    pc_specs = subparsers.add_parser("pc-specs", help="PC specs per build: computed from the tiers vs the precomputed table")
+    pc_specs.add_argument("--builds", type=int, default=1_000_000)
+    pc_specs.add_argument("--seed", type=int, default=1)
+    pc_specs.set_defaults(func=run_pc_specs)
+
+    auto_build = subparsers.add_parser("auto-build", help="auto-build optimizer vs brute force, and auto-build all")
+    auto_build.add_argument("--parts", type=int, default=3000, help="free parts per category")
+    auto_build.add_argument("--seed", type=int, default=1)
+    auto_build.set_defaults(func=run_auto_build)
+
+    collection_bench = subparsers.add_parser("collection", help="collection page and profile render: scanning all cards vs the per-user index and summary")
+    collection_bench.add_argument("--cards", type=int, default=100000)
+    collection_bench.add_argument("--page", type=int, default=20)
+    collection_bench.add_argument("--renders", type=int, default=200)
+    collection_bench.add_argument("--seed", type=int, default=1)
+    collection_bench.set_defaults(func=run_collection)
+
+    callbacks_bench = subparsers.add_parser("callbacks", help="callback routing: the old prefix chain vs the route table, and payload round trips")
+    callbacks_bench.add_argument("--presses", type=int, default=200000)
+    callbacks_bench.add_argument("--round-trips", type=int, default=1000, help="random payloads per route")
+    callbacks_bench.add_argument("--seed", type=int, default=1)
+    callbacks_bench.set_defaults(func=run_callbacks)
+
+    assets_bench = subparsers.add_parser("assets", help="menu image bytes per send and file reads: before vs the preloaded, optimized bundle")
+    assets_bench.add_argument("--sends", type=int, default=1000, help="sends of each image the bytes are averaged over")
+    assets_bench.add_argument("--reads", type=int, default=2000)
+    assets_bench.set_defaults(func=run_assets)
+
+    card_render_bench = subparsers.add_parser("card-render", help="card face render time: process pool vs disk cache vs in-memory LRU")
+    card_render_bench.add_argument("--faces", type=int, default=40, help="distinct gadgets to render")
+    card_render_bench.add_argument("--processes", type=int, default=2)
+    card_render_bench.add_argument("--font", default=os.getenv("CARD_FONT_PATH", "DejaVuSans-Bold.ttf"))
+    card_render_bench.add_argument("--seed", type=int, default=1)
+    card_render_bench.set_defaults(func=run_card_render)
+
+    send_bench = subparsers.add_parser("send-scheduler", help="429s, queue depth and waits per lane: direct calls vs the send scheduler")
+    send_bench.add_argument("--seconds", type=float, default=5)
+    send_bench.add_argument("--broadcast", type=int, default=300, help="bulk messages sent at the start")
+    send_bench.add_argument("--hot-rate", type=float, default=3, help="presses per second in the busy chat")
+    send_bench.add_argument("--chat-rate", type=float, default=10, help="presses per second across the other chats")
+    send_bench.add_argument("--global-rate", type=float, default=30)
+    send_bench.add_argument("--seed", type=int, default=1)
+    send_bench.set_defaults(func=run_send_scheduler)
+
+    edits_bench = subparsers.add_parser("edits", help="edit calls and 'not modified' errors for bursts of taps: one edit per tap vs the edit coalescer")
+    edits_bench.add_argument("--users", type=int, default=50)
+    edits_bench.add_argument("--bursts", type=int, default=10, help="bursts of taps per user")
+    edits_bench.add_argument("--views", type=int, default=3, help="distinct views a tap can show")
+    edits_bench.add_argument("--latency", type=float, default=0.15, help="seconds per edit call")
+    edits_bench.add_argument("--debounce", type=float, default=0.3)
+    edits_bench.add_argument("--seed", type=int, default=1)
+    edits_bench.set_defaults(func=run_edits)
+
+    args = parser.parse_args()
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -6,9 +6,15 @@ Main entry point for the bot application.
 from telegram import Update
 from telegram.ext import Application, CommandHandler, CallbackQueryHandler
 
+import assets
 import config
+import gadgets
 import commands
 import callbacks
+import card_render
+import images
+import send_scheduler
+import async_database
 
 
 async def initialize_user(application):
@@ -27,8 +33,18 @@ async def initialize_user(application):
 
 def main():
     """Main function to run the bot."""
-    # Create application
-    application = Application.builder().token(config.BOT_TOKEN).build()
+    # Create application. Every Bot API request goes through the send
+    # scheduler, which keeps it under Telegram's flood limits. Updates are
+    # handled concurrently, so a chat waiting on its limit doesn't hold up
+    # the others. That is safe because handlers check and change a user's
+    # data only inside database.transaction, which runs one at a time per user
+    application = (
+        Application.builder()
+        .token(config.BOT_TOKEN)
+        .rate_limiter(send_scheduler.SendScheduler())
+        .concurrent_updates(True)
+        .build()
+    )
     
     # Add command handlers
     application.add_handler(CommandHandler("start", commands.start_command))
@@ -41,12 +57,30 @@ def main():
     # Add callback query handler
     application.add_handler(CallbackQueryHandler(callbacks.button_callback))
     
+    # Load the gadget catalog now (a broken file should stop startup, not the
+    # first /card) and pick up catalog file changes without a restart
+    gadgets.start_catalog_watcher()
+    
+    # Validate and load the menu images into memory, so sends never read files
+    assets.load()
+    # Say now, not on the first card view, if card faces can't be rendered
+    card_render.get_renderer()
+    
     # Initialize user gadgets on startup
     async def post_init(app):
         await initialize_user(app)
     
     application.post_init = post_init
     
+    # Flush buffered writes and close the storage backend on shutdown
+    async def post_shutdown(app):
+        gadgets.stop_catalog_watcher()
+        card_render.close()
+        await images.flush()
+        await async_database.close()
+    
+    application.post_shutdown = post_shutdown
+    
     # Run bot
     print("Bot is running...")
     application.run_polling(allowed_updates=Update.ALL_TYPES)
@@ -0,0 +1,300 @@
+"""
+Card faces: each gadget's own card image, drawn on the card template.
+
+A face shows the gadget's name, rarity (in its colour), category and price,
+and for PCs their specs. Drawing one (text layout, a blurred glow) takes tens
+of milliseconds of CPU, so faces are rendered in a process pool and never on
+the event loop, and each is rendered only once:
+
+- an in-memory LRU of CARD_IMAGE_CACHE_SIZE faces, keyed by the face itself,
+  i.e. (gadget, rarity, template version) plus what a PC shows;
+- a disk cache in CARD_IMAGE_DIR, one JPEG per face named by the hash of the
+  face, so restarts don't render again. Files of older template versions are
+  simply never read again; the directory can be cleared at any time;
+- once sent, Telegram's file_id for the JPEG is kept by images.py, so a
+  popular card is uploaded once too.
+
+Change TEMPLATE_VERSION whenever the template image or the layout changes.
+
+Faces need Pillow and a TrueType font with Cyrillic (CARD_FONT_PATH).
+Without them, cards keep showing the shared card image.
+"""
+
+import asyncio
+import hashlib
+import io
+import json
+import multiprocessing
+import os
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, NamedTuple, Optional, Tuple
+
+import assets
+import config
+import gadgets
+import utils
+from models import Card
+
+try:
+    from PIL import Image, ImageDraw, ImageFilter, ImageFont
+except ImportError:
+    Image = None
+
+TEMPLATE_VERSION = 1
+TEMPLATE_PATH = utils.IMAGE_PATHS["card_view"]
+
+# Frame and label colour of each rarity
+RARITY_COLORS = {
+    gadgets.RARITY_TRASH: (120, 110, 100),
+    gadgets.RARITY_COMMON: (220, 220, 225),
+    gadgets.RARITY_UNCOMMON: (80, 220, 110),
+    gadgets.RARITY_RARE: (70, 150, 255),
+    gadgets.RARITY_EPIC: (180, 90, 255),
+    gadgets.RARITY_LEGENDARY: (255, 160, 40),
+    gadgets.RARITY_MYTHIC: (255, 60, 70),
+}
+
+# Layout on the 1024x1024 template: the card's screen area
+SCREEN = (290, 185, 734, 830)
+TEXT_WIDTH = SCREEN[2] - SCREEN[0] - 60
+
+
+class CardFace(NamedTuple):
+    """Everything a card face shows. Two cards with equal faces share an image."""
+
+    template_version: int
+    name: str
+    rarity: str
+    rarity_name: str
+    category_name: str
+    price: int
+    # Spec lines, PCs only
+    specs: Tuple[str, ...]
+
+    def digest(self) -> str:
+        return hashlib.sha256(json.dumps(self, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+
+def card_face(card: Card) -> CardFace:
+    specs = ()
+    if card.category == gadgets.CATEGORY_PC:
+        card_specs = card.specs
+        specs = (
+            f"ОЗУ: {card_specs.get('ram', 'Н/Д')}",
+            f"Накопитель: {card_specs.get('storage', 'Н/Д')}",
+            f"БП: {card_specs.get('psu', 'Н/Д')}",
+            f"Корпус: {card_specs.get('case', 'Н/Д')}",
+        )
+    return CardFace(
+        TEMPLATE_VERSION, card.gadget_name, card.rarity, gadgets.get_rarity_name(card.rarity),
+        gadgets.get_category_name(card.category), card.purchase_price, specs
+    )
+
+
+# Rendering. These functions run in the worker processes, so they get their
+# settings as arguments instead of reading the parent's state.
+
+_fonts: Dict[Tuple[str, int], "ImageFont.FreeTypeFont"] = {}
+
+
+def get_font(font_path: str, size: int):
+    font = _fonts.get((font_path, size))
+    if font is None:
+        font = _fonts[(font_path, size)] = ImageFont.truetype(font_path, size)
+    return font
+
+
+def fit_text(text: str, font_path: str, max_width: int, sizes, max_lines: int = 2):
+    """Pick the largest font size at which `text` wraps into at most `max_lines`
+    lines of `max_width`. Returns (font, lines); the last line is cut if even
+    the smallest size doesn't fit."""
+    for size in sizes:
+        font = get_font(font_path, size)
+        lines = [""]
+        for word in text.split():
+            candidate = f"{lines[-1]} {word}".strip()
+            if font.getlength(candidate) <= max_width or not lines[-1]:
+                lines[-1] = candidate
+            else:
+                lines.append(word)
+        if len(lines) <= max_lines and all(font.getlength(line) <= max_width for line in lines):
+            return font, lines
+    lines = lines[:max_lines]
+    while font.getlength(lines[-1] + "…") > max_width and len(lines[-1]) > 1:
+        lines[-1] = lines[-1][:-1]
+    lines[-1] += "…"
+    return font, lines
+
+
+def render(face: CardFace, template_path: str, font_path: str, quality: int) -> bytes:
+    """Draw a card face on the template and encode it as a JPEG."""
+    with Image.open(template_path) as template:
+        image = template.convert("RGB")
+    scale = image.width / 1024
+    if scale != 1:
+        image = image.resize((1024, round(image.height / scale)), Image.LANCZOS)
+    color = RARITY_COLORS.get(face.rarity, RARITY_COLORS[gadgets.RARITY_COMMON])
+    left, top, right, bottom = SCREEN
+    center = (left + right) // 2
+
+    # Rarity glow around the screen
+    glow = Image.new("L", image.size, 0)
+    ImageDraw.Draw(glow).rounded_rectangle((left - 8, top - 8, right + 8, bottom + 8), radius=30, outline=255, width=14)
+    glow = glow.filter(ImageFilter.GaussianBlur(12))
+    image.paste(Image.new("RGB", image.size, color), mask=glow)
+
+    overlay = Image.new("RGBA", image.size, (0, 0, 0, 0))
+    draw = ImageDraw.Draw(overlay)
+    draw.rounded_rectangle((left - 8, top - 8, right + 8, bottom + 8), radius=30, outline=color + (255,), width=5)
+
+    # Rarity label under the top bezel
+    label_font = get_font(font_path, 30)
+    draw.text((center, top + 110), face.rarity_name.upper(), font=label_font, fill=color + (255,), anchor="mm",
+              stroke_width=3, stroke_fill=(0, 0, 0, 200))
+
+    # Info panel: name, category and price, specs
+    name_font, name_lines = fit_text(face.name, font_path, TEXT_WIDTH, (46, 42, 38, 34, 30, 26))
+    info_font = get_font(font_path, 26)
+    spec_font = get_font(font_path, 22)
+    line_gap = 8
+    height = (
+        len(name_lines) * (name_font.size + line_gap) + info_font.size + 2 * line_gap
+        + len(face.specs) * (spec_font.size + line_gap) + 40
+    )
+    panel_bottom = bottom - 30
+    panel_top = panel_bottom - height
+    draw.rounded_rectangle((left + 15, panel_top, right - 15, panel_bottom), radius=22,
+                           fill=(8, 10, 24, 215), outline=color + (160,), width=2)
+    y = panel_top + 20
+    for line in name_lines:
+        draw.text((center, y), line, font=name_font, fill=(255, 255, 255, 255), anchor="ma")
+        y += name_font.size + line_gap
+    y += line_gap
+    draw.text((center, y), f"{face.category_name} · {face.price} монет", font=info_font, fill=(255, 215, 90, 255), anchor="ma")
+    y += info_font.size + line_gap
+    for line in face.specs:
+        y += line_gap
+        _, spec_lines = fit_text(line, font_path, TEXT_WIDTH, (spec_font.size,), max_lines=1)
+        draw.text((center, y), spec_lines[0], font=spec_font, fill=(200, 210, 230, 255), anchor="ma")
+        y += spec_font.size
+
+    image = Image.alpha_composite(image.convert("RGBA"), overlay).convert("RGB")
+    out = io.BytesIO()
+    image.save(out, "JPEG", quality=quality, optimize=True, progressive=True)
+    return out.getvalue()
+
+
+def load_or_render(face: CardFace, cache_dir: str, template_path: str, font_path: str, quality: int) -> bytes:
+    """Read a face from the disk cache, rendering and storing it if it isn't there."""
+    path = os.path.join(cache_dir, f"{face.digest()}.jpg")
+    try:
+        with open(path, 'rb') as f:
+            return f.read()
+    except FileNotFoundError:
+        pass
+    data = render(face, template_path, font_path, quality)
+    os.makedirs(cache_dir, exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+    return data
+
+
+class CardRenderer:
+    """Card faces for the bot: LRU, then disk cache, then the process pool."""
+
+    def __init__(self, cache_dir: str, font_path: str, processes: int, lru_size: int):
+        self.cache_dir = cache_dir
+        self.font_path = font_path
+        self.processes = processes
+        self.lru_size = lru_size
+        self._lru: "OrderedDict[CardFace, assets.Asset]" = OrderedDict()
+        # Faces being rendered, so concurrent views of one card share a render
+        self._pending: Dict[CardFace, asyncio.Future] = {}
+        self._pool: Optional[ProcessPoolExecutor] = None
+
+    def pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            # Spawned, not forked: the bot's threads and locks don't belong in the workers
+            self._pool = ProcessPoolExecutor(self.processes, mp_context=multiprocessing.get_context("spawn"))
+        return self._pool
+
+    async def get(self, card: Card) -> assets.Asset:
+        face = card_face(card)
+        asset = self._lru.get(face)
+        if asset is not None:
+            self._lru.move_to_end(face)
+            return asset
+
+        future = self._pending.get(face)
+        if future is None:
+            future = asyncio.ensure_future(self._load(face))
+            self._pending[face] = future
+            future.add_done_callback(lambda _: self._pending.pop(face, None))
+        return await future
+
+    async def _load(self, face: CardFace) -> assets.Asset:
+        loop = asyncio.get_running_loop()
+        try:
+            data = await loop.run_in_executor(
+                self.pool(), load_or_render, face, self.cache_dir, TEMPLATE_PATH, self.font_path, config.ASSET_JPEG_QUALITY
+            )
+        except BrokenProcessPool:
+            # A worker died; start a new pool for the next render
+            self._pool = None
+            raise
+        asset = assets.Asset(None, f"card-{face.digest()[:16]}.jpg", data, len(data))
+        self._lru[face] = asset
+        while len(self._lru) > self.lru_size:
+            self._lru.popitem(last=False)
+        return asset
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=True)
+            self._pool = None
+
+
+_renderer: Optional[CardRenderer] = None
+_unavailable = False
+
+
+def get_renderer() -> Optional[CardRenderer]:
+    """Get the card renderer, or None if faces can't be rendered here."""
+    global _renderer, _unavailable
+    if _renderer is None and not _unavailable:
+        if Image is None:
+            print("Pillow is not installed, cards show the shared card image")
+            _unavailable = True
+            return None
+        try:
+            ImageFont.truetype(config.CARD_FONT_PATH, 12)
+        except OSError:
+            print(f"Font {config.CARD_FONT_PATH} not found (set CARD_FONT_PATH), cards show the shared card image")
+            _unavailable = True
+            return None
+        _renderer = CardRenderer(config.CARD_IMAGE_DIR, config.CARD_FONT_PATH,
+                                 config.CARD_RENDER_PROCESSES, config.CARD_IMAGE_CACHE_SIZE)
+    return _renderer
+
+
+async def get_card_image(card: Card) -> Optional[assets.Asset]:
+    """Get the face of a card, or None if faces aren't available or rendering failed."""
+    renderer = get_renderer()
+    if renderer is None:
+        return None
+    try:
+        return await renderer.get(card)
+    except Exception as e:
+        print(f"Rendering the card face of {card.gadget_name} failed: {e}")
+        return None
+
+
+def close():
+    global _renderer
+    if _renderer is not None:
+        _renderer.close()
+        _renderer = None
@@ -0,0 +1,195 @@
+"""
+Paginated, sortable browsing of a user's collection, and its summary.
+
+A `CollectionIndex` sorts a user's cards into buckets keyed by (gadget type
+group, rarity, in a PC or not). Each bucket keeps one sorted list of keys per
+sort order. The lists are updated card by card as the collection changes, so
+a page is found with a bisect and read with a slice, and rendering it costs
+O(page size) instead of filtering the whole collection. Type groups come from
+the catalog the index was built with; once a reload swaps in another catalog
+the index is stale and has to be rebuilt (see `CollectionIndex.is_current`).
+
+Pages are cursor-based. The next page starts right after the last card shown
+and the previous one ends right before the first, so adding or selling cards
+doesn't shift pages the way page numbers would.
+
+A `CollectionSummary` keeps running card counts and values per (category,
+rarity, in a PC) for the profile and the collection menus. Like the index, it
+is updated card by card, so reading it never walks the collection.
+"""
+
+from bisect import bisect_left, bisect_right, insort
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+import gadgets
+from models import Card
+
+SORT_PRICE = "price"  # priciest first
+SORT_DATE = "date"    # newest first
+SORT_NAME = "name"    # A to Z
+SORTS = (SORT_PRICE, SORT_DATE, SORT_NAME)
+
+# Sort key of a card in each order; the card_id at the end makes keys unique
+SORT_KEYS: Dict[str, Callable[[Card], tuple]] = {
+    SORT_PRICE: lambda card: (-card.purchase_price, card.card_id),
+    SORT_DATE: lambda card: (-card.obtained_at, card.card_id),
+    SORT_NAME: lambda card: (card.gadget_name, card.card_id),
+}
+
+
+class Page:
+    """One page of a bucket."""
+
+    __slots__ = ("cards", "total", "has_prev", "has_next")
+
+    def __init__(self, cards: List[Card], total: int, has_prev: bool, has_next: bool):
+        self.cards = cards
+        # Number of cards in the whole bucket
+        self.total = total
+        self.has_prev = has_prev
+        self.has_next = has_next
+
+
+def bucket_key(card: Card, catalog: Optional[gadgets.Catalog] = None) -> Tuple[Optional[str], str, bool]:
+    """Get the (type group, rarity, in a PC) bucket of a card, by the groups
+    of `catalog` (the current one by default)."""
+    catalog = catalog or gadgets.get_catalog()
+    return catalog.category_groups.get(card.category), card.rarity, card.in_pc is not None
+
+
+class CollectionSummary:
+    """Running totals of one user's collection: card count and value per
+    (category, rarity, in a PC) bucket. Every total is derived from the
+    buckets, of which there are a few dozen at most."""
+
+    __slots__ = ("buckets",)
+
+    def __init__(self, cards: Iterable[Card] = ()):
+        # (category, rarity, in_pc) -> [cards, value]
+        self.buckets: Dict[Tuple[str, str, bool], List[int]] = {}
+        for card in cards:
+            self.add(card)
+
+    @classmethod
+    def from_buckets(cls, rows: Iterable[Tuple[str, str, bool, int, int]]) -> "CollectionSummary":
+        """Build a summary from (category, rarity, in_pc, cards, value) rows."""
+        summary = cls()
+        for category, rarity, in_pc, count, value in rows:
+            summary.buckets[(category, rarity, bool(in_pc))] = [count, value]
+        return summary
+
+    def add(self, card: Card, sign: int = 1):
+        key = (card.category, card.rarity, card.in_pc is not None)
+        totals = self.buckets.setdefault(key, [0, 0])
+        totals[0] += sign
+        totals[1] += sign * card.purchase_price
+        if not totals[0]:
+            del self.buckets[key]
+
+    def remove(self, card: Card):
+        self.add(card, -1)
+
+    def copy(self) -> "CollectionSummary":
+        summary = CollectionSummary()
+        summary.buckets = {key: list(totals) for key, totals in self.buckets.items()}
+        return summary
+
+    @property
+    def total_cards(self) -> int:
+        return sum(count for count, _ in self.buckets.values())
+
+    @property
+    def total_value(self) -> int:
+        """Sum of the prices of all cards, PCs and the parts in them included."""
+        return sum(value for _, value in self.buckets.values())
+
+    @property
+    def pc_count(self) -> int:
+        return sum(count for (category, _, _), (count, _) in self.buckets.items() if category == gadgets.CATEGORY_PC)
+
+    def type_counts(self) -> Dict[str, int]:
+        """Get the number of cards not in a PC per gadget type group."""
+        counts: Dict[str, int] = {}
+        for (category, _, in_pc), (count, _) in self.buckets.items():
+            gadget_type = gadgets.get_gadget_type_group(category)
+            if not in_pc and gadget_type is not None:
+                counts[gadget_type] = counts.get(gadget_type, 0) + count
+        return counts
+
+    def rarity_counts(self, gadget_type: str) -> Dict[str, int]:
+        """Get the number of cards not in a PC per rarity within a gadget type group."""
+        counts: Dict[str, int] = {}
+        for (category, rarity, in_pc), (count, _) in self.buckets.items():
+            if not in_pc and gadgets.get_gadget_type_group(category) == gadget_type:
+                counts[rarity] = counts.get(rarity, 0) + count
+        return counts
+
+
+class CollectionIndex:
+    """Per-bucket sorted keys of one user's cards."""
+
+    def __init__(self, cards: Iterable[Card] = ()):
+        # Buckets are keyed by this catalog's type groups, also after a reload
+        self.catalog = gadgets.get_catalog()
+        self._buckets: Dict[tuple, Dict[str, List[tuple]]] = {}
+        # Build unsorted and sort once instead of inserting card by card
+        for card in cards:
+            keys = self._buckets.setdefault(bucket_key(card, self.catalog), {sort: [] for sort in SORTS})
+            for sort in SORTS:
+                keys[sort].append(SORT_KEYS[sort](card))
+        for keys in self._buckets.values():
+            for sort_keys in keys.values():
+                sort_keys.sort()
+
+    def is_current(self) -> bool:
+        """Whether the buckets follow the current catalog's type groups."""
+        return self.catalog is gadgets.get_catalog()
+
+    def add(self, card: Card):
+        keys = self._buckets.setdefault(bucket_key(card, self.catalog), {sort: [] for sort in SORTS})
+        for sort in SORTS:
+            insort(keys[sort], SORT_KEYS[sort](card))
+
+    def remove(self, card: Card):
+        keys = self._buckets.get(bucket_key(card, self.catalog))
+        if keys is None:
+            return
+        for sort in SORTS:
+            sort_keys = keys[sort]
+            key = SORT_KEYS[sort](card)
+            i = bisect_left(sort_keys, key)
+            if i < len(sort_keys) and sort_keys[i] == key:
+                del sort_keys[i]
+
+    def count(self, gadget_type: str, rarity: str, in_pc: bool = False) -> int:
+        keys = self._buckets.get((gadget_type, rarity, in_pc))
+        return len(keys[SORT_PRICE]) if keys else 0
+
+    def page(self, gadget_type: str, rarity: str, sort: str, cursor: Optional[Card] = None,
+             backward: bool = False, limit: int = 20, in_pc: bool = False) -> Tuple[List[int], int, bool, bool]:
+        """Get (card_ids, total, has_prev, has_next) of one page of a bucket.
+
+        Without a cursor this is the first page. With one, it's the page right
+        after the cursor card, or right before it if `backward`.
+        """
+        keys = self._buckets.get((gadget_type, rarity, in_pc))
+        sort_keys = keys[sort] if keys else []
+        if cursor is None:
+            start = 0
+        elif not backward:
+            start = bisect_right(sort_keys, SORT_KEYS[sort](cursor))
+        else:
+            # A short page at the start is filled up to a full first page
+            start = max(0, bisect_left(sort_keys, SORT_KEYS[sort](cursor)) - limit)
+        end = min(start + limit, len(sort_keys))
+        return [key[-1] for key in sort_keys[start:end]], len(sort_keys), start > 0, end < len(sort_keys)
+
+
+def browse(cards: Dict[int, Card], index: CollectionIndex, gadget_type: str, rarity: str, sort: str,
+           cursor_id: Optional[int] = None, backward: bool = False, limit: int = 20) -> Page:
+    """Get a page of a user's free cards of a type group and rarity from their
+    card_id -> card index and its `CollectionIndex`. A cursor card that no
+    longer exists starts over from the first page."""
+    cursor = cards.get(cursor_id) if cursor_id is not None else None
+    card_ids, total, has_prev, has_next = index.page(gadget_type, rarity, sort, cursor, backward, limit)
+    return Page([cards[card_id] for card_id in card_ids], total, has_prev, has_next)
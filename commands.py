@@ -2,16 +2,40 @@
 Command handlers for the Telegram Gadget Card Bot.
 """
 
-import os
 import time
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes
 
+import assets
+import collection
 import gadgets
-import database
+import async_database
+import card_render
+import images
 import messages
+import pc_builder
+import routes
 import utils
-from config import RARITY_NAMES, RARITY_ORDER, GADGET_TYPE_GROUPS, GADGET_TYPE_ORDER
+from config import RARITY_ORDER, MULTI_PULL_SIZES
+from models import Card
+
+SORT_NAMES = {
+    collection.SORT_PRICE: "💰 Цена",
+    collection.SORT_DATE: "🕒 Дата",
+    collection.SORT_NAME: "🔤 Имя"
+}
+
+
+def get_start_keyboard():
+    """Get the main menu buttons."""
+    return [
+        [InlineKeyboardButton("Получить Карточку 🎴", callback_data=routes.GET_CARD.data(1))],
+        [InlineKeyboardButton(f"Получить x{count} 🎴", callback_data=routes.GET_CARD.data(count)) for count in MULTI_PULL_SIZES],
+        [InlineKeyboardButton("Мои Гаджеты 📚", callback_data=routes.VIEW_GADGETS.data())],
+        [InlineKeyboardButton("Профиль 👤", callback_data=routes.PROFILE.data())],
+        [InlineKeyboardButton("Собрать ПК 🖥️", callback_data=routes.BUILD_PC.data())],
+        [InlineKeyboardButton("Помощь ❓", callback_data=routes.HELP.data())]
+    ]
 
 
 async def start_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -24,19 +48,12 @@ async def start_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await utils.grant_initial_gadgets(user_id)
     
     # Get user data
-    user = database.get_user(user_id)
-    coins = user["coins"]
+    user = await async_database.get_user(user_id)
+    coins = user.coins
     
     message = messages.get_start_message(coins)
     
-    keyboard = [
-        [InlineKeyboardButton("Получить Карточку 🎴", callback_data="get_card")],
-        [InlineKeyboardButton("Мои Гаджеты 📚", callback_data="view_gadgets")],
-        [InlineKeyboardButton("Профиль 👤", callback_data="profile")],
-        [InlineKeyboardButton("Собрать ПК 🖥️", callback_data="build_pc")],
-        [InlineKeyboardButton("Помощь ❓", callback_data="help")]
-    ]
-    reply_markup = InlineKeyboardMarkup(keyboard)
+    reply_markup = InlineKeyboardMarkup(get_start_keyboard())
     
     await update.message.reply_text(message, reply_markup=reply_markup, parse_mode="HTML")
 
@@ -44,11 +61,11 @@ async def start_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
 async def card_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle /card command."""
     user_id = update.effective_user.id
-    user = database.get_user(user_id)
+    user = await async_database.get_user(user_id)
     
     # Cooldown check (commented out for testing as requested)
     # current_time = time.time()
-    # last_card_time = user.get("last_card_time", 0)
+    # last_card_time = user.last_card_time
     # time_since_last = current_time - last_card_time
     # 
     # if time_since_last < COOLDOWN_TIME:
@@ -60,36 +77,18 @@ async def card_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     #     )
     #     return
     
-    # Get random gadget
-    gadget = gadgets.get_random_gadget()
-    
-    # Add card to user's collection
-    card_id = database.add_card(
-        user_id,
-        gadget["name"],
-        gadget["category"],
-        gadget["price"],
-        gadget["rarity"]
-    )
-    
-    # Update last card time
-    database.update_user(user_id, last_card_time=time.time())
-    
-    # Display card
-    message = messages.get_card_display_message(gadget, card_id, title="🎴 <b>Ты получил новую карточку!</b> 🎉")
+    # Multi-pull: /card 10 or /card 100
+    count = utils.get_draw_count(context.args[0]) if context.args else 1
+    if count is None:
+        sizes = ", ".join(f"/card {size}" for size in MULTI_PULL_SIZES)
+        await update.message.reply_text(f"❌ Можно получить 1 карточку (/card) или сразу несколько: {sizes}")
+        return
     
-    keyboard = [
-        [InlineKeyboardButton("Мои Гаджеты 📚", callback_data="view_gadgets")]
-    ]
-    reply_markup = InlineKeyboardMarkup(keyboard)
+    # Draw random gadgets and add them to user's collection in one write
+    drawn = await utils.draw_cards(user_id, count)
     
-    # Send with image
-    photo_path = utils.IMAGE_PATHS["new_card"]
-    if os.path.exists(photo_path):
-        with open(photo_path, 'rb') as photo:
-            await update.message.reply_photo(photo=photo, caption=message, reply_markup=reply_markup, parse_mode="HTML")
-    else:
-        await update.message.reply_text(message, reply_markup=reply_markup, parse_mode="HTML")
+    reply_markup = InlineKeyboardMarkup(utils.get_draw_keyboard())
+    await utils.send_draw_result(update.message, drawn, reply_markup)
 
 
 async def gadgets_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -99,7 +98,7 @@ async def gadgets_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 async def show_gadgets(update: Update, context: ContextTypes.DEFAULT_TYPE, query=None):
     """Show gadget types menu."""
-    from config import GADGET_TYPE_GROUPS, GADGET_TYPE_ORDER
+    type_groups = gadgets.get_gadget_type_groups()
     
     if query:
         user_id = query.from_user.id
@@ -108,37 +107,28 @@ async def show_gadgets(update: Update, context: ContextTypes.DEFAULT_TYPE, query
         user_id = update.effective_user.id
         message_obj = update.message
     
-    cards = database.get_user_cards(user_id)
+    summary = await async_database.get_summary(user_id)
     
-    if not cards:
+    if not summary.total_cards:
         message = "📭 У тебя пока нет гаджетов!\n\nИспользуй /card чтобы получить свою первую карточку! 🎴"
-        keyboard = [[InlineKeyboardButton("Получить Карточку 🎴", callback_data="get_card")]]
+        keyboard = [[InlineKeyboardButton("Получить Карточку 🎴", callback_data=routes.GET_CARD.data(1))]]
         reply_markup = InlineKeyboardMarkup(keyboard)
         
         await utils.send_or_edit_message(query, message_obj, message, reply_markup, photo_path=utils.IMAGE_PATHS["empty_collection"])
         return
     
     # Count cards by type (excluding parts in PC)
-    type_counts = {}
-    for card in cards:
-        if card.get("in_pc") is not None:
-            continue
-        category = card["category"]
-        for type_key, type_info in GADGET_TYPE_GROUPS.items():
-            if category in type_info["categories"]:
-                type_counts[type_key] = type_counts.get(type_key, 0) + 1
-                break
+    type_counts = summary.type_counts()
     
     message = "📚 <b>Твоя Коллекция Гаджетов</b> 🎴\n\nВыбери тип гаджета:"
     
     # Create keyboard with buttons for each gadget type
     keyboard = []
-    for type_key in GADGET_TYPE_ORDER:
+    for type_key, type_info in type_groups.items():
         if type_key in type_counts:
-            type_info = GADGET_TYPE_GROUPS[type_key]
             count = type_counts[type_key]
             button_text = f"{type_info['name']} ({count})"
-            keyboard.append([InlineKeyboardButton(button_text, callback_data=f"gadget_type_{type_key}")])
+            keyboard.append([InlineKeyboardButton(button_text, callback_data=routes.GADGET_TYPE.data(type_key))])
     
     reply_markup = InlineKeyboardMarkup(keyboard)
     
@@ -147,47 +137,34 @@ async def show_gadgets(update: Update, context: ContextTypes.DEFAULT_TYPE, query
 
 async def show_gadget_type_rarities(update: Update, context: ContextTypes.DEFAULT_TYPE, query, gadget_type: str):
     """Show rarities for a specific gadget type."""
-    from config import GADGET_TYPE_GROUPS, RARITY_ORDER, RARITY_NAMES
-    
     user_id = query.from_user.id
-    cards = database.get_user_cards(user_id)
     
-    type_info = GADGET_TYPE_GROUPS.get(gadget_type)
+    type_info = gadgets.get_gadget_type_groups().get(gadget_type)
     if not type_info:
         await query.answer("Неизвестный тип гаджета! 😢", show_alert=True)
         return
     
-    # Filter cards by type (excluding parts in PC)
-    type_cards = [
-        card for card in cards 
-        if card["category"] in type_info["categories"] and card.get("in_pc") is None
-    ]
+    # Count cards of this type by rarity (excluding parts in PC)
+    summary = await async_database.get_summary(user_id)
+    rarity_counts = summary.rarity_counts(gadget_type)
     
-    if not type_cards:
+    if not rarity_counts:
         await query.answer(f"Нет гаджетов типа {type_info['name']}! 😢", show_alert=True)
         return
     
-    # Group by rarity
-    cards_by_rarity = {}
-    for card in type_cards:
-        rarity = card["rarity"]
-        if rarity not in cards_by_rarity:
-            cards_by_rarity[rarity] = []
-        cards_by_rarity[rarity].append(card)
-    
     message = f"{type_info['name']}\n\nВыбери редкость:"
     
     # Create keyboard with buttons for each rarity
     keyboard = []
     for rarity in RARITY_ORDER:
-        if rarity in cards_by_rarity:
+        if rarity in rarity_counts:
             rarity_emoji = gadgets.get_rarity_emoji(rarity)
-            rarity_ru = RARITY_NAMES.get(rarity, rarity)
-            count = len(cards_by_rarity[rarity])
+            rarity_ru = gadgets.get_rarity_name(rarity)
+            count = rarity_counts[rarity]
             button_text = f"{rarity_emoji} {rarity_ru} ({count})"
-            keyboard.append([InlineKeyboardButton(button_text, callback_data=f"gadget_type_rarity_{gadget_type}_{rarity}")])
+            keyboard.append([InlineKeyboardButton(button_text, callback_data=routes.COLLECTION_PAGE.data(gadget_type, rarity, collection.SORT_PRICE, None))])
     
-    keyboard.append([InlineKeyboardButton("Назад ↩️", callback_data="view_gadgets")])
+    keyboard.append([InlineKeyboardButton("Назад ↩️", callback_data=routes.VIEW_GADGETS.data())])
     
     reply_markup = InlineKeyboardMarkup(keyboard)
     
@@ -195,78 +172,48 @@ async def show_gadget_type_rarities(update: Update, context: ContextTypes.DEFAUL
     await utils.send_or_edit_message(query, None, message, reply_markup, photo_path=utils.IMAGE_PATHS["gadgets"])
 
 
-async def show_gadget_type_rarity_cards(update: Update, context: ContextTypes.DEFAULT_TYPE, query, gadget_type: str, rarity: str):
-    """Show cards of a specific gadget type and rarity."""
-    from config import GADGET_TYPE_GROUPS, RARITY_NAMES
-    
-    print(f"[DEBUG] show_gadget_type_rarity_cards called with: gadget_type={gadget_type}, rarity={rarity}")
+async def show_gadget_type_rarity_cards(update: Update, context: ContextTypes.DEFAULT_TYPE, query, gadget_type: str, rarity: str,
+                                        sort: str = collection.SORT_PRICE, cursor_id: int = None, backward: bool = False):
+    """Show a page of cards of a specific gadget type and rarity."""
+    print(f"[DEBUG] show_gadget_type_rarity_cards called with: gadget_type={gadget_type}, rarity={rarity}, sort={sort}, cursor_id={cursor_id}, backward={backward}")
     
     user_id = query.from_user.id
-    cards = database.get_user_cards(user_id)
-    print(f"[DEBUG] User has {len(cards)} total cards")
     
-    type_info = GADGET_TYPE_GROUPS.get(gadget_type)
+    type_info = gadgets.get_gadget_type_groups().get(gadget_type)
     if not type_info:
         print(f"[DEBUG] ERROR: Unknown gadget_type: {gadget_type}")
         await query.answer("Неизвестный тип гаджета! 😢", show_alert=True)
         return
     
-    print(f"[DEBUG] Type info found: {type_info['name']}, categories: {type_info['categories']}")
-    
-    # Filter cards by type and rarity (excluding parts in PC)
-    filtered_cards = [
-        card for card in cards 
-        if card["category"] in type_info["categories"] 
-        and card["rarity"] == rarity 
-        and card.get("in_pc") is None
-    ]
+    # Read one page from the user's collection index (excluding parts in PC)
+    page = await async_database.browse_cards(user_id, gadget_type, rarity, sort, cursor_id, backward)
+    print(f"[DEBUG] Page: {len(page.cards)} of {page.total} cards, has_prev={page.has_prev}, has_next={page.has_next}")
     
-    print(f"[DEBUG] Filtered cards: {len(filtered_cards)} cards found")
-    for card in filtered_cards[:3]:  # Log first 3 cards
-        print(f"[DEBUG]   - {card['gadget_name']} ({card['category']}, {card['rarity']})")
-    
-    if not filtered_cards:
-        print(f"[DEBUG] No filtered cards found!")
+    if not page.cards:
+        print(f"[DEBUG] No cards found!")
         await query.answer("Нет гаджетов этой редкости! 😢", show_alert=True)
         return
     
     rarity_emoji = gadgets.get_rarity_emoji(rarity)
-    rarity_ru = RARITY_NAMES.get(rarity, rarity)
+    rarity_ru = gadgets.get_rarity_name(rarity)
     
-    count = len(filtered_cards)
-    message = f"{type_info['name']} - {rarity_emoji} {rarity_ru}\n\nВсего: {count}\n\nВыбери гаджет:"
+    message = (
+        f"{type_info['name']} - {rarity_emoji} {rarity_ru}\n\n"
+        f"Всего: {page.total}\n"
+        f"Сортировка: {SORT_NAMES[sort]}\n\n"
+        f"Выбери гаджет:"
+    )
     
-    # Create keyboard with buttons for all cards
+    # Create keyboard with buttons for the cards on this page
     keyboard = []
     row = []
     
-    # Create shorter callback format to avoid Telegram's 64-byte limit
-    # Format: vc_{card_id}_{type_short}_{rarity_short}
-    # Short codes: phones=ph, tablets=tab, pcs=pc, pc_parts=pt, laptops=lap
-    type_short = {
-        "phones": "ph",
-        "tablets": "tab", 
-        "pcs": "pc",
-        "pc_parts": "pt",
-        "laptops": "lap"
-    }.get(gadget_type, gadget_type[:2])
-    
-    # Short rarity codes: Trash=T, Common=C, Uncommon=U, Rare=R, Epic=E, Legendary=L, Mythic=M
-    rarity_short = rarity[0] if rarity else "C"
-    
-    for card in filtered_cards:
-        button_text = card['gadget_name']
-        # Use shorter callback format: vc_{card_id}_{type}_{rarity}
-        callback_data = f"vc_{card['card_id']}_{type_short}_{rarity_short}"
-        
-        # Check callback_data length (Telegram limit is 64 bytes)
-        if len(callback_data.encode('utf-8')) > 64:
-            # Fallback to just card_id if too long
-            callback_data = f"vc_{card['card_id']}"
-            print(f"Warning: callback_data too long, using fallback: {callback_data}")
-        
-        print(f"[DEBUG] Creating button: text='{button_text[:30]}...', callback_data='{callback_data}', length={len(callback_data.encode('utf-8'))} bytes")
-        row.append(InlineKeyboardButton(button_text, callback_data=callback_data))
+    # The card view's back button returns to this list
+    origin = (gadget_type, rarity, sort)
+    
+    for card in page.cards:
+        button_text = card.gadget_name
+        row.append(InlineKeyboardButton(button_text, callback_data=routes.VIEW_CARD.data(card.card_id, origin)))
         if len(row) == 2:
             keyboard.append(row)
             row = []
@@ -274,7 +221,25 @@ async def show_gadget_type_rarity_cards(update: Update, context: ContextTypes.DE
     if row:
         keyboard.append(row)
     
-    keyboard.append([InlineKeyboardButton("Назад ↩️", callback_data=f"gadget_type_{gadget_type}")])
+    # Page navigation
+    nav_row = []
+    if page.has_prev:
+        nav_row.append(InlineKeyboardButton("⬅️", callback_data=routes.COLLECTION_PAGE.data(*origin, (page.cards[0].card_id, True))))
+    if page.has_next:
+        nav_row.append(InlineKeyboardButton("➡️", callback_data=routes.COLLECTION_PAGE.data(*origin, (page.cards[-1].card_id, False))))
+    if nav_row:
+        keyboard.append(nav_row)
+    
+    # Sort orders; changing the order starts from the first page
+    keyboard.append([
+        InlineKeyboardButton(
+            f"✅ {SORT_NAMES[other]}" if other == sort else SORT_NAMES[other],
+            callback_data=routes.COLLECTION_PAGE.data(gadget_type, rarity, other, None)
+        )
+        for other in collection.SORTS
+    ])
+    
+    keyboard.append([InlineKeyboardButton("Назад ↩️", callback_data=routes.GADGET_TYPE.data(gadget_type))])
     
     reply_markup = InlineKeyboardMarkup(keyboard)
     
@@ -285,11 +250,11 @@ async def show_gadget_type_rarity_cards(update: Update, context: ContextTypes.DE
 async def profile_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle /profile command."""
     user_id = update.effective_user.id
-    message = messages.get_profile_message(user_id)
+    message = await async_database.run(messages.get_profile_message, user_id)
     
     keyboard = [
-        [InlineKeyboardButton("Мои Гаджеты 📚", callback_data="view_gadgets")],
-        [InlineKeyboardButton("Назад ↩️", callback_data="back_to_start")]
+        [InlineKeyboardButton("Мои Гаджеты 📚", callback_data=routes.VIEW_GADGETS.data())],
+        [InlineKeyboardButton("Назад ↩️", callback_data=routes.START.data())]
     ]
     reply_markup = InlineKeyboardMarkup(keyboard)
     await update.message.reply_text(message, reply_markup=reply_markup, parse_mode="HTML")
@@ -299,7 +264,7 @@ async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle /help command."""
     message = messages.get_help_message()
     
-    keyboard = [[InlineKeyboardButton("Назад ↩️", callback_data="back_to_start")]]
+    keyboard = [[InlineKeyboardButton("Назад ↩️", callback_data=routes.START.data())]]
     reply_markup = InlineKeyboardMarkup(keyboard)
     
     await update.message.reply_text(message, reply_markup=reply_markup, parse_mode="HTML")
@@ -319,7 +284,7 @@ async def show_build_menu(update: Update, context: ContextTypes.DEFAULT_TYPE, qu
         user_id = update.effective_user.id
         message_obj = update.message
     
-    parts = database.get_available_pc_parts(user_id)
+    parts = await async_database.get_available_pc_parts(user_id)
     
     # Check all parts upfront before asking user to select
     if not selected_gpu:
@@ -335,8 +300,8 @@ async def show_build_menu(update: Update, context: ContextTypes.DEFAULT_TYPE, qu
             message = messages.get_missing_parts_message(missing_parts)
             
             keyboard = [
-                [InlineKeyboardButton("Получить Карточку 🎴", callback_data="get_card")],
-                [InlineKeyboardButton("🔄 Попробовать снова", callback_data="build_pc")]
+                [InlineKeyboardButton("Получить Карточку 🎴", callback_data=routes.GET_CARD.data(1))],
+                [InlineKeyboardButton("🔄 Попробовать снова", callback_data=routes.BUILD_PC.data())]
             ]
             reply_markup = InlineKeyboardMarkup(keyboard)
             
@@ -345,13 +310,23 @@ async def show_build_menu(update: Update, context: ContextTypes.DEFAULT_TYPE, qu
         
         # Step 1: Select GPU (all parts are available)
         
-        message = "🖥️ <b>Сборка Кастомного ПК</b> 🔧\n\n<b>Шаг 1:</b> Выбери видеокарту"
-        keyboard = []
+        message = (
+            "🖥️ <b>Сборка Кастомного ПК</b> 🔧\n\n"
+            "⚡ <b>Авто-сборка</b> сама подберёт лучшие детали.\n\n"
+            "<b>Шаг 1:</b> Выбери видеокарту"
+        )
+        keyboard = [
+            [
+                InlineKeyboardButton("⚡ Самый дорогой", callback_data=routes.AUTO_BUILD.data(pc_builder.GOAL_VALUE)),
+                InlineKeyboardButton("⚡ Самый редкий", callback_data=routes.AUTO_BUILD.data(pc_builder.GOAL_RARITY))
+            ],
+            [InlineKeyboardButton("🏭 Собрать ПК из всех деталей", callback_data=routes.AUTO_BUILD.data(routes.AUTO_BUILD_ALL))]
+        ]
         for card in parts["Graphics Card"]:
-            rarity_emoji = gadgets.get_rarity_emoji(card["rarity"])
-            button_text = f"{rarity_emoji} {card['gadget_name']}"
-            keyboard.append([InlineKeyboardButton(button_text, callback_data=f"build_gpu_{card['card_id']}")])
-        keyboard.append([InlineKeyboardButton("Отмена ❌", callback_data="view_gadgets")])
+            rarity_emoji = gadgets.get_rarity_emoji(card.rarity)
+            button_text = f"{rarity_emoji} {card.gadget_name}"
+            keyboard.append([InlineKeyboardButton(button_text, callback_data=routes.BUILD_GPU.data(card.card_id))])
+        keyboard.append([InlineKeyboardButton("Отмена ❌", callback_data=routes.VIEW_GADGETS.data())])
         reply_markup = InlineKeyboardMarkup(keyboard)
         
         await utils.send_or_edit_message(query, message_obj, message, reply_markup, photo_path=utils.IMAGE_PATHS["build_pc"])
@@ -362,70 +337,64 @@ async def show_build_menu(update: Update, context: ContextTypes.DEFAULT_TYPE, qu
         if not parts["Processor"]:
             message = messages.get_missing_parts_message(["процессоров"])
             keyboard = [
-                [InlineKeyboardButton("Получить Карточку 🎴", callback_data="get_card")],
-                [InlineKeyboardButton("🔄 Попробовать снова", callback_data="build_pc")]
+                [InlineKeyboardButton("Получить Карточку 🎴", callback_data=routes.GET_CARD.data(1))],
+                [InlineKeyboardButton("🔄 Попробовать снова", callback_data=routes.BUILD_PC.data())]
             ]
             reply_markup = InlineKeyboardMarkup(keyboard)
-            await query.edit_message_text(message, reply_markup=reply_markup)
+            await utils.safe_edit_message(query, message, reply_markup, parse_mode=None)
             return
         
-        gpu_card = database.get_card(user_id, selected_gpu)
-        message = f"🖥️ <b>Сборка Кастомного ПК</b> 🔧\n\n<b>Выбрана видеокарта:</b> {gpu_card['gadget_name']}\n\n<b>Шаг 2:</b> Выбери процессор"
+        gpu_card = await async_database.get_card(user_id, selected_gpu)
+        message = f"🖥️ <b>Сборка Кастомного ПК</b> 🔧\n\n<b>Выбрана видеокарта:</b> {gpu_card.gadget_name}\n\n<b>Шаг 2:</b> Выбери процессор"
         keyboard = []
         for card in parts["Processor"]:
-            rarity_emoji = gadgets.get_rarity_emoji(card["rarity"])
-            button_text = f"{rarity_emoji} {card['gadget_name']}"
-            keyboard.append([InlineKeyboardButton(button_text, callback_data=f"build_cpu_{selected_gpu}_{card['card_id']}")])
-        keyboard.append([InlineKeyboardButton("Назад ↩️", callback_data="build_pc")])
+            rarity_emoji = gadgets.get_rarity_emoji(card.rarity)
+            button_text = f"{rarity_emoji} {card.gadget_name}"
+            keyboard.append([InlineKeyboardButton(button_text, callback_data=routes.BUILD_CPU.data(selected_gpu, card.card_id))])
+        keyboard.append([InlineKeyboardButton("Назад ↩️", callback_data=routes.BUILD_PC.data())])
         reply_markup = InlineKeyboardMarkup(keyboard)
         
         # Use build-pc image
         photo_path = utils.IMAGE_PATHS["build_pc"]
-        if os.path.exists(photo_path):
-            from telegram import InputMediaPhoto
-            with open(photo_path, 'rb') as photo:
-                media = InputMediaPhoto(media=photo, caption=message, parse_mode="HTML")
-                await query.edit_message_media(media=media, reply_markup=reply_markup)
+        if assets.exists(photo_path):
+            await images.edit_photo(query, photo_path, message, reply_markup, parse_mode="HTML")
         else:
-            await query.edit_message_text(message, reply_markup=reply_markup, parse_mode="HTML")
+            await utils.safe_edit_message(query, message, reply_markup, parse_mode="HTML")
         return
     
     # Step 3: Select Motherboard (already checked at start, but double-check in case parts were removed)
     if not parts["Motherboard"]:
         message = messages.get_missing_parts_message(["материнских плат"])
         keyboard = [
-            [InlineKeyboardButton("Получить Карточку 🎴", callback_data="get_card")],
-            [InlineKeyboardButton("🔄 Попробовать снова", callback_data="build_pc")]
+            [InlineKeyboardButton("Получить Карточку 🎴", callback_data=routes.GET_CARD.data(1))],
+            [InlineKeyboardButton("🔄 Попробовать снова", callback_data=routes.BUILD_PC.data())]
         ]
         reply_markup = InlineKeyboardMarkup(keyboard)
-        await query.edit_message_text(message, reply_markup=reply_markup)
+        await utils.safe_edit_message(query, message, reply_markup, parse_mode=None)
         return
     
-    gpu_card = database.get_card(user_id, selected_gpu)
-    cpu_card = database.get_card(user_id, selected_cpu)
+    gpu_card = await async_database.get_card(user_id, selected_gpu)
+    cpu_card = await async_database.get_card(user_id, selected_cpu)
     message = (
         f"🖥️ <b>Сборка Кастомного ПК</b> 🔧\n\n"
-        f"<b>Выбрана видеокарта:</b> {gpu_card['gadget_name']}\n"
-        f"<b>Выбран процессор:</b> {cpu_card['gadget_name']}\n\n"
+        f"<b>Выбрана видеокарта:</b> {gpu_card.gadget_name}\n"
+        f"<b>Выбран процессор:</b> {cpu_card.gadget_name}\n\n"
         f"<b>Шаг 3:</b> Выбери материнскую плату"
     )
     keyboard = []
     for card in parts["Motherboard"]:
-        rarity_emoji = gadgets.get_rarity_emoji(card["rarity"])
-        button_text = f"{rarity_emoji} {card['gadget_name']}"
-        keyboard.append([InlineKeyboardButton(button_text, callback_data=f"build_mb_{selected_gpu}_{selected_cpu}_{card['card_id']}")])
-    keyboard.append([InlineKeyboardButton("Назад ↩️", callback_data=f"build_cpu_{selected_gpu}")])
+        rarity_emoji = gadgets.get_rarity_emoji(card.rarity)
+        button_text = f"{rarity_emoji} {card.gadget_name}"
+        keyboard.append([InlineKeyboardButton(button_text, callback_data=routes.BUILD_MB.data(selected_gpu, selected_cpu, card.card_id))])
+    keyboard.append([InlineKeyboardButton("Назад ↩️", callback_data=routes.BUILD_GPU.data(selected_gpu))])
     reply_markup = InlineKeyboardMarkup(keyboard)
     
     # Use build-pc image
     photo_path = utils.IMAGE_PATHS["build_pc"]
-    if os.path.exists(photo_path):
-        from telegram import InputMediaPhoto
-        with open(photo_path, 'rb') as photo:
-            media = InputMediaPhoto(media=photo, caption=message, parse_mode="HTML")
-            await query.edit_message_media(media=media, reply_markup=reply_markup)
+    if assets.exists(photo_path):
+        await images.edit_photo(query, photo_path, message, reply_markup, parse_mode="HTML")
     else:
-        await query.edit_message_text(message, reply_markup=reply_markup, parse_mode="HTML")
+        await utils.safe_edit_message(query, message, reply_markup, parse_mode="HTML")
 
 
 async def show_pcs(update: Update, context: ContextTypes.DEFAULT_TYPE, query=None):
@@ -437,11 +406,11 @@ async def show_pcs(update: Update, context: ContextTypes.DEFAULT_TYPE, query=Non
         user_id = update.effective_user.id
         message_obj = update.message
     
-    pcs = database.get_built_pcs(user_id)
+    pcs = await async_database.get_built_pcs_with_components(user_id)
     
     if not pcs:
         message = "🖥️ У тебя пока нет собранных ПК!\n\nИспользуй /build чтобы создать свой первый ПК! 🚀"
-        keyboard = [[InlineKeyboardButton("Собрать ПК 🛠️", callback_data="build_pc")]]
+        keyboard = [[InlineKeyboardButton("Собрать ПК 🛠️", callback_data=routes.BUILD_PC.data())]]
         reply_markup = InlineKeyboardMarkup(keyboard)
         
         await utils.send_or_edit_message(query, message_obj, message, reply_markup)
@@ -449,22 +418,16 @@ async def show_pcs(update: Update, context: ContextTypes.DEFAULT_TYPE, query=Non
     
     message_parts = ["🖥️ <b>Твои Собранные ПК</b> 💻\n"]
     
-    for pc in pcs:
-        components = pc.get("components", [])
-        specs = pc.get("specs", {})
-        rarity_emoji = gadgets.get_rarity_emoji(pc["rarity"])
-        rarity_ru = RARITY_NAMES.get(pc['rarity'], pc['rarity'])
+    for pc, component_cards in pcs:
+        specs = pc.specs
+        rarity_emoji = gadgets.get_rarity_emoji(pc.rarity)
+        rarity_ru = gadgets.get_rarity_name(pc.rarity)
         
-        # Get component names
-        component_names = []
-        for comp_id in components:
-            comp_card = database.get_card(user_id, comp_id)
-            if comp_card:
-                component_names.append(comp_card["gadget_name"])
+        component_names = [comp_card.gadget_name for comp_card in component_cards]
         
         message_parts.append(
-            f"\n{rarity_emoji} <b>{pc['gadget_name']}</b> ({rarity_ru})\n"
-            f"💰 Цена: {pc['purchase_price']} монет\n"
+            f"\n{rarity_emoji} <b>{pc.gadget_name}</b> ({rarity_ru})\n"
+            f"💰 Цена: {pc.purchase_price} монет\n"
             f"🎮 Видеокарта: {component_names[0] if len(component_names) > 0 else 'Н/Д'}\n"
             f"⚡ Процессор: {component_names[1] if len(component_names) > 1 else 'Н/Д'}\n"
             f"🔌 Материнка: {component_names[2] if len(component_names) > 2 else 'Н/Д'}\n"
@@ -478,45 +441,40 @@ async def show_pcs(update: Update, context: ContextTypes.DEFAULT_TYPE, query=Non
     
     # Create keyboard with buttons for each PC
     keyboard = []
-    for pc in pcs:
-        keyboard.append([InlineKeyboardButton(f"⚙️ {pc['gadget_name'][:18]}", callback_data=f"pc_{pc['card_id']}")])
-    keyboard.append([InlineKeyboardButton("Назад ↩️", callback_data="view_gadgets")])
+    for pc, _ in pcs:
+        keyboard.append([InlineKeyboardButton(f"⚙️ {pc.gadget_name[:18]}", callback_data=routes.VIEW_PC.data(pc.card_id))])
+    keyboard.append([InlineKeyboardButton("Назад ↩️", callback_data=routes.VIEW_GADGETS.data())])
     
     reply_markup = InlineKeyboardMarkup(keyboard)
     
     await utils.send_or_edit_message(query, message_obj, message, reply_markup)
 
 
-async def show_pc_details(user_id: int, pc_card: dict, query, back_callback: str = "view_gadgets", show_back: bool = True, title: str = None):
-    """Reusable function to show PC details with eject buttons and sell option."""
+async def show_pc_details(user_id: int, pc_card: Card, component_cards: list, query, back_callback: str = None, show_back: bool = True, title: str = None):
+    """Reusable function to show PC details with eject buttons and sell option.
     
-    components = pc_card.get("components", [])
-    specs = pc_card.get("specs", {})
+    `component_cards` are the PC's resolved components (see database.get_pc_with_components).
+    """
     
-    # Get component cards
-    component_cards = []
-    for comp_id in components:
-        comp_card = database.get_card(user_id, comp_id)
-        if comp_card:
-            component_cards.append(comp_card)
+    specs = pc_card.specs
     
-    rarity_emoji = gadgets.get_rarity_emoji(pc_card["rarity"])
-    rarity_ru = RARITY_NAMES.get(pc_card['rarity'], pc_card['rarity'])
+    rarity_emoji = gadgets.get_rarity_emoji(pc_card.rarity)
+    rarity_ru = gadgets.get_rarity_name(pc_card.rarity)
     
     # Add title if provided
     title_text = f"{title}\n\n" if title else ""
     message = (
         f"{title_text}"
-        f"{rarity_emoji} <b>{pc_card['gadget_name']}</b> ({rarity_ru})\n\n"
+        f"{rarity_emoji} <b>{pc_card.gadget_name}</b> ({rarity_ru})\n\n"
         f"<b>Компоненты:</b>\n"
     )
     
     if len(component_cards) > 0:
-        message += f"• 🎮 Видеокарта: {component_cards[0]['gadget_name']}\n"
+        message += f"• 🎮 Видеокарта: {component_cards[0].gadget_name}\n"
     if len(component_cards) > 1:
-        message += f"• ⚡ Процессор: {component_cards[1]['gadget_name']}\n"
+        message += f"• ⚡ Процессор: {component_cards[1].gadget_name}\n"
     if len(component_cards) > 2:
-        message += f"• 🔌 Материнка: {component_cards[2]['gadget_name']}\n"
+        message += f"• 🔌 Материнка: {component_cards[2].gadget_name}\n"
     
     message += (
         f"\n<b>Характеристики:</b>\n"
@@ -524,34 +482,33 @@ async def show_pc_details(user_id: int, pc_card: dict, query, back_callback: str
         f"• 💿 Накопитель: {specs.get('storage', 'Н/Д')}\n"
         f"• 🔋 БП: {specs.get('psu', 'Н/Д')}\n"
         f"• 📦 Корпус: {specs.get('case', 'Н/Д')}\n\n"
-        f"<b>Цена:</b> {pc_card['purchase_price']} монет 💰"
+        f"<b>Цена:</b> {pc_card.purchase_price} монет 💰"
     )
     
     keyboard = []
     comp_types_ru = ["Видеокарта", "Процессор", "Материнка"]
     for i, comp_card in enumerate(component_cards):
         comp_type = comp_types_ru[i]
-        keyboard.append([InlineKeyboardButton(f"🔧 Вытащить {comp_type}: {comp_card['gadget_name'][:12]}", callback_data=f"eject_{pc_card['card_id']}_{comp_card['card_id']}")])
+        keyboard.append([InlineKeyboardButton(f"🔧 Вытащить {comp_type}: {comp_card.gadget_name[:12]}", callback_data=routes.EJECT.data(pc_card.card_id, comp_card.card_id))])
     
     # Only show sell button if PC has all 3 components (full PC)
     if len(component_cards) == 3:
         # Calculate PC sale price
-        pc_sale_price = utils.calculate_pc_sale_price(user_id, pc_card)
-        keyboard.append([InlineKeyboardButton(f"💰 Продать ПК ({pc_sale_price} монет)", callback_data=f"confirm_sell_pc_{pc_card['card_id']}")])
+        pc_sale_price = pc_builder.calculate_pc_sale_price(pc_card, component_cards)
+        keyboard.append([InlineKeyboardButton(f"💰 Продать ПК ({pc_sale_price} монет)", callback_data=routes.CONFIRM_SELL_PC.data(pc_card.card_id))])
     else:
         message += "\n\n⚠️ <b>Неполный ПК!</b> Продать можно только полный ПК со всеми компонентами."
     if show_back:
-        keyboard.append([InlineKeyboardButton("Назад ↩️", callback_data=back_callback)])
+        keyboard.append([InlineKeyboardButton("Назад ↩️", callback_data=back_callback or routes.VIEW_GADGETS.data())])
     
     reply_markup = InlineKeyboardMarkup(keyboard)
     
-    # Use photo for PC details
-    photo_path = utils.IMAGE_PATHS["pc"]
-    if os.path.exists(photo_path):
-        from telegram import InputMediaPhoto
-        with open(photo_path, 'rb') as photo:
-            media = InputMediaPhoto(media=photo, caption=message, parse_mode="HTML")
-            await query.edit_message_media(media=media, reply_markup=reply_markup)
+    # Use the PC's card face (or the shared PC photo) for PC details
+    image = await card_render.get_card_image(pc_card)
+    if image is None and assets.exists(utils.IMAGE_PATHS["pc"]):
+        image = utils.IMAGE_PATHS["pc"]
+    if image is not None:
+        await images.edit_photo(query, image, message, reply_markup, parse_mode="HTML")
     else:
-        await query.edit_message_text(message, reply_markup=reply_markup, parse_mode="HTML")
+        await utils.safe_edit_message(query, message, reply_markup, parse_mode="HTML")
 
@@ -13,6 +13,77 @@ BOT_TOKEN = os.getenv("BOT_TOKEN")
 if not BOT_TOKEN:
     raise ValueError("BOT_TOKEN not found in environment variables")
 
+# Storage backend: "json" (data/users.json + data/cards.json), "sqlite",
+# "memory" (write-behind cache in front of MEMORY_BACKING_STORE),
+# "wal" (JSON snapshot + append-only journal) or "sharded" (one file per user)
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "json")
+DATA_DIR = os.getenv("DATA_DIR", "data")
+SQLITE_PATH = os.getenv("SQLITE_PATH", os.path.join(DATA_DIR, "bot.db"))
+SHARD_DIR = os.getenv("SHARD_DIR", os.path.join(DATA_DIR, "users"))
+# Threads that run blocking database calls for the async handlers
+DATABASE_THREADS = int(os.getenv("DATABASE_THREADS", "4"))
+
+# Write-behind settings for the "memory" backend
+MEMORY_BACKING_STORE = os.getenv("MEMORY_BACKING_STORE", "json")
+# Seconds between background flushes of changed users
+WRITE_BEHIND_FLUSH_INTERVAL = float(os.getenv("WRITE_BEHIND_FLUSH_INTERVAL", "5"))
+# Flush early once this many users have unsaved changes
+WRITE_BEHIND_MAX_DIRTY = int(os.getenv("WRITE_BEHIND_MAX_DIRTY", "100"))
+# "periodic": changes may be lost if the process crashes between flushes
+# "immediate": every change is written before the call returns
+WRITE_BEHIND_DURABILITY = os.getenv("WRITE_BEHIND_DURABILITY", "periodic")
+
+# Journal settings for the "wal" backend
+# fsync every journal record (survives power loss, costs a disk sync per change)
+WAL_FSYNC = os.getenv("WAL_FSYNC", "0") == "1"
+# Compact the journal into a new snapshot after this many records
+WAL_COMPACT_RECORDS = int(os.getenv("WAL_COMPACT_RECORDS", "1000"))
+
+# Card counts offered as multi-pulls next to the single draw (/card 10, /card 100)
+MULTI_PULL_SIZES = [10, 100]
+
+# Versioned gadget catalog files (catalog/<version>.json, see gadgets.py)
+CATALOG_DIR = os.getenv("CATALOG_DIR", "catalog")
+# Seconds between checks for a changed or new catalog file
+CATALOG_RELOAD_INTERVAL = float(os.getenv("CATALOG_RELOAD_INTERVAL", "10"))
+
+# Telegram file_ids of uploaded menu images, by image content hash (see images.py)
+IMAGE_CACHE_PATH = os.getenv("IMAGE_CACHE_PATH", os.path.join(DATA_DIR, "image_file_ids.json"))
+
+# Menu images are re-encoded as JPEGs of this quality, and downscaled to at
+# most this many pixels on their longer side, before upload (see assets.py)
+ASSET_JPEG_QUALITY = int(os.getenv("ASSET_JPEG_QUALITY", "85"))
+ASSET_MAX_SIDE = int(os.getenv("ASSET_MAX_SIDE", "1280"))
+
+# Per-gadget card faces (see card_render.py): rendered JPEGs on disk, the
+# font they're drawn with (needs Cyrillic), render processes and how many
+# faces are kept in memory
+CARD_IMAGE_DIR = os.getenv("CARD_IMAGE_DIR", os.path.join(DATA_DIR, "card_images"))
+CARD_FONT_PATH = os.getenv("CARD_FONT_PATH", "DejaVuSans-Bold.ttf")
+CARD_RENDER_PROCESSES = int(os.getenv("CARD_RENDER_PROCESSES", "2"))
+CARD_IMAGE_CACHE_SIZE = int(os.getenv("CARD_IMAGE_CACHE_SIZE", "256"))
+
+# Outbound flood limits (see send_scheduler.py): messages per second overall
+# and per private chat, messages per minute per group, and the burst a chat
+# may send before its limit applies
+SEND_GLOBAL_RATE = float(os.getenv("SEND_GLOBAL_RATE", "30"))
+SEND_CHAT_RATE = float(os.getenv("SEND_CHAT_RATE", "1"))
+SEND_GROUP_RATE = float(os.getenv("SEND_GROUP_RATE", "20"))
+SEND_CHAT_BURST = float(os.getenv("SEND_CHAT_BURST", "3"))
+# Retries of a request Telegram answered with 429 RetryAfter
+SEND_MAX_RETRIES = int(os.getenv("SEND_MAX_RETRIES", "3"))
+# Seconds between send queue metrics in the log (0 turns them off)
+SEND_METRICS_INTERVAL = float(os.getenv("SEND_METRICS_INTERVAL", "60"))
+
+# Edits of one message are coalesced (see edit_coalescer.py): seconds of no
+# taps before the latest pending edit is sent, and how many messages' last
+# sent content is remembered to skip identical edits
+EDIT_DEBOUNCE = float(os.getenv("EDIT_DEBOUNCE", "0.3"))
+EDIT_MESSAGES_KEPT = int(os.getenv("EDIT_MESSAGES_KEPT", "10000"))
+
+# Cards per page in the collection browser (two buttons per row)
+COLLECTION_PAGE_SIZE = 20
+
 # Cooldown time in seconds (30 minutes)
 COOLDOWN_TIME = 30 * 60
 
@@ -23,54 +94,5 @@ INIT_GADGETS = [
     "MacBook Air M4"
 ]
 
-# Translation dictionaries
-RARITY_NAMES = {
-    "Trash": "Мусор",
-    "Common": "Обычная",
-    "Uncommon": "Необычная",
-    "Rare": "Редкая",
-    "Epic": "Эпическая",
-    "Legendary": "Легендарная",
-    "Mythic": "Мифическая"
-}
-
-CATEGORY_NAMES = {
-    "Phone": "Телефон",
-    "Tablet": "Планшет",
-    "Laptop": "Ноутбук",
-    "Graphics Card": "Видеокарта",
-    "Processor": "Процессор",
-    "Motherboard": "Материнская плата",
-    "PC": "ПК"
-}
-
 # Rarity order (from lowest to highest)
 RARITY_ORDER = ["Trash", "Common", "Uncommon", "Rare", "Epic", "Legendary", "Mythic"]
-
-# Gadget type groups
-GADGET_TYPE_GROUPS = {
-    "phones": {
-        "name": "📱 Телефоны",
-        "categories": ["Phone"]
-    },
-    "tablets": {
-        "name": "📱 Планшеты",
-        "categories": ["Tablet"]
-    },
-    "pcs": {
-        "name": "🖥️ ПК",
-        "categories": ["PC"]
-    },
-    "pc_parts": {
-        "name": "🔧 Комплектующие ПК",
-        "categories": ["Graphics Card", "Processor", "Motherboard"]
-    },
-    "laptops": {
-        "name": "💻 Ноутбуки",
-        "categories": ["Laptop"]
-    }
-}
-
-# Gadget type order
-GADGET_TYPE_ORDER = ["phones", "tablets", "pcs", "pc_parts", "laptops"]
-
@@ -1,200 +1,300 @@
 """
-Database operations using JSON files for data persistence.
+Database operations on top of a pluggable storage backend (see storage.py).
 """
 
-import json
-import os
+import threading
 import time
-from typing import Dict, List, Optional
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Tuple
 
-DATA_DIR = "data"
-USERS_FILE = os.path.join(DATA_DIR, "users.json")
-CARDS_FILE = os.path.join(DATA_DIR, "cards.json")
+import config
+from collection import Page, CollectionSummary
+from models import User, Card
+from storage import (
+    Storage, create_storage, apply_record, index_cards,
+    OP_USER, OP_ADD, OP_UPDATE, OP_DELETE
+)
 
+_storage: Optional[Storage] = None
+
+# Per-user locks so transactions on the same user don't interleave
+_user_locks: Dict[int, threading.Lock] = {}
+_user_locks_lock = threading.Lock()
+
+
+def get_storage() -> Storage:
+    """Get the configured storage backend, creating it on first use."""
+    global _storage
+    if _storage is None:
+        _storage = create_storage(config.STORAGE_BACKEND)
+    return _storage
+
+
+def close():
+    """Close the storage backend."""
+    global _storage
+    if _storage is not None:
+        _storage.close()
+        _storage = None
+
+
+def _user_lock(user_id: int) -> threading.Lock:
+    with _user_locks_lock:
+        return _user_locks.setdefault(user_id, threading.Lock())
+
+
+def new_user() -> User:
+    """Get data for a user who has never played."""
+    return User(coins=0, last_card_time=0)
+
+
+def new_card(card_id: int, gadget_name: str, category: str, purchase_price: int, rarity: str) -> Card:
+    """Build a card that isn't in a PC yet."""
+    return Card.create(card_id, gadget_name, category, purchase_price, rarity, obtained_at=time.time())
+
+
+def generate_card_id(card_count: int) -> int:
+    """Generate a card_id (use timestamp + index for uniqueness)."""
+    return int(time.time() * 1000) + card_count
+
+
+class Transaction:
+    """A unit of work on one user's profile and cards.
+
+    Reads see the transaction's own writes. Writes are collected as mutation
+    records and committed with a single `Storage.apply` call, so a multi-step
+    action costs one write and is all-or-nothing. Use `transaction()` rather
+    than creating this directly.
+    """
+
+    def __init__(self, storage: Storage, user_id: int):
+        self.storage = storage
+        self.user_id = user_id
+        self.records: List[Dict] = []
+        self._user: Optional[User] = None
+        self._user_loaded = False
+        # card_id -> card, loaded on first use
+        self._cards: Optional[Dict[int, Card]] = None
+
+    def _load_cards(self) -> Dict[int, Card]:
+        if self._cards is None:
+            self._cards = index_cards(self.storage.get_user_cards(self.user_id))
+        return self._cards
+
+    def _record(self, record: Dict):
+        if record["op"] != OP_USER:
+            self._load_cards()
+        self._user = apply_record(self._user, self._cards, record)
+        self.records.append(record)
+
+    def get_user(self) -> User:
+        """Get user data, create if doesn't exist."""
+        if not self._user_loaded:
+            self._user = self.storage.load_user(self.user_id)
+            self._user_loaded = True
+            if self._user is None:
+                self._record({"op": OP_USER, "d": new_user()})
+        return self._user
+
+    def update_user(self, **kwargs):
+        """Update user data."""
+        self._record({"op": OP_USER, "d": self.get_user().replace(**kwargs)})
+
+    def add_coins(self, amount: int) -> int:
+        """Add coins to user. Returns the new balance."""
+        new_coins = self.get_user().coins + amount
+        self.update_user(coins=new_coins)
+        return new_coins
+
+    def get_user_cards(self) -> List[Card]:
+        """Get all cards for the user."""
+        return list(self._load_cards().values())
+
+    def get_card(self, card_id: int) -> Optional[Card]:
+        """Get a specific card by ID."""
+        return self._load_cards().get(card_id)
+
+    def get_cards(self, card_ids: List[int]) -> List[Card]:
+        """Get several cards by ID, in the order of `card_ids`. Missing IDs are skipped."""
+        cards = self._load_cards()
+        return [cards[card_id] for card_id in card_ids if card_id in cards]
+
+    def add_card(self, gadget_name: str, category: str, purchase_price: int, rarity: str) -> int:
+        """Add a new card to user's collection. Returns card_id."""
+        card_id = generate_card_id(len(self._load_cards()))
+        self._record({"op": OP_ADD, "c": new_card(card_id, gadget_name, category, purchase_price, rarity)})
+        return card_id
+
+    def add_cards(self, gadget_list: List[Dict], draw_seeds: Optional[List[int]] = None) -> List[int]:
+        """Add a card for each gadget (a multi-pull), recording the seed each was
+        drawn with if given. Returns the card_ids in order."""
+        base_id = generate_card_id(len(self._load_cards()))
+        obtained_at = time.time()
+        draw_seeds = draw_seeds or [None] * len(gadget_list)
+        card_ids = []
+        for i, (gadget, draw_seed) in enumerate(zip(gadget_list, draw_seeds)):
+            card = Card.create(
+                base_id + i, gadget["name"], gadget["category"], gadget["price"], gadget["rarity"], obtained_at,
+                draw_seed=draw_seed
+            )
+            self._record({"op": OP_ADD, "c": card})
+            card_ids.append(card.card_id)
+        return card_ids
+
+    def update_card(self, card_id: int, **kwargs) -> bool:
+        """Update card data. Returns True if the card exists."""
+        if card_id not in self._load_cards():
+            return False
+        self._record({"op": OP_UPDATE, "id": card_id, "f": kwargs})
+        return True
 
-def ensure_data_dir():
-    """Create data directory if it doesn't exist."""
-    if not os.path.exists(DATA_DIR):
-        os.makedirs(DATA_DIR)
-
-
-def load_users() -> Dict:
-    """Load users data from JSON file."""
-    ensure_data_dir()
-    if not os.path.exists(USERS_FILE):
-        return {}
-    try:
-        with open(USERS_FILE, 'r') as f:
-            return json.load(f)
-    except (json.JSONDecodeError, IOError):
-        return {}
-
+    def remove_card(self, card_id: int) -> bool:
+        """Remove a card from user's collection. Returns True if removed."""
+        if card_id not in self._load_cards():
+            return False
+        self._record({"op": OP_DELETE, "id": card_id})
+        return True
 
-def save_users(users: Dict):
-    """Save users data to JSON file."""
-    ensure_data_dir()
-    with open(USERS_FILE, 'w') as f:
-        json.dump(users, f, indent=2)
+    def commit(self):
+        """Write all pending changes in one go."""
+        if self.records:
+            self.storage.apply(self.user_id, self.records)
+            self.records = []
 
 
-def load_cards() -> Dict:
-    """Load cards data from JSON file."""
-    ensure_data_dir()
-    if not os.path.exists(CARDS_FILE):
-        return {}
-    try:
-        with open(CARDS_FILE, 'r') as f:
-            return json.load(f)
-    except (json.JSONDecodeError, IOError):
-        return {}
+@contextmanager
+def transaction(user_id: int) -> Iterator[Transaction]:
+    """Run several operations on one user as a single atomic write.
 
+    Nothing is written if the block raises. Transactions on the same user
+    are serialized; don't nest them.
 
-def save_cards(cards: Dict):
-    """Save cards data to JSON file."""
-    ensure_data_dir()
-    with open(CARDS_FILE, 'w') as f:
-        json.dump(cards, f, indent=2)
+        with database.transaction(user_id) as tx:
+            pc_id = tx.add_card(...)
+            tx.update_card(gpu_id, in_pc=pc_id)
+    """
+    with _user_lock(user_id):
+        tx = Transaction(get_storage(), user_id)
+        yield tx
+        tx.commit()
 
 
-def get_user(user_id: int) -> Dict:
+def get_user(user_id: int) -> User:
     """Get user data, create if doesn't exist."""
-    users = load_users()
-    user_id_str = str(user_id)
+    storage = get_storage()
+    user = storage.load_user(user_id)
     
-    if user_id_str not in users:
-        users[user_id_str] = {
-            "coins": 0,
-            "last_card_time": 0
-        }
-        save_users(users)
+    if user is None:
+        # Under the user's lock, so a transaction creating the user at the
+        # same time isn't overwritten with a fresh one
+        with _user_lock(user_id):
+            user = storage.load_user(user_id)
+            if user is None:
+                user = new_user()
+                storage.save_user(user_id, user)
     
-    return users[user_id_str]
+    return user
 
 
 def update_user(user_id: int, **kwargs):
     """Update user data."""
-    users = load_users()
-    user_id_str = str(user_id)
-    
-    if user_id_str not in users:
-        users[user_id_str] = {"coins": 0, "last_card_time": 0}
-    
-    users[user_id_str].update(kwargs)
-    save_users(users)
+    with transaction(user_id) as tx:
+        tx.update_user(**kwargs)
 
 
 def add_coins(user_id: int, amount: int):
     """Add coins to user."""
-    user = get_user(user_id)
-    new_coins = user["coins"] + amount
-    update_user(user_id, coins=new_coins)
-    return new_coins
+    with transaction(user_id) as tx:
+        return tx.add_coins(amount)
 
 
-def get_user_cards(user_id: int) -> List[Dict]:
+def get_user_cards(user_id: int) -> List[Card]:
     """Get all cards for a user."""
-    cards = load_cards()
-    user_id_str = str(user_id)
-    return cards.get(user_id_str, [])
+    return get_storage().get_user_cards(user_id)
 
 
 def add_card(user_id: int, gadget_name: str, category: str, purchase_price: int, rarity: str) -> int:
     """Add a new card to user's collection. Returns card_id."""
-    cards = load_cards()
-    user_id_str = str(user_id)
-    
-    if user_id_str not in cards:
-        cards[user_id_str] = []
-    
-    # Generate card_id (use timestamp + index for uniqueness)
-    card_id = int(time.time() * 1000) + len(cards[user_id_str])
-    
-    new_card = {
-        "card_id": card_id,
-        "gadget_name": gadget_name,
-        "category": category,
-        "purchase_price": purchase_price,
-        "rarity": rarity,
-        "obtained_at": time.time(),
-        "in_pc": None,
-        "components": [],
-        "specs": {}
-    }
-    
-    cards[user_id_str].append(new_card)
-    save_cards(cards)
+    storage = get_storage()
+    card_id = generate_card_id(storage.count_user_cards(user_id))
+    storage.insert_card(user_id, new_card(card_id, gadget_name, category, purchase_price, rarity))
     return card_id
 
 
+def add_cards(user_id: int, gadget_list: List[Dict], draw_seeds: Optional[List[int]] = None) -> List[int]:
+    """Add a card for each gadget in one write. Returns the card_ids in order."""
+    with transaction(user_id) as tx:
+        return tx.add_cards(gadget_list, draw_seeds)
+
+
 def remove_card(user_id: int, card_id: int) -> bool:
     """Remove a card from user's collection. Returns True if removed."""
-    cards = load_cards()
-    user_id_str = str(user_id)
-    
-    if user_id_str not in cards:
-        return False
-    
-    original_length = len(cards[user_id_str])
-    cards[user_id_str] = [c for c in cards[user_id_str] if c["card_id"] != card_id]
-    
-    if len(cards[user_id_str]) < original_length:
-        save_cards(cards)
-        return True
-    return False
+    return get_storage().delete_card(user_id, card_id)
 
 
-def get_card(user_id: int, card_id: int) -> Optional[Dict]:
+def get_card(user_id: int, card_id: int) -> Optional[Card]:
     """Get a specific card by ID."""
-    cards = get_user_cards(user_id)
-    for card in cards:
-        if card["card_id"] == card_id:
-            return card
-    return None
+    return get_storage().get_card(user_id, card_id)
+
+
+def get_cards(user_id: int, card_ids: List[int]) -> List[Card]:
+    """Get several cards by ID in one read. Missing IDs are skipped."""
+    return get_storage().get_cards(user_id, card_ids)
 
 
 def update_card(user_id: int, card_id: int, **kwargs):
     """Update card data."""
-    cards = load_cards()
-    user_id_str = str(user_id)
-    
-    if user_id_str not in cards:
-        return False
-    
-    for card in cards[user_id_str]:
-        if card["card_id"] == card_id:
-            card.update(kwargs)
-            save_cards(cards)
-            return True
-    return False
+    return get_storage().update_card(user_id, card_id, kwargs)
 
 
-def get_available_pc_parts(user_id: int) -> Dict[str, List[Dict]]:
+def get_available_pc_parts(user_id: int) -> Dict[str, List[Card]]:
     """Get available PC parts (not in a PC) grouped by category."""
-    cards = get_user_cards(user_id)
     parts = {
         "Graphics Card": [],
         "Processor": [],
         "Motherboard": []
     }
     
-    for card in cards:
-        if card["category"] in parts and card.get("in_pc") is None:
-            parts[card["category"]].append(card)
+    for card in get_storage().find_cards(user_id, categories=list(parts), free_only=True):
+        parts[card.category].append(card)
     
     return parts
 
 
-def get_built_pcs(user_id: int) -> List[Dict]:
+def browse_cards(user_id: int, gadget_type: str, rarity: str, sort: str,
+                 cursor_id: Optional[int] = None, backward: bool = False) -> Page:
+    """Get a page of user's free cards of a gadget type and rarity (see collection.py)."""
+    return get_storage().browse_cards(
+        user_id, gadget_type, rarity, sort, cursor_id, backward, limit=config.COLLECTION_PAGE_SIZE
+    )
+
+
+def get_summary(user_id: int) -> CollectionSummary:
+    """Get the card counts and collection value of a user."""
+    return get_storage().get_summary(user_id)
+
+
+def get_built_pcs(user_id: int) -> List[Card]:
     """Get all built PCs for a user."""
-    cards = get_user_cards(user_id)
-    return [card for card in cards if card["category"] == "PC"]
+    return get_storage().find_cards(user_id, categories=["PC"])
+
+
+def get_built_pcs_with_components(user_id: int) -> List[Tuple[Card, List[Card]]]:
+    """Get all built PCs for a user as (pc_card, component_cards) pairs."""
+    return get_storage().get_pcs(user_id)
+
+
+def get_pc_with_components(user_id: int, pc_id: int) -> Tuple[Optional[Card], List[Card]]:
+    """Get a PC and its component cards. Returns (None, []) if there is no such PC."""
+    pcs = get_storage().get_pcs(user_id, [pc_id])
+    return pcs[0] if pcs else (None, [])
 
 
 def user_has_gadget(user_id: int, gadget_name: str) -> bool:
     """Check if user already has a specific gadget."""
     cards = get_user_cards(user_id)
     for card in cards:
-        if card["gadget_name"] == gadget_name:
+        if card.gadget_name == gadget_name:
             return True
     return False
 
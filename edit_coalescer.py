@@ -0,0 +1,184 @@
+"""
+Edit coalescing: rapid taps on one message's buttons send one edit, not one per tap.
+
+Every edit of a callback query's message goes through `edit()` with a
+description of what it shows (text or photo, caption, buttons). Per message:
+
+- an edit after EDIT_DEBOUNCE seconds without any is sent right away;
+- edits that come in sooner, or while one is being sent (it may be waiting
+  on the send scheduler's flood limits), wait in a single pending slot, and
+  each replaces the one before it. Once the message has been quiet for
+  EDIT_DEBOUNCE seconds, only the latest is sent; the replaced ones are
+  dropped, so a burst of taps costs two edits at most;
+- an edit showing exactly what the message already shows (same content hash
+  as the last edit sent) is skipped. Telegram would reject it with "message
+  is not modified" anyway, and that error is treated as a skip too.
+
+Edits to one message are sent one at a time and in order, so with updates
+handled concurrently an older view can't overwrite a newer one.
+"""
+
+import asyncio
+import hashlib
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional
+
+from telegram.error import BadRequest
+
+import config
+
+
+def is_not_modified_error(error: BadRequest) -> bool:
+    # Editing a message to the same content and buttons
+    return "message is not modified" in str(error).lower()
+
+
+def content_digest(*parts, reply_markup=None) -> str:
+    """Hash what an edit shows: its kind and content, and its buttons."""
+    markup = reply_markup.to_json() if reply_markup is not None else ""
+    return hashlib.sha256(repr(parts + (markup,)).encode("utf-8")).hexdigest()
+
+
+def message_key(query) -> Hashable:
+    if query.message is not None:
+        return (query.message.chat_id, query.message.message_id)
+    return query.inline_message_id
+
+
+class MessageState:
+    __slots__ = ("sent", "busy", "pending", "last_submit", "timer")
+
+    def __init__(self):
+        # Digest of the last edit sent, None if unknown (e.g. the last edit failed)
+        self.sent: Optional[str] = None
+        # An edit is being sent, or has been handed its turn
+        self.busy = False
+        # The waiting edit: resolved True when it's its turn, False if replaced
+        self.pending: Optional[asyncio.Future] = None
+        self.last_submit = 0.0
+        self.timer: Optional[asyncio.TimerHandle] = None
+
+    def idle(self) -> bool:
+        return not self.busy and self.pending is None
+
+
+class EditCoalescer:
+    """Per-message edit queue of length one, with identical edits skipped."""
+
+    def __init__(self, debounce: float, max_messages: int):
+        self.debounce = debounce
+        self.max_messages = max_messages
+        self._messages: "OrderedDict[Hashable, MessageState]" = OrderedDict()
+        self.counts = {"sent": 0, "skipped": 0, "replaced": 0}
+
+    def _state(self, key: Hashable) -> MessageState:
+        state = self._messages.get(key)
+        if state is None:
+            state = self._messages[key] = MessageState()
+            if len(self._messages) > self.max_messages:
+                # Forget the least recently edited message with nothing in flight
+                for old_key, old_state in self._messages.items():
+                    if old_key != key and old_state.idle():
+                        del self._messages[old_key]
+                        break
+        else:
+            self._messages.move_to_end(key)
+        return state
+
+    async def edit(self, key: Hashable, digest: str, send: Callable[[], Awaitable[Any]]):
+        """Send an edit of a message, unless it gets replaced by a newer edit
+        first or it changes nothing. Returns what `send` returns, or None."""
+        state = self._state(key)
+        now = time.monotonic()
+        quiet = now - state.last_submit >= self.debounce
+        state.last_submit = now
+        if state.idle() and quiet:
+            return await self._send(state, digest, send)
+
+        if state.pending is not None and not state.pending.done():
+            state.pending.set_result(False)
+            self.counts["replaced"] += 1
+        ticket = asyncio.get_running_loop().create_future()
+        state.pending = ticket
+        if not state.busy:
+            self._schedule_release(state)
+        try:
+            turn = await ticket
+        except asyncio.CancelledError:
+            if ticket.done() and not ticket.cancelled() and ticket.result():
+                # Cancelled after being handed the turn: pass it on
+                state.busy = False
+                self._schedule_release(state)
+            raise
+        if not turn:
+            return None
+        return await self._send(state, digest, send)
+
+    async def _send(self, state: MessageState, digest: str, send: Callable[[], Awaitable[Any]]):
+        state.busy = True
+        try:
+            if digest == state.sent:
+                self.counts["skipped"] += 1
+                return None
+            try:
+                result = await send()
+            except BadRequest as e:
+                if not is_not_modified_error(e):
+                    state.sent = None
+                    raise
+                self.counts["skipped"] += 1
+                result = None
+            except BaseException:
+                state.sent = None
+                raise
+            else:
+                self.counts["sent"] += 1
+            state.sent = digest
+            return result
+        finally:
+            state.busy = False
+            if state.pending is not None:
+                self._schedule_release(state)
+
+    def _schedule_release(self, state: MessageState):
+        if state.timer is not None:
+            state.timer.cancel()
+        state.timer = asyncio.get_running_loop().call_later(
+            max(0.0, state.last_submit + self.debounce - time.monotonic()), self._release, state
+        )
+
+    def _release(self, state: MessageState):
+        """Give the pending edit its turn once the message has been quiet long enough."""
+        state.timer = None
+        if state.busy:
+            # The edit being sent schedules this again when it's done
+            return
+        ticket = state.pending
+        if ticket is None or ticket.done():
+            state.pending = None
+            return
+        if time.monotonic() < state.last_submit + self.debounce:
+            self._schedule_release(state)
+            return
+        state.pending = None
+        state.busy = True
+        ticket.set_result(True)
+
+    def stats(self) -> Dict[str, int]:
+        return dict(self.counts, messages=len(self._messages))
+
+
+_coalescer: Optional[EditCoalescer] = None
+
+
+def get_coalescer() -> EditCoalescer:
+    global _coalescer
+    if _coalescer is None:
+        _coalescer = EditCoalescer(config.EDIT_DEBOUNCE, config.EDIT_MESSAGES_KEPT)
+    return _coalescer
+
+
+async def edit(query, digest: str, send: Callable[[], Awaitable[Any]]):
+    """Coalesce an edit of a callback query's message (see the module docstring)."""
+    return await get_coalescer().edit(message_key(query), digest, send)
@@ -1,7 +1,26 @@
 """
 Gadget catalog with all available gadgets and their properties.
+
+The catalog lives in versioned data files, catalog/<version>.json, holding the
+gadgets plus the rarity/category names and gadget type groups shown to
+players. The newest version is the current catalog. A background watcher
+reloads it when the file changes or a newer version appears, and swaps the
+compiled catalog in with a single reference assignment, so handlers never wait
+for a reload and never see a half-built catalog.
+
+Packed cards refer to gadgets by (catalog version, position), so:
+- within a version, gadgets may only be appended;
+- renaming, repricing, removing or reordering gadgets needs a new version file.
+Older versions are loaded on demand to resolve cards written against them.
 """
 
+import json
+import os
+import random
+import threading
+
+import config
+
 # Rarity levels
 RARITY_TRASH = "Trash"
 RARITY_COMMON = "Common"
@@ -20,201 +39,398 @@ CATEGORY_PROCESSOR = "Processor"
 CATEGORY_MOTHERBOARD = "Motherboard"
 CATEGORY_PC = "PC"
 
-# All gadgets catalog
-GADGETS = [
-    # Phones
-    {"name": "iPhone 6", "category": CATEGORY_PHONE, "price": 50, "rarity": RARITY_TRASH},
-    {"name": "Samsung Galaxy S5", "category": CATEGORY_PHONE, "price": 40, "rarity": RARITY_TRASH},
-    {"name": "iPhone 7", "category": CATEGORY_PHONE, "price": 60, "rarity": RARITY_TRASH},
-    
-    {"name": "iPhone 11", "category": CATEGORY_PHONE, "price": 300, "rarity": RARITY_TRASH},
-    {"name": "Samsung Galaxy A54", "category": CATEGORY_PHONE, "price": 250, "rarity": RARITY_COMMON},
-    {"name": "iPhone XR", "category": CATEGORY_PHONE, "price": 280, "rarity": RARITY_TRASH},
-    
-    {"name": "iPhone 12", "category": CATEGORY_PHONE, "price": 450, "rarity": RARITY_TRASH},
-    {"name": "Google Pixel 6", "category": CATEGORY_PHONE, "price": 400, "rarity": RARITY_UNCOMMON},
-    {"name": "Samsung Galaxy S20", "category": CATEGORY_PHONE, "price": 420, "rarity": RARITY_UNCOMMON},
-    
-    {"name": "iPhone 14", "category": CATEGORY_PHONE, "price": 650, "rarity": RARITY_TRASH},
-    {"name": "Google Pixel 7", "category": CATEGORY_PHONE, "price": 550, "rarity": RARITY_RARE},
-    {"name": "Samsung Galaxy S22", "category": CATEGORY_PHONE, "price": 600, "rarity": RARITY_RARE},
-    
-    {"name": "iPhone 15", "category": CATEGORY_PHONE, "price": 850, "rarity": RARITY_TRASH},
-    {"name": "Samsung Galaxy S23", "category": CATEGORY_PHONE, "price": 800, "rarity": RARITY_EPIC},
-    {"name": "Google Pixel 8", "category": CATEGORY_PHONE, "price": 700, "rarity": RARITY_EPIC},
-    
-    {"name": "iPhone 16 Pro Max", "category": CATEGORY_PHONE, "price": 1200, "rarity": RARITY_TRASH},
-    {"name": "Samsung Galaxy S24 Ultra", "category": CATEGORY_PHONE, "price": 1100, "rarity": RARITY_LEGENDARY},
-    {"name": "OnePlus 12", "category": CATEGORY_PHONE, "price": 900, "rarity": RARITY_LEGENDARY},
-    
-    {"name": "iPhone 17 Pro Max", "category": CATEGORY_PHONE, "price": 1500, "rarity": RARITY_TRASH},
-    {"name": "Samsung Galaxy S25 Ultra", "category": CATEGORY_PHONE, "price": 1400, "rarity": RARITY_MYTHIC},
-    
-    # Tablets
-    {"name": "iPad Air 2", "category": CATEGORY_TABLET, "price": 100, "rarity": RARITY_TRASH},
-    {"name": "Samsung Galaxy Tab S2", "category": CATEGORY_TABLET, "price": 80, "rarity": RARITY_TRASH},
-    
-    {"name": "iPad (9th gen)", "category": CATEGORY_TABLET, "price": 300, "rarity": RARITY_COMMON},
-    {"name": "Samsung Galaxy Tab A8", "category": CATEGORY_TABLET, "price": 200, "rarity": RARITY_COMMON},
-    
-    {"name": "iPad Air (4th gen)", "category": CATEGORY_TABLET, "price": 500, "rarity": RARITY_UNCOMMON},
-    {"name": "Samsung Galaxy Tab S7", "category": CATEGORY_TABLET, "price": 450, "rarity": RARITY_UNCOMMON},
-    
-    {"name": "iPad Air (5th gen)", "category": CATEGORY_TABLET, "price": 600, "rarity": RARITY_RARE},
-    {"name": "Samsung Galaxy Tab S8", "category": CATEGORY_TABLET, "price": 550, "rarity": RARITY_RARE},
-    
-    {"name": "iPad Pro 11\" M2", "category": CATEGORY_TABLET, "price": 900, "rarity": RARITY_EPIC},
-    {"name": "Microsoft Surface Pro 9", "category": CATEGORY_TABLET, "price": 1000, "rarity": RARITY_EPIC},
-    {"name": "Samsung Galaxy Tab S9", "category": CATEGORY_TABLET, "price": 800, "rarity": RARITY_EPIC},
-    
-    {"name": "iPad Pro 12.9\" M2", "category": CATEGORY_TABLET, "price": 1200, "rarity": RARITY_LEGENDARY},
-    {"name": "Samsung Galaxy Tab S9 Ultra", "category": CATEGORY_TABLET, "price": 1100, "rarity": RARITY_LEGENDARY},
-    
-    {"name": "iPad Pro M4", "category": CATEGORY_TABLET, "price": 1400, "rarity": RARITY_MYTHIC},
-    {"name": "Samsung Galaxy Tab S10 Ultra", "category": CATEGORY_TABLET, "price": 1300, "rarity": RARITY_MYTHIC},
-    
-    # Laptops
-    {"name": "MacBook Air 2015", "category": CATEGORY_LAPTOP, "price": 200, "rarity": RARITY_TRASH},
-    {"name": "Dell Inspiron 3000", "category": CATEGORY_LAPTOP, "price": 250, "rarity": RARITY_TRASH},
-    
-    {"name": "MacBook Air M1", "category": CATEGORY_LAPTOP, "price": 800, "rarity": RARITY_COMMON},
-    {"name": "Dell Inspiron 15", "category": CATEGORY_LAPTOP, "price": 600, "rarity": RARITY_COMMON},
-    
-    {"name": "MacBook Pro M1", "category": CATEGORY_LAPTOP, "price": 1200, "rarity": RARITY_UNCOMMON},
-    {"name": "Dell XPS 13 (2020)", "category": CATEGORY_LAPTOP, "price": 1000, "rarity": RARITY_UNCOMMON},
-    
-    {"name": "MacBook Pro M2", "category": CATEGORY_LAPTOP, "price": 1500, "rarity": RARITY_RARE},
-    {"name": "Dell XPS 13 (2022)", "category": CATEGORY_LAPTOP, "price": 1300, "rarity": RARITY_RARE},
-    
-    {"name": "MacBook Pro M3", "category": CATEGORY_LAPTOP, "price": 1800, "rarity": RARITY_EPIC},
-    {"name": "Lenovo ThinkPad X1 Carbon", "category": CATEGORY_LAPTOP, "price": 1600, "rarity": RARITY_EPIC},
-    {"name": "MacBook Air M4", "category": CATEGORY_LAPTOP, "price": 1700, "rarity": RARITY_EPIC},
-    
-    {"name": "MacBook Pro M3 Max", "category": CATEGORY_LAPTOP, "price": 2500, "rarity": RARITY_LEGENDARY},
-    {"name": "Razer Blade 18", "category": CATEGORY_LAPTOP, "price": 2800, "rarity": RARITY_LEGENDARY},
-    {"name": "MacBook Pro M5", "category": CATEGORY_LAPTOP, "price": 2400, "rarity": RARITY_LEGENDARY},
-    
-    {"name": "MacBook Pro M5 Max", "category": CATEGORY_LAPTOP, "price": 3500, "rarity": RARITY_MYTHIC},
-    
-    # Graphics Cards
-    {"name": "GTX 750 Ti", "category": CATEGORY_GRAPHICS_CARD, "price": 50, "rarity": RARITY_TRASH},
-    {"name": "GTX 950", "category": CATEGORY_GRAPHICS_CARD, "price": 60, "rarity": RARITY_TRASH},
-    
-    {"name": "GTX 1050", "category": CATEGORY_GRAPHICS_CARD, "price": 100, "rarity": RARITY_COMMON},
-    {"name": "GTX 1060", "category": CATEGORY_GRAPHICS_CARD, "price": 150, "rarity": RARITY_COMMON},
-    {"name": "GTX 1650", "category": CATEGORY_GRAPHICS_CARD, "price": 120, "rarity": RARITY_COMMON},
-    
-    {"name": "GTX 1660", "category": CATEGORY_GRAPHICS_CARD, "price": 200, "rarity": RARITY_UNCOMMON},
-    {"name": "GTX 1660 Super", "category": CATEGORY_GRAPHICS_CARD, "price": 220, "rarity": RARITY_UNCOMMON},
-    {"name": "RTX 2060", "category": CATEGORY_GRAPHICS_CARD, "price": 250, "rarity": RARITY_UNCOMMON},
-    
-    {"name": "RTX 3060", "category": CATEGORY_GRAPHICS_CARD, "price": 350, "rarity": RARITY_RARE},
-    {"name": "RTX 3060 Ti", "category": CATEGORY_GRAPHICS_CARD, "price": 400, "rarity": RARITY_RARE},
-    {"name": "RTX 3070", "category": CATEGORY_GRAPHICS_CARD, "price": 500, "rarity": RARITY_RARE},
-    
-    {"name": "RTX 4070", "category": CATEGORY_GRAPHICS_CARD, "price": 600, "rarity": RARITY_EPIC},
-    {"name": "RTX 4070 Ti", "category": CATEGORY_GRAPHICS_CARD, "price": 700, "rarity": RARITY_EPIC},
-    {"name": "RTX 4080", "category": CATEGORY_GRAPHICS_CARD, "price": 900, "rarity": RARITY_EPIC},
-    
-    {"name": "RTX 4090", "category": CATEGORY_GRAPHICS_CARD, "price": 1500, "rarity": RARITY_LEGENDARY},
-    {"name": "AMD RX 7900 XTX", "category": CATEGORY_GRAPHICS_CARD, "price": 1400, "rarity": RARITY_LEGENDARY},
-    
-    {"name": "RTX 5090", "category": CATEGORY_GRAPHICS_CARD, "price": 2000, "rarity": RARITY_MYTHIC},
-    
-    # Processors
-    {"name": "Intel Core i5-4460", "category": CATEGORY_PROCESSOR, "price": 40, "rarity": RARITY_TRASH},
-    {"name": "AMD FX-8350", "category": CATEGORY_PROCESSOR, "price": 50, "rarity": RARITY_TRASH},
-    
-    {"name": "AMD Ryzen 5 3600", "category": CATEGORY_PROCESSOR, "price": 150, "rarity": RARITY_COMMON},
-    {"name": "Intel Core i5-10400", "category": CATEGORY_PROCESSOR, "price": 140, "rarity": RARITY_COMMON},
-    
-    {"name": "AMD Ryzen 5 5600X", "category": CATEGORY_PROCESSOR, "price": 200, "rarity": RARITY_UNCOMMON},
-    {"name": "Intel Core i7-10700K", "category": CATEGORY_PROCESSOR, "price": 250, "rarity": RARITY_UNCOMMON},
-    
-    {"name": "AMD Ryzen 7 7700X", "category": CATEGORY_PROCESSOR, "price": 350, "rarity": RARITY_RARE},
-    {"name": "Intel Core i7-13700K", "category": CATEGORY_PROCESSOR, "price": 380, "rarity": RARITY_RARE},
-    
-    {"name": "AMD Ryzen 9 7900X", "category": CATEGORY_PROCESSOR, "price": 500, "rarity": RARITY_EPIC},
-    {"name": "Intel Core i9-13900K", "category": CATEGORY_PROCESSOR, "price": 550, "rarity": RARITY_EPIC},
-    
-    {"name": "AMD Ryzen 9 7950X", "category": CATEGORY_PROCESSOR, "price": 700, "rarity": RARITY_LEGENDARY},
-    {"name": "Intel Core i9-14900K", "category": CATEGORY_PROCESSOR, "price": 750, "rarity": RARITY_LEGENDARY},
-    
-    {"name": "AMD Ryzen 9 9950X", "category": CATEGORY_PROCESSOR, "price": 900, "rarity": RARITY_MYTHIC},
-    {"name": "Intel Core i9-15900K", "category": CATEGORY_PROCESSOR, "price": 950, "rarity": RARITY_MYTHIC},
-    
-    # Motherboards
-    {"name": "ASUS H81M-K", "category": CATEGORY_MOTHERBOARD, "price": 40, "rarity": RARITY_TRASH},
-    {"name": "MSI B85M-E45", "category": CATEGORY_MOTHERBOARD, "price": 45, "rarity": RARITY_TRASH},
-    {"name": "ASRock A320M-HDV", "category": CATEGORY_MOTHERBOARD, "price": 50, "rarity": RARITY_TRASH},
-    
-    {"name": "ASUS B450M-A", "category": CATEGORY_MOTHERBOARD, "price": 80, "rarity": RARITY_COMMON},
-    {"name": "MSI B460M Pro-VDH", "category": CATEGORY_MOTHERBOARD, "price": 85, "rarity": RARITY_COMMON},
-    {"name": "Gigabyte H510M H", "category": CATEGORY_MOTHERBOARD, "price": 75, "rarity": RARITY_COMMON},
-    {"name": "Biostar B250MHC", "category": CATEGORY_MOTHERBOARD, "price": 70, "rarity": RARITY_COMMON},
-    
-    {"name": "ASUS B550M-A", "category": CATEGORY_MOTHERBOARD, "price": 120, "rarity": RARITY_UNCOMMON},
-    {"name": "MSI B560M Pro-VDH", "category": CATEGORY_MOTHERBOARD, "price": 130, "rarity": RARITY_UNCOMMON},
-    {"name": "ASRock X570 Phantom Gaming 4", "category": CATEGORY_MOTHERBOARD, "price": 150, "rarity": RARITY_UNCOMMON},
-    
-    {"name": "ASUS B650M-A", "category": CATEGORY_MOTHERBOARD, "price": 180, "rarity": RARITY_RARE},
-    {"name": "MSI Z690-A Pro", "category": CATEGORY_MOTHERBOARD, "price": 200, "rarity": RARITY_RARE},
-    {"name": "Gigabyte X670 Gaming X", "category": CATEGORY_MOTHERBOARD, "price": 220, "rarity": RARITY_RARE},
-    
-    {"name": "ASUS B650E-F", "category": CATEGORY_MOTHERBOARD, "price": 280, "rarity": RARITY_EPIC},
-    {"name": "MSI Z790-A Pro", "category": CATEGORY_MOTHERBOARD, "price": 300, "rarity": RARITY_EPIC},
-    {"name": "ASRock X670E Steel Legend", "category": CATEGORY_MOTHERBOARD, "price": 320, "rarity": RARITY_EPIC},
-    
-    {"name": "ASUS X870E-E", "category": CATEGORY_MOTHERBOARD, "price": 400, "rarity": RARITY_LEGENDARY},
-    {"name": "MSI Z890-A Pro", "category": CATEGORY_MOTHERBOARD, "price": 420, "rarity": RARITY_LEGENDARY},
-    
-    {"name": "ASUS X870E Extreme", "category": CATEGORY_MOTHERBOARD, "price": 600, "rarity": RARITY_MYTHIC},
-    {"name": "MSI Z890 Godlike", "category": CATEGORY_MOTHERBOARD, "price": 650, "rarity": RARITY_MYTHIC},
-]
+
+
+# Rarity probabilities (must add up to 100%)
+RARITY_PROBABILITIES = {
+    RARITY_TRASH: 30,      # 30%
+    RARITY_COMMON: 25,     # 25%
+    RARITY_UNCOMMON: 20,   # 20%
+    RARITY_RARE: 15,       # 15%
+    RARITY_EPIC: 7,        # 7%
+    RARITY_LEGENDARY: 2,   # 2%
+    RARITY_MYTHIC: 1,      # 1%
+}
+
+
+class AliasSampler:
+    """Weighted random choice in O(1) per draw (Vose's alias method).
+
+    Building the tables is O(n); every draw then costs one random number.
+    """
+
+    def __init__(self, items, weights):
+        n = len(items)
+        if n == 0:
+            raise ValueError("Can't sample from an empty list")
+        total = sum(weights)
+        self.items = list(items)
+        self.probabilities = [0.0] * n
+        self.aliases = list(range(n))
+
+        scaled = [weight * n / total for weight in weights]
+        small = [i for i, p in enumerate(scaled) if p < 1]
+        large = [i for i, p in enumerate(scaled) if p >= 1]
+        while small and large:
+            s, l = small.pop(), large.pop()
+            self.probabilities[s] = scaled[s]
+            self.aliases[s] = l
+            scaled[l] -= 1 - scaled[s]
+            (small if scaled[l] < 1 else large).append(l)
+        # Whatever is left has probability 1 up to rounding error
+        for i in small + large:
+            self.probabilities[i] = 1.0
+
+    def pick(self, u):
+        """Pick the item for a uniform random number `u` in [0, 1)."""
+        u *= len(self.items)
+        i = int(u)
+        if u - i < self.probabilities[i]:
+            return self.items[i]
+        return self.items[self.aliases[i]]
+
+    def pick_many(self, uniforms):
+        """Pick an item for each uniform random number in one pass over the tables."""
+        n = len(self.items)
+        items, probabilities, aliases = self.items, self.probabilities, self.aliases
+        result = []
+        append = result.append
+        for u in uniforms:
+            u *= n
+            i = int(u)
+            append(items[i] if u - i < probabilities[i] else items[aliases[i]])
+        return result
+
+    def sample(self, rng=random):
+        """Pick one item."""
+        return self.pick(rng.random())
+
+    def sample_many(self, count, rng=random):
+        """Pick `count` items (with repetition)."""
+        return self.pick_many([rng.random() for _ in range(count)])
+
+
+MASK64 = (1 << 64) - 1
+
+
+def seed_to_uniform(seed):
+    """Map a draw seed to a uniform number in [0, 1) (splitmix64 finalizer).
+
+    The draw for a seed never changes, so a stored seed replays its draw.
+    """
+    z = (seed + 0x9E3779B97F4A7C15) & MASK64
+    z = ((z ^ (z >> 30)) * 0xBF58476D1CE4E5B9) & MASK64
+    z = ((z ^ (z >> 27)) * 0x94D049BB133111EB) & MASK64
+    z ^= z >> 31
+    return (z >> 11) * (1.0 / (1 << 53))
+
+
+class DrawRng:
+    """Source of per-draw seeds.
+
+    Each card draw gets its own seed and the drawn gadget is a pure function of
+    that seed and the catalog, so the seed stored on the card is enough to
+    audit the draw. Seeds come from the OS entropy pool, or from a seeded
+    generator for reproducible runs (benchmarks, tests).
+    """
+
+    # Seeds fit a signed 64-bit SQLite INTEGER
+    SEED_BITS = 63
+
+    def __init__(self, seed=None):
+        self._source = random.SystemRandom() if seed is None else random.Random(seed)
+
+    def next_seed(self):
+        """Get the seed for one draw."""
+        return self._source.getrandbits(self.SEED_BITS)
+
+    def next_seeds(self, count):
+        """Get the seeds for `count` draws."""
+        getrandbits, bits = self._source.getrandbits, self.SEED_BITS
+        return [getrandbits(bits) for _ in range(count)]
+
+
+class Catalog:
+    """The gadget list with lookup indexes and a prebuilt rarity-weighted sampler."""
+
+    def __init__(self, gadgets, rarity_probabilities, version=1, rarity_names=None,
+                 category_names=None, gadget_type_groups=None, gadget_type_order=None):
+        self.version = version
+        self.gadgets = list(gadgets)
+        self.rarity_probabilities = dict(rarity_probabilities)
+        self.rarity_names = dict(rarity_names or {})
+        self.category_names = dict(category_names or {})
+        self.gadget_type_groups = dict(gadget_type_groups or {})
+        self.gadget_type_order = list(gadget_type_order or self.gadget_type_groups)
+        # Gadget type group (collection menu section) of each category
+        self.category_groups = {
+            category: type_key for type_key, group in self.gadget_type_groups.items() for category in group["categories"]
+        }
+        # Position of each gadget in the list; packed cards refer to gadgets by it
+        self.positions = {gadget["name"]: i for i, gadget in enumerate(self.gadgets)}
+        self.by_name = {gadget["name"]: gadget for gadget in self.gadgets}
+        self.by_category = {}
+        self.by_rarity = {}
+        self.by_category_rarity = {}
+        for gadget in self.gadgets:
+            self.by_category.setdefault(gadget["category"], []).append(gadget)
+            self.by_rarity.setdefault(gadget["rarity"], []).append(gadget)
+            self.by_category_rarity.setdefault((gadget["category"], gadget["rarity"]), []).append(gadget)
+        self.sampler = AliasSampler(self.gadgets, self._draw_weights())
+
+    @classmethod
+    def from_file(cls, path):
+        """Load and check a catalog file. Raises ValueError if it is malformed."""
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        check_catalog_data(data, path)
+        return cls(
+            data["gadgets"], RARITY_PROBABILITIES, version=data["version"],
+            rarity_names=data.get("rarity_names"), category_names=data.get("category_names"),
+            gadget_type_groups=data.get("gadget_type_groups"), gadget_type_order=data.get("gadget_type_order")
+        )
+
+    def _draw_weights(self):
+        """Per-gadget weights for a draw: pick a rarity by its probability, then
+        a gadget of that rarity uniformly. A rarity without gadgets falls back to
+        a uniform pick over the whole catalog."""
+        total = sum(self.rarity_probabilities.values())
+        fallback = sum(
+            probability for rarity, probability in self.rarity_probabilities.items()
+            if rarity not in self.by_rarity
+        ) / total / len(self.gadgets)
+        return [
+            self.rarity_probabilities.get(gadget["rarity"], 0) / total / len(self.by_rarity[gadget["rarity"]]) + fallback
+            for gadget in self.gadgets
+        ]
+
+    def get(self, name):
+        """Get a gadget by its name, or None."""
+        return self.by_name.get(name)
+
+    def find(self, category=None, rarity=None):
+        """Get gadgets of a category and/or rarity."""
+        if category is not None and rarity is not None:
+            return self.by_category_rarity.get((category, rarity), [])
+        if category is not None:
+            return self.by_category.get(category, [])
+        if rarity is not None:
+            return self.by_rarity.get(rarity, [])
+        return self.gadgets
+
+    def random_gadget(self, rng=random):
+        """Get a random gadget with weighted rarity probabilities."""
+        return self.sampler.sample(rng)
+
+    def random_gadgets(self, count, rng=random):
+        """Get `count` random gadgets, drawn independently like `random_gadget`."""
+        return self.sampler.sample_many(count, rng)
+
+    def draw(self, seed):
+        """Get the gadget drawn with a given seed."""
+        return self.sampler.pick(seed_to_uniform(seed))
+
+    def draw_many(self, seeds):
+        """Get the gadget drawn with each seed."""
+        return self.sampler.pick_many([seed_to_uniform(seed) for seed in seeds])
+
+
+GADGET_FIELDS = {"name", "category", "price", "rarity"}
+
+
+def check_catalog_data(data, path):
+    """Raise ValueError if parsed catalog file data isn't a usable catalog."""
+    if not isinstance(data.get("version"), int) or data["version"] < 1:
+        raise ValueError(f"{path}: version must be a positive integer")
+    gadgets = data.get("gadgets")
+    if not isinstance(gadgets, list) or not gadgets:
+        raise ValueError(f"{path}: gadgets must be a non-empty list")
+    names = set()
+    for i, gadget in enumerate(gadgets):
+        if not isinstance(gadget, dict) or set(gadget) != GADGET_FIELDS:
+            raise ValueError(f"{path}: gadget #{i} must have exactly the fields {', '.join(sorted(GADGET_FIELDS))}")
+        if gadget["rarity"] not in RARITY_PROBABILITIES:
+            raise ValueError(f"{path}: gadget {gadget['name']!r} has unknown rarity {gadget['rarity']!r}")
+        if not isinstance(gadget["price"], int) or gadget["price"] < 0:
+            raise ValueError(f"{path}: gadget {gadget['name']!r} has an invalid price")
+        if gadget["name"] in names:
+            raise ValueError(f"{path}: duplicate gadget {gadget['name']!r}")
+        names.add(gadget["name"])
+    groups = data.get("gadget_type_groups", {})
+    for type_key in data.get("gadget_type_order", []):
+        if type_key not in groups:
+            raise ValueError(f"{path}: gadget_type_order lists unknown type {type_key!r}")
+
+
+# Loaded catalogs. _catalog is the current one; _versions keeps every version
+# loaded so far for resolving older cards.
+_catalog = None
+_versions = {}
+_catalog_stamp = None
+_catalog_lock = threading.Lock()
+
+_watcher = None
+_stop_watching = threading.Event()
+
+_draw_rng = DrawRng()
+
+
+def catalog_path(version):
+    """Get the path of a catalog version's file."""
+    return os.path.join(config.CATALOG_DIR, f"{version}.json")
+
+
+def latest_catalog_version():
+    """Get the newest catalog version in CATALOG_DIR."""
+    versions = [
+        int(name[:-len(".json")]) for name in os.listdir(config.CATALOG_DIR)
+        if name.endswith(".json") and name[:-len(".json")].isdigit()
+    ]
+    if not versions:
+        raise FileNotFoundError(f"No catalog files in {config.CATALOG_DIR}")
+    return max(versions)
+
+
+def reload_catalog():
+    """Load the newest catalog if it changed since the last load.
+
+    Returns True if a new catalog was swapped in. Raises (keeping the current
+    catalog) if the file is malformed or edits a version other than by
+    appending gadgets.
+    """
+    global _catalog, _catalog_stamp
+    with _catalog_lock:
+        version = latest_catalog_version()
+        path = catalog_path(version)
+        stat = os.stat(path)
+        stamp = (version, stat.st_mtime_ns, stat.st_size)
+        if stamp == _catalog_stamp:
+            return False
+
+        try:
+            catalog = Catalog.from_file(path)
+            if catalog.version != version:
+                raise ValueError(f"{path}: file says version {catalog.version}")
+            previous = _versions.get(version)
+            if previous is not None and catalog.gadgets[:len(previous.gadgets)] != previous.gadgets:
+                raise ValueError(
+                    f"{path}: gadgets of version {version} were changed, not just appended to; "
+                    f"publish the change as version {version + 1} instead"
+                )
+        except Exception:
+            # Don't retry (and report) the same broken file on every check
+            if _catalog is not None:
+                _catalog_stamp = stamp
+            raise
+
+        _versions[version] = catalog
+        _catalog = catalog
+        _catalog_stamp = stamp
+        return True
+
+
+def get_catalog():
+    """Get the current catalog, loading it on first use."""
+    if _catalog is None:
+        reload_catalog()
+    return _catalog
+
+
+def get_catalog_version(version):
+    """Get the catalog of a given version, loading it on first use."""
+    catalog = _versions.get(version)
+    if catalog is None:
+        with _catalog_lock:
+            catalog = _versions.get(version)
+            if catalog is None:
+                catalog = Catalog.from_file(catalog_path(version))
+                _versions[version] = catalog
+    return catalog
+
+
+def _watch_loop(interval):
+    while not _stop_watching.wait(interval):
+        try:
+            if reload_catalog():
+                print(f"Gadget catalog reloaded: version {_catalog.version}, {len(_catalog.gadgets)} gadgets")
+        except Exception as e:
+            print(f"Gadget catalog reload failed, keeping version {_catalog.version}: {e}")
+
+
+def start_catalog_watcher(interval=None):
+    """Start reloading the catalog in the background whenever its file changes."""
+    global _watcher
+    get_catalog()
+    if _watcher is None:
+        _stop_watching.clear()
+        _watcher = threading.Thread(
+            target=_watch_loop, args=(interval or config.CATALOG_RELOAD_INTERVAL,),
+            name="catalog-watcher", daemon=True
+        )
+        _watcher.start()
+
+
+def stop_catalog_watcher():
+    """Stop the background catalog reloads."""
+    global _watcher
+    if _watcher is not None:
+        _stop_watching.set()
+        _watcher.join()
+        _watcher = None
+
+
+def get_draw_rng():
+    """Get the seed source used for card draws."""
+    return _draw_rng
+
+
+def set_draw_rng(rng):
+    """Replace the seed source used for card draws, e.g. with a seeded DrawRng."""
+    global _draw_rng
+    _draw_rng = rng
+
+
+def draw_gadgets(count=1, rng=None):
+    """Draw `count` gadgets from the current catalog. Returns (gadget, seed) pairs;
+    store the seed with the card to make the draw reproducible."""
+    seeds = (rng or _draw_rng).next_seeds(count)
+    return list(zip(get_catalog().draw_many(seeds), seeds))
 
 
 def get_random_gadget():
     """Get a random gadget from the catalog with weighted rarity probabilities."""
-    import random
-    
-    # Rarity probabilities (must add up to 100%)
-    RARITY_PROBABILITIES = {
-        RARITY_TRASH: 30,      # 30%
-        RARITY_COMMON: 25,     # 25%
-        RARITY_UNCOMMON: 20,   # 20%
-        RARITY_RARE: 15,       # 15%
-        RARITY_EPIC: 7,        # 7%
-        RARITY_LEGENDARY: 2,   # 2%
-        RARITY_MYTHIC: 1,      # 1%
-    }
-    
-    # Group gadgets by rarity
-    gadgets_by_rarity = {}
-    for gadget in GADGETS:
-        rarity = gadget["rarity"]
-        if rarity not in gadgets_by_rarity:
-            gadgets_by_rarity[rarity] = []
-        gadgets_by_rarity[rarity].append(gadget)
-    
-    # Select rarity based on probabilities
-    rarities = list(RARITY_PROBABILITIES.keys())
-    weights = [RARITY_PROBABILITIES[r] for r in rarities]
-    selected_rarity = random.choices(rarities, weights=weights, k=1)[0]
-    
-    # Select random gadget from the selected rarity
-    if selected_rarity in gadgets_by_rarity and gadgets_by_rarity[selected_rarity]:
-        return random.choice(gadgets_by_rarity[selected_rarity])
-    
-    # Fallback to completely random if something goes wrong
-    return random.choice(GADGETS)
+    return draw_gadgets(1)[0][0]
+
+
+def get_random_gadgets(count):
+    """Get several random gadgets at once (a multi-pull)."""
+    return [gadget for gadget, _ in draw_gadgets(count)]
 
 
 def get_gadget_by_name(name):
     """Get a gadget by its name."""
-    for gadget in GADGETS:
-        if gadget["name"] == name:
-            return gadget
-    return None
+    return get_catalog().get(name)
+
+
+def get_rarity_name(rarity):
+    """Get the player-facing (Russian) name of a rarity."""
+    return get_catalog().rarity_names.get(rarity, rarity)
+
+
+def get_category_name(category):
+    """Get the player-facing (Russian) name of a category."""
+    return get_catalog().category_names.get(category, category)
+
+
+def get_gadget_type_groups():
+    """Get the gadget type groups (collection menu sections) in display order."""
+    catalog = get_catalog()
+    return {type_key: catalog.gadget_type_groups[type_key] for type_key in catalog.gadget_type_order}
+
+
+def get_gadget_type_group(category):
+    """Get the gadget type group a category belongs to, or None."""
+    return get_catalog().category_groups.get(category)
 
 
 def get_rarity_emoji(rarity):
@@ -0,0 +1,172 @@
+"""
+Menu images sent by Telegram file_id instead of re-uploading the PNG.
+
+The first time an image is sent, its bytes (preloaded by assets.py) are
+uploaded and Telegram's file_id for it is stored in a small JSON cache. Every
+later send or edit passes just the file_id. The cache is keyed by the SHA-256
+of the uploaded bytes, so replacing an image file makes it upload once again,
+and a restart keeps reusing what was uploaded before.
+
+A file_id belongs to the bot that uploaded it. If Telegram rejects a cached
+one (a new bot token, or an ID that expired), the image is uploaded again
+and the new file_id replaces the stale one.
+"""
+
+import asyncio
+import json
+import os
+from typing import Awaitable, Callable, Dict, Optional, Union
+
+from telegram import InputFile, InputMediaPhoto
+from telegram.error import BadRequest
+
+import assets
+import async_database
+import config
+import edit_coalescer
+from storage import atomic_write_json
+
+# Lowercased fragments of Telegram's errors for a file_id it won't accept
+STALE_FILE_ID_ERRORS = ("file identifier", "file_id", "file reference", "media_empty")
+
+
+def is_stale_file_id_error(error: BadRequest) -> bool:
+    message = str(error).lower()
+    return any(fragment in message for fragment in STALE_FILE_ID_ERRORS)
+
+
+class FileIdCache:
+    """Content hash -> Telegram file_id, persisted as JSON.
+
+    Changes are written in the database thread pool, not on the event loop,
+    one write at a time; changes made during a write are saved right after it.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.file_ids: Dict[str, str] = {}
+        if os.path.exists(path):
+            with open(path) as f:
+                self.file_ids = json.load(f)
+        self._dirty = False
+        self._saving: Optional[asyncio.Future] = None
+
+    def get(self, digest: str) -> Optional[str]:
+        return self.file_ids.get(digest)
+
+    def set(self, digest: str, file_id: str):
+        if self.file_ids.get(digest) != file_id:
+            self.file_ids[digest] = file_id
+            self._schedule_save()
+
+    def forget(self, digest: str):
+        if self.file_ids.pop(digest, None) is not None:
+            self._schedule_save()
+
+    def _schedule_save(self):
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            # Not in the bot (e.g. a script): nothing to block
+            self.save()
+            return
+        self._dirty = True
+        if self._saving is None or self._saving.done():
+            self._saving = asyncio.ensure_future(self._save_pending())
+
+    async def _save_pending(self):
+        while self._dirty:
+            self._dirty = False
+            try:
+                await async_database.run(self.save, dict(self.file_ids))
+            except Exception as e:
+                # The file_ids stay in memory; the next change tries again
+                print(f"Saving the image file_id cache failed: {e}")
+                return
+
+    async def flush(self):
+        """Wait until every change so far is on disk."""
+        while self._saving is not None and not self._saving.done():
+            await self._saving
+
+    def save(self, file_ids: Optional[Dict[str, str]] = None):
+        """Write the cache (or a copy of it, from the thread pool) to disk."""
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        atomic_write_json(self.path, self.file_ids if file_ids is None else file_ids, indent=2)
+
+
+_cache: Optional[FileIdCache] = None
+
+
+def get_cache() -> FileIdCache:
+    global _cache
+    if _cache is None:
+        _cache = FileIdCache(config.IMAGE_CACHE_PATH)
+    return _cache
+
+
+async def flush():
+    """Write out pending file_id cache changes, e.g. before shutting down."""
+    if _cache is not None:
+        await _cache.flush()
+
+
+def photo_file_id(message) -> Optional[str]:
+    """Get the file_id of the largest size of a sent photo.
+
+    Edits of inline messages return True instead of a message.
+    """
+    photo = getattr(message, "photo", None)
+    return photo[-1].file_id if photo else None
+
+
+async def send_image(image: Union[str, assets.Asset], send: Callable[[object], Awaitable[object]]):
+    """Call `send` with the image's cached file_id, or with its bytes if there
+    is none yet (or Telegram rejected it), and cache what it returns.
+
+    `image` is the path of a loaded menu image or an asset, e.g. a card face.
+    """
+    asset = image if isinstance(image, assets.Asset) else assets.get(image)
+    if asset is None:
+        raise FileNotFoundError(f"No image loaded from {image}")
+    cache = get_cache()
+    file_id = cache.get(asset.digest)
+    if file_id is not None:
+        try:
+            return await send(file_id)
+        except BadRequest as e:
+            if not is_stale_file_id_error(e):
+                raise
+            print(f"Cached file_id for {asset.filename} was rejected ({e}), uploading it again")
+            cache.forget(asset.digest)
+
+    result = await send(InputFile(asset.data, filename=asset.filename))
+    file_id = photo_file_id(result)
+    if file_id is not None:
+        cache.set(asset.digest, file_id)
+    return result
+
+
+async def reply_photo(message_obj, image: Union[str, assets.Asset], caption: str, reply_markup=None, parse_mode="HTML"):
+    """Reply to a message with an image and a caption."""
+    return await send_image(image, lambda photo: message_obj.reply_photo(
+        photo=photo, caption=caption, reply_markup=reply_markup, parse_mode=parse_mode
+    ))
+
+
+async def edit_photo(query, image: Union[str, assets.Asset], caption: str, reply_markup=None, parse_mode="HTML"):
+    """Replace a callback query's message with an image and a caption (works even if the message is text).
+
+    Goes through edit_coalescer, so a repeated tap showing the same image,
+    caption and buttons sends nothing.
+    """
+    asset = image if isinstance(image, assets.Asset) else assets.get(image)
+    if asset is None:
+        raise FileNotFoundError(f"No image loaded from {image}")
+
+    async def edit(photo):
+        media = InputMediaPhoto(media=photo, caption=caption, parse_mode=parse_mode)
+        return await query.edit_message_media(media=media, reply_markup=reply_markup)
+
+    digest = edit_coalescer.content_digest("photo", asset.digest, caption, parse_mode, reply_markup=reply_markup)
+    return await edit_coalescer.edit(query, digest, lambda: send_image(asset, edit))
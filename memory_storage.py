@@ -0,0 +1,175 @@
+"""
+Write-behind in-memory storage backend.
+
+Users and their cards are loaded from a backing store once and then kept in
+memory. Mutations only mark the user dirty; dirty users are written back in
+batches by a background thread.
+"""
+
+import threading
+from typing import Dict, List, Optional, Set
+
+from collection import Page, CollectionSummary
+from models import User, Card
+from storage import Storage, apply_record, index_cards
+
+DURABILITY_PERIODIC = "periodic"
+DURABILITY_IMMEDIATE = "immediate"
+
+
+class MemoryStorage(Storage):
+    """Keeps users and cards resident in memory in front of another backend."""
+
+    def __init__(self, inner: Storage, flush_interval: float = 5, max_dirty: int = 100,
+                 durability: str = DURABILITY_PERIODIC):
+        if durability not in (DURABILITY_PERIODIC, DURABILITY_IMMEDIATE):
+            raise ValueError(f"Unknown durability mode: {durability}")
+        self.inner = inner
+        self.flush_interval = flush_interval
+        self.max_dirty = max_dirty
+        self.durability = durability
+
+        self._users: Dict[int, Optional[User]] = {}
+        # user_id -> card_id -> card
+        self._cards: Dict[int, Dict[int, Card]] = {}
+        self._dirty: Set[int] = set()
+        self._lock = threading.RLock()
+        # Serializes flushes so an older snapshot never overwrites a newer one
+        self._flush_lock = threading.Lock()
+
+        self._stop = threading.Event()
+        self._wakeup = threading.Event()
+        self._flusher = None
+        if durability == DURABILITY_PERIODIC:
+            self._flusher = threading.Thread(target=self._flush_loop, name="write-behind-flusher", daemon=True)
+            self._flusher.start()
+
+    def _ensure_loaded(self, user_id: int):
+        if user_id not in self._cards:
+            self._users[user_id] = self.inner.load_user(user_id)
+            self._cards[user_id] = index_cards(self.inner.get_user_cards(user_id))
+
+    def _after_write(self):
+        # Called without holding self._lock: flush() takes the flush lock first
+        if self.durability == DURABILITY_IMMEDIATE:
+            self.flush()
+        elif len(self._dirty) >= self.max_dirty:
+            self._wakeup.set()
+
+    def load_user(self, user_id: int) -> Optional[User]:
+        with self._lock:
+            self._ensure_loaded(user_id)
+            return self._users[user_id]
+
+    def save_user(self, user_id: int, user: User):
+        with self._lock:
+            self._ensure_loaded(user_id)
+            self._users[user_id] = user
+            self._dirty.add(user_id)
+        self._after_write()
+
+    def get_user_cards(self, user_id: int) -> List[Card]:
+        with self._lock:
+            self._ensure_loaded(user_id)
+            return list(self._cards[user_id].values())
+
+    def count_user_cards(self, user_id: int) -> int:
+        with self._lock:
+            self._ensure_loaded(user_id)
+            return len(self._cards[user_id])
+
+    def get_card(self, user_id: int, card_id: int) -> Optional[Card]:
+        with self._lock:
+            self._ensure_loaded(user_id)
+            return self._cards[user_id].get(card_id)
+
+    def get_cards(self, user_id: int, card_ids: List[int]) -> List[Card]:
+        with self._lock:
+            self._ensure_loaded(user_id)
+            cards = self._cards[user_id]
+            return [cards[card_id] for card_id in card_ids if card_id in cards]
+
+    def browse_cards(self, user_id: int, gadget_type: str, rarity: str, sort: str,
+                     cursor_id: Optional[int] = None, backward: bool = False, limit: int = 20) -> Page:
+        with self._lock:
+            self._ensure_loaded(user_id)
+            return self._cards[user_id].browse(gadget_type, rarity, sort, cursor_id, backward, limit)
+
+    def get_summary(self, user_id: int) -> CollectionSummary:
+        with self._lock:
+            self._ensure_loaded(user_id)
+            return self._cards[user_id].summary()
+
+    def insert_card(self, user_id: int, card: Card):
+        with self._lock:
+            self._ensure_loaded(user_id)
+            self._cards[user_id].setdefault(card.card_id, card)
+            self._dirty.add(user_id)
+        self._after_write()
+
+    def update_card(self, user_id: int, card_id: int, fields: Dict) -> bool:
+        with self._lock:
+            self._ensure_loaded(user_id)
+            cards = self._cards[user_id]
+            card = cards.get(card_id)
+            if card is None:
+                return False
+            # Replace rather than modify so snapshots taken by a flush stay intact
+            cards[card_id] = card.replace(**fields)
+            self._dirty.add(user_id)
+        self._after_write()
+        return True
+
+    def delete_card(self, user_id: int, card_id: int) -> bool:
+        with self._lock:
+            self._ensure_loaded(user_id)
+            if self._cards[user_id].pop(card_id, None) is None:
+                return False
+            self._dirty.add(user_id)
+        self._after_write()
+        return True
+
+    def apply(self, user_id: int, records: List[Dict]):
+        with self._lock:
+            self._ensure_loaded(user_id)
+            user = self._users[user_id]
+            for record in records:
+                user = apply_record(user, self._cards[user_id], record)
+            self._users[user_id] = user
+            self._dirty.add(user_id)
+        self._after_write()
+
+    def flush(self):
+        """Write all dirty users to the backing store."""
+        with self._flush_lock:
+            with self._lock:
+                if not self._dirty:
+                    return
+                batch = {
+                    user_id: (self._users[user_id], list(self._cards[user_id].values()))
+                    for user_id in self._dirty
+                }
+                self._dirty.clear()
+            try:
+                self.inner.write_users(batch)
+            except Exception:
+                with self._lock:
+                    self._dirty.update(batch)
+                raise
+
+    def _flush_loop(self):
+        while not self._stop.is_set():
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"Write-behind flush failed: {e}")
+
+    def close(self):
+        self._stop.set()
+        self._wakeup.set()
+        if self._flusher is not None:
+            self._flusher.join()
+        self.flush()
+        self.inner.close()
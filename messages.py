@@ -4,7 +4,7 @@ Message generation functions for the Telegram Gadget Card Bot.
 
 import gadgets
 import database
-from config import RARITY_NAMES, CATEGORY_NAMES
+from config import RARITY_ORDER
 
 
 def get_help_message():
@@ -13,6 +13,7 @@ def get_help_message():
         "📖 <b>Команды Бота</b> 🤖\n\n"
         "<b>/start</b> - Приветствие и обзор бота\n"
         "<b>/card</b> - Получить случайную карточку гаджета\n"
+        "<b>/card 10</b>, <b>/card 100</b> - Получить сразу 10 или 100 карточек\n"
         "<b>/gadgets</b> - Посмотреть свою коллекцию гаджетов\n"
         "<b>/profile</b> - Посмотреть профиль и статистику\n"
         "<b>/build</b> - Собрать кастомный ПК из деталей\n"
@@ -26,6 +27,7 @@ def get_help_message():
         "<b>🖥️ Сборка ПК:</b>\n"
         "• Собирай видеокарты, процессоры и материнки\n"
         "• Используй /build чтобы собрать их в ПК\n"
+        "• Авто-сборка сама подберёт лучшие детали или соберёт ПК из всех деталей сразу\n"
         "• Характеристики ПК (ОЗУ, накопитель, БП, корпус) генерируются автоматически\n"
         "• Можешь вытащить детали из ПК в любой момент"
     )
@@ -34,19 +36,13 @@ def get_help_message():
 def get_profile_message(user_id: int):
     """Get the profile message for a user."""
     user = database.get_user(user_id)
-    coins = user["coins"]
+    coins = user.coins
     
-    cards = database.get_user_cards(user_id)
-    total_cards = len(cards)
-    
-    # Calculate total price of all cards and PCs
-    total_price = 0
-    for card in cards:
-        total_price += card["purchase_price"]
-    
-    # Count PCs
-    pcs = [c for c in cards if c["category"] == "PC"]
-    pc_count = len(pcs)
+    # Totals are kept up to date by the storage backend as cards change
+    summary = database.get_summary(user_id)
+    total_cards = summary.total_cards
+    total_price = summary.total_value
+    pc_count = summary.pc_count
     
     return (
         f"👤 <b>Твой Профиль</b> 🎯\n\n"
@@ -82,8 +78,8 @@ def get_start_message(coins: int):
 def get_card_display_message(gadget: dict, card_id: int, title: str = None):
     """Get the card display message."""
     rarity_emoji = gadgets.get_rarity_emoji(gadget["rarity"])
-    rarity_ru = RARITY_NAMES.get(gadget['rarity'], gadget['rarity'])
-    category_ru = CATEGORY_NAMES.get(gadget['category'], gadget['category'])
+    rarity_ru = gadgets.get_rarity_name(gadget['rarity'])
+    category_ru = gadgets.get_category_name(gadget['category'])
     
     title_text = f"{title}\n\n" if title else ""
     return (
@@ -96,6 +92,51 @@ def get_card_display_message(gadget: dict, card_id: int, title: str = None):
     )
 
 
+def get_multi_card_message(drawn: list, best_count: int = 5):
+    """Get the summary message for a multi-pull of (gadget, card_id) pairs."""
+    rarity_counts = {}
+    total_price = 0
+    for gadget, _ in drawn:
+        rarity_counts[gadget["rarity"]] = rarity_counts.get(gadget["rarity"], 0) + 1
+        total_price += gadget["price"]
+    
+    rarity_lines = [
+        f"{gadgets.get_rarity_emoji(rarity)} {gadgets.get_rarity_name(rarity)}: {rarity_counts[rarity]}"
+        for rarity in reversed(RARITY_ORDER) if rarity in rarity_counts
+    ]
+    
+    # Best cards first: highest rarity, then highest price
+    best = sorted(drawn, key=lambda item: (gadgets.get_rarity_value(item[0]["rarity"]), item[0]["price"]), reverse=True)
+    best_lines = [
+        f"{gadgets.get_rarity_emoji(gadget['rarity'])} {gadget['name']} - {gadget['price']} монет (ID: {card_id})"
+        for gadget, card_id in best[:best_count]
+    ]
+    
+    return (
+        f"🎴 <b>Ты получил {len(drawn)} карточек!</b> 🎉\n\n"
+        "<b>По редкости:</b>\n" + "\n".join(rarity_lines) + "\n\n"
+        "<b>Лучшие карточки:</b>\n" + "\n".join(best_lines) + "\n\n"
+        f"<b>Общая стоимость:</b> {total_price} монет 💰"
+    )
+
+
+def get_auto_build_all_message(pc_cards: list, shown_count: int = 10):
+    """Get the summary message for PCs built by "auto-build all"."""
+    total_price = sum(pc.purchase_price for pc in pc_cards)
+    pc_lines = [
+        f"{gadgets.get_rarity_emoji(pc.rarity)} {pc.gadget_name} - {pc.purchase_price} монет"
+        for pc in pc_cards[:shown_count]
+    ]
+    if len(pc_cards) > shown_count:
+        pc_lines.append(f"...и ещё {len(pc_cards) - shown_count}")
+    
+    return (
+        f"🏭 <b>Собрано ПК: {len(pc_cards)}</b> 🎉\n\n"
+        + "\n".join(pc_lines) + "\n\n"
+        f"<b>Общая стоимость:</b> {total_price} монет 💰"
+    )
+
+
 def get_missing_parts_message(missing_parts: list):
     """Get message for missing PC parts."""
     if len(missing_parts) == 1:
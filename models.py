@@ -0,0 +1,230 @@
+"""
+User and card models for the Telegram Gadget Card Bot.
+
+Users and cards are small __slots__ objects rather than dicts. They are
+treated as immutable once created: storage backends may share them with their
+caches, so use `replace()` to get a changed copy instead of setting attributes.
+
+Cards serialise either to a full dict (`to_dict`) or to the compact packed
+form used by the JSON-based backends (`to_packed`): catalog attributes are
+replaced by the catalog version and the gadget's position in it, and empty
+optional fields are left out.
+"""
+
+import sys
+from types import MappingProxyType
+from typing import Dict, List, Optional
+
+import gadgets
+
+# Packed card keys: "i" card_id, "v" catalog version, "g" catalog index,
+# "n" gadget_name, "c" category, "p" purchase_price, "r" rarity, "t" obtained_at,
+# "pc" in_pc, "sd" draw_seed, "cm" components, "s" specs, "ct" component_total,
+# "sp" spec_price
+# Catalog reference: position of the gadget in catalog version "v"
+CATALOG_KEY = "g"
+CATALOG_VERSION_KEY = "v"
+# Cards packed before catalogs were versioned refer to the first version
+LEGACY_CATALOG_VERSION = 1
+
+intern = sys.intern
+
+
+class User:
+    """A player's profile."""
+
+    __slots__ = ("coins", "last_card_time")
+
+    def __init__(self, coins: int = 0, last_card_time: float = 0):
+        self.coins = coins
+        self.last_card_time = last_card_time
+
+    def replace(self, **fields) -> "User":
+        """Get a copy with some fields changed."""
+        return User.from_dict({**self.to_dict(), **fields})
+
+    def to_dict(self) -> Dict:
+        return {"coins": self.coins, "last_card_time": self.last_card_time}
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "User":
+        unknown = set(data) - set(cls.__slots__)
+        if unknown:
+            raise ValueError(f"Unknown user fields: {', '.join(sorted(unknown))}")
+        return cls(**data)
+
+    def __eq__(self, other):
+        return isinstance(other, User) and self.to_dict() == other.to_dict()
+
+    def __repr__(self):
+        return f"User(coins={self.coins!r}, last_card_time={self.last_card_time!r})"
+
+
+class Card:
+    """A gadget card in a user's collection.
+
+    Only built PCs (`PC`) have components, specs and a stored valuation; for
+    other cards they read as empty/None.
+    """
+
+    __slots__ = ("card_id", "gadget_name", "category", "purchase_price", "rarity", "obtained_at", "in_pc", "draw_seed")
+
+    FIELDS = __slots__ + ("components", "specs", "component_total", "spec_price")
+
+    components = ()
+    specs = MappingProxyType({})
+    component_total = None
+    spec_price = None
+
+    def __init__(self, card_id: int, gadget_name: str, category: str, purchase_price: int,
+                 rarity: str, obtained_at: float, in_pc: Optional[int] = None, draw_seed: Optional[int] = None):
+        self.card_id = card_id
+        self.gadget_name = gadget_name
+        self.category = intern(category)
+        self.purchase_price = purchase_price
+        self.rarity = intern(rarity)
+        self.obtained_at = obtained_at
+        self.in_pc = in_pc
+        # Seed of the random draw that produced the card (see gadgets.DrawRng);
+        # None for cards that weren't drawn, e.g. PCs and starter gadgets
+        self.draw_seed = draw_seed
+
+    @staticmethod
+    def create(card_id: int, gadget_name: str, category: str, purchase_price: int, rarity: str,
+               obtained_at: float, in_pc: Optional[int] = None, components=(), specs=None,
+               draw_seed: Optional[int] = None, component_total: Optional[int] = None,
+               spec_price: Optional[int] = None) -> "Card":
+        """Build a `PC` for the PC category and a plain `Card` for everything else."""
+        if category == gadgets.CATEGORY_PC:
+            return PC(card_id, gadget_name, category, purchase_price, rarity, obtained_at, in_pc,
+                      components, specs, draw_seed, component_total, spec_price)
+        if components or specs or component_total is not None or spec_price is not None:
+            raise ValueError(f"Only PCs have components, specs and a valuation, not {category}")
+        return Card(card_id, gadget_name, category, purchase_price, rarity, obtained_at, in_pc, draw_seed)
+
+    def replace(self, **fields) -> "Card":
+        """Get a copy with some fields changed."""
+        return Card.from_dict({**self.to_dict(), **fields})
+
+    def to_dict(self) -> Dict:
+        return {
+            "card_id": self.card_id,
+            "gadget_name": self.gadget_name,
+            "category": self.category,
+            "purchase_price": self.purchase_price,
+            "rarity": self.rarity,
+            "obtained_at": self.obtained_at,
+            "in_pc": self.in_pc,
+            "draw_seed": self.draw_seed,
+            "components": list(self.components),
+            "specs": dict(self.specs),
+            "component_total": self.component_total,
+            "spec_price": self.spec_price,
+        }
+
+    @staticmethod
+    def from_dict(data: Dict) -> "Card":
+        unknown = set(data) - set(Card.FIELDS)
+        if unknown:
+            raise ValueError(f"Unknown card fields: {', '.join(sorted(unknown))}")
+        return Card.create(**data)
+
+    def to_packed(self) -> Dict:
+        """Convert to the compact form.
+
+        A card whose name, category and rarity match a gadget of the current
+        catalog keeps only the catalog version and the gadget's index (plus the
+        price if it differs); anything else, e.g. a built PC, keeps its
+        attributes. Empty optional fields are dropped.
+        """
+        packed = {"i": self.card_id}
+        catalog = gadgets.get_catalog()
+        gadget_index = catalog.positions.get(self.gadget_name)
+        gadget = catalog.gadgets[gadget_index] if gadget_index is not None else None
+        if gadget is not None and gadget["category"] == self.category and gadget["rarity"] == self.rarity:
+            packed[CATALOG_VERSION_KEY] = catalog.version
+            packed[CATALOG_KEY] = gadget_index
+            if self.purchase_price != gadget["price"]:
+                packed["p"] = self.purchase_price
+        else:
+            packed["n"] = self.gadget_name
+            packed["c"] = self.category
+            packed["p"] = self.purchase_price
+            packed["r"] = self.rarity
+        packed["t"] = self.obtained_at
+        if self.in_pc is not None:
+            packed["pc"] = self.in_pc
+        if self.draw_seed is not None:
+            packed["sd"] = self.draw_seed
+        if self.components:
+            packed["cm"] = list(self.components)
+        if self.specs:
+            packed["s"] = dict(self.specs)
+        if self.component_total is not None:
+            packed["ct"] = self.component_total
+        if self.spec_price is not None:
+            packed["sp"] = self.spec_price
+        return packed
+
+    @staticmethod
+    def from_packed(packed: Dict) -> "Card":
+        """Build a card from its compact form, resolving catalog attributes
+        against the catalog version it was packed with."""
+        gadget_index = packed.get(CATALOG_KEY)
+        if gadget_index is not None:
+            catalog = gadgets.get_catalog_version(packed.get(CATALOG_VERSION_KEY, LEGACY_CATALOG_VERSION))
+            gadget = catalog.gadgets[gadget_index]
+            gadget_name, category, rarity = gadget["name"], gadget["category"], gadget["rarity"]
+            purchase_price = packed.get("p", gadget["price"])
+        else:
+            gadget_name, category, rarity = packed["n"], packed["c"], packed["r"]
+            purchase_price = packed["p"]
+        return Card.create(
+            packed["i"], gadget_name, category, purchase_price, rarity, packed["t"],
+            packed.get("pc"), packed.get("cm", ()), packed.get("s"), packed.get("sd"),
+            packed.get("ct"), packed.get("sp")
+        )
+
+    @staticmethod
+    def from_json(data: Dict) -> "Card":
+        """Build a card from either JSON form; files written before cards were packed hold full dicts."""
+        if "card_id" in data:
+            return Card.from_dict(data)
+        return Card.from_packed(data)
+
+    def __eq__(self, other):
+        return isinstance(other, Card) and self.to_dict() == other.to_dict()
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.card_id!r}, {self.gadget_name!r}, {self.rarity!r})"
+
+
+class PC(Card):
+    """A custom PC built from a graphics card, a processor and a motherboard."""
+
+    __slots__ = ("components", "specs", "component_total", "spec_price")
+
+    def __init__(self, card_id: int, gadget_name: str, category: str, purchase_price: int,
+                 rarity: str, obtained_at: float, in_pc: Optional[int] = None,
+                 components=(), specs: Optional[Dict] = None, draw_seed: Optional[int] = None,
+                 component_total: Optional[int] = None, spec_price: Optional[int] = None):
+        super().__init__(card_id, gadget_name, category, purchase_price, rarity, obtained_at, in_pc, draw_seed)
+        # IDs of the GPU, CPU and motherboard cards, in that order
+        self.components = list(components)
+        # Spec values come from small fixed tables, so interning shares them between PCs
+        self.specs = {intern(key): intern(value) for key, value in specs.items()} if specs else {}
+        # Valuation stored when the PC is built and kept up to date on eject, so
+        # pricing a PC never needs its component cards. None for PCs built
+        # before it was stored.
+        self.component_total = component_total
+        self.spec_price = spec_price
+
+
+def cards_from_json(data: List[Dict]) -> List[Card]:
+    """Build cards from a JSON list of full or packed cards."""
+    return [Card.from_json(card) for card in data]
+
+
+def cards_to_json(cards) -> List[Dict]:
+    """Convert cards to a JSON list of packed cards."""
+    return [card.to_packed() for card in cards]
@@ -0,0 +1,233 @@
+"""
+PC assembly and the auto-build optimizer.
+
+A PC's price is its components' prices plus the spec price, with a 15%
+premium. The specs (and so the spec price and the PC's rarity) depend only on
+the highest component rarity. So the best PC for a given rarity uses the
+priciest part of each category at or below that rarity. That means the
+optimizer only needs the top parts of each (category, rarity) bucket, never
+every GPU x CPU x motherboard triple.
+"""
+
+import heapq
+from typing import Dict, List, Optional, Tuple
+
+import pc_generator
+from gadgets import get_rarity_value, CATEGORY_GRAPHICS_CARD, CATEGORY_PROCESSOR, CATEGORY_MOTHERBOARD
+from models import Card
+
+PART_CATEGORIES = (CATEGORY_GRAPHICS_CARD, CATEGORY_PROCESSOR, CATEGORY_MOTHERBOARD)
+
+# What the auto-build maximises
+GOAL_VALUE = "value"    # highest PC price, then highest rarity
+GOAL_RARITY = "rarity"  # highest PC rarity, then highest price
+GOALS = (GOAL_VALUE, GOAL_RARITY)
+
+# Premium of a built PC over its components and specs
+PC_PREMIUM = 1.15
+# Share of a PC's price paid out when it's sold
+PC_SALE_SHARE = 0.85
+
+
+def calculate_pc_price(component_total: int, spec_price: int) -> int:
+    """Get the price of a PC from its components' total price and its spec price."""
+    return int((component_total + spec_price) * PC_PREMIUM)
+
+
+def get_pc_valuation(pc_card: Card, component_cards: Optional[List[Card]] = None) -> Tuple[int, int]:
+    """Get a PC's (component_total, spec_price).
+
+    PCs store it. For PCs built before that, the spec price is recomputed from
+    the rarities of the component cards while all three are still in the PC
+    (specs are deterministic), so it's the one charged at build. Only if a part
+    is missing is it derived from the PC's price instead.
+    """
+    if pc_card.component_total is not None and pc_card.spec_price is not None:
+        return pc_card.component_total, pc_card.spec_price
+    component_cards = component_cards or []
+    component_total = sum(comp_card.purchase_price for comp_card in component_cards)
+    parts = {
+        comp_card.category: comp_card for comp_card in component_cards
+        if comp_card.card_id in pc_card.components and comp_card.in_pc == pc_card.card_id
+    }
+    if len(pc_card.components) == len(PART_CATEGORIES) and all(category in parts for category in PART_CATEGORIES):
+        _, _, spec_price = pc_generator.generate_pc_specs(*(parts[category].rarity for category in PART_CATEGORIES))
+    else:
+        # The PC's price has the premium on top of components and specs
+        spec_price = round(pc_card.purchase_price / PC_PREMIUM) - component_total
+    return component_total, spec_price
+
+
+def calculate_pc_sale_price(pc_card: Card, component_cards: Optional[List[Card]] = None) -> int:
+    """Get what selling a PC pays (85% of its price). Only PCs built before
+    valuations were stored need `component_cards`."""
+    component_total, spec_price = get_pc_valuation(pc_card, component_cards)
+    return int((component_total + spec_price) * PC_PREMIUM * PC_SALE_SHARE)
+
+
+def assemble_pc(tx, gpu_card: Card, cpu_card: Card, mb_card: Card) -> Optional[int]:
+    """Build a PC from three free parts inside a transaction. Returns the PC's
+    card_id, or None (and changes nothing) if a part is gone, isn't the right
+    kind of part or is already in a PC, e.g. on a repeated or stale build tap."""
+    # Check the parts as they are in this transaction, not as the caller read them
+    wanted = (
+        (gpu_card.card_id, CATEGORY_GRAPHICS_CARD),
+        (cpu_card.card_id, CATEGORY_PROCESSOR),
+        (mb_card.card_id, CATEGORY_MOTHERBOARD),
+    )
+    current = {card.card_id: card for card in tx.get_cards([card_id for card_id, _ in wanted])}
+    for card_id, category in wanted:
+        card = current.get(card_id)
+        if card is None or card.category != category or card.in_pc is not None:
+            return None
+    gpu_card, cpu_card, mb_card = (current[card_id] for card_id, _ in wanted)
+
+    # Generate PC specs
+    specs, pc_rarity, spec_price = pc_generator.generate_pc_specs(gpu_card.rarity, cpu_card.rarity, mb_card.rarity)
+
+    # Calculate total price (components + specs, then add 15% premium)
+    component_total = gpu_card.purchase_price + cpu_card.purchase_price + mb_card.purchase_price
+    total_price = calculate_pc_price(component_total, spec_price)
+
+    # Create PC card
+    pc_name = f"Custom Gaming PC ({gpu_card.gadget_name})"
+    pc_card_id = tx.add_card(pc_name, "PC", total_price, pc_rarity)
+
+    # Update PC card with components, specs and the valuation it was priced with
+    component_ids = [gpu_card.card_id, cpu_card.card_id, mb_card.card_id]
+    tx.update_card(
+        pc_card_id, components=component_ids, specs=specs,
+        component_total=component_total, spec_price=spec_price
+    )
+
+    # Mark components as in PC
+    for card_id in component_ids:
+        tx.update_card(card_id, in_pc=pc_card_id)
+
+    return pc_card_id
+
+
+def eject_part(tx, pc_card: Card, comp_card: Card) -> Optional[List[int]]:
+    """Take a component out of a PC inside a transaction. The PC's valuation and
+    price drop by the part; a PC left without components is taken apart.
+    Returns the remaining component ids, or None (and changes nothing) if the
+    part isn't in that PC, e.g. on a repeated or stale eject tap."""
+    # Check the PC and the part as they are in this transaction
+    pc_card = tx.get_card(pc_card.card_id)
+    comp_card = tx.get_card(comp_card.card_id)
+    if (pc_card is None or comp_card is None or comp_card.card_id not in pc_card.components
+            or comp_card.in_pc != pc_card.card_id):
+        return None
+
+    component_total, spec_price = get_pc_valuation(pc_card, tx.get_cards(pc_card.components))
+    components = [c for c in pc_card.components if c != comp_card.card_id]
+
+    tx.update_card(comp_card.card_id, in_pc=None)
+    if not components:
+        tx.remove_card(pc_card.card_id)
+    else:
+        component_total -= comp_card.purchase_price
+        tx.update_card(
+            pc_card.card_id, components=components, component_total=component_total, spec_price=spec_price,
+            purchase_price=calculate_pc_price(component_total, spec_price)
+        )
+    return components
+
+
+def free_parts(cards: List[Card]) -> Dict[str, List[Card]]:
+    """Group the PC parts that aren't in a PC by category."""
+    parts = {category: [] for category in PART_CATEGORIES}
+    for card in cards:
+        if card.in_pc is None and card.category in parts:
+            parts[card.category].append(card)
+    return parts
+
+
+class PartPool:
+    """The top free parts of each (category, rarity) bucket, best price first.
+
+    Only the `k` priciest parts of a bucket are kept (top-k selection instead of
+    sorting everything); `take` removes a part once it's used.
+    """
+
+    def __init__(self, parts: Dict[str, List[Card]], k: int):
+        self.buckets: Dict[str, Dict[str, List[Card]]] = {}
+        for category in PART_CATEGORIES:
+            by_rarity: Dict[str, List[Card]] = {}
+            for card in parts.get(category, []):
+                by_rarity.setdefault(card.rarity, []).append(card)
+            self.buckets[category] = {
+                rarity: heapq.nlargest(k, cards, key=lambda card: card.purchase_price)[::-1]
+                for rarity, cards in by_rarity.items()
+            }
+
+    def head(self, category: str, rarity: str) -> Optional[Card]:
+        """The priciest remaining part of a bucket."""
+        bucket = self.buckets[category].get(rarity)
+        return bucket[-1] if bucket else None
+
+    def take(self, card: Card):
+        self.buckets[card.category][card.rarity].pop()
+
+    def best_build(self, goal: str = GOAL_VALUE) -> Optional[Tuple[int, Card, Card, Card]]:
+        """Find the best (pc_price, gpu, cpu, motherboard) among the remaining parts, or None."""
+        rarities = sorted(
+            {rarity for buckets in self.buckets.values() for rarity, cards in buckets.items() if cards},
+            key=get_rarity_value
+        )
+        # Priciest part of each category at or below the current rarity
+        best_up_to = {category: None for category in PART_CATEGORIES}
+        best = None
+        for rarity in rarities:
+            for category in PART_CATEGORIES:
+                head = self.head(category, rarity)
+                if head is not None and (best_up_to[category] is None
+                                         or head.purchase_price > best_up_to[category].purchase_price):
+                    best_up_to[category] = head
+            if any(card is None for card in best_up_to.values()):
+                continue
+
+            # The PC's rarity is exactly this one if at least one part has it
+            for category in PART_CATEGORIES:
+                head = self.head(category, rarity)
+                if head is None:
+                    continue
+                gpu, cpu, mb = (head if other == category else best_up_to[other] for other in PART_CATEGORIES)
+                _, pc_rarity, spec_price = pc_generator.generate_pc_specs(gpu.rarity, cpu.rarity, mb.rarity)
+                price = calculate_pc_price(gpu.purchase_price + cpu.purchase_price + mb.purchase_price, spec_price)
+                if goal == GOAL_RARITY:
+                    key = (get_rarity_value(pc_rarity), price)
+                else:
+                    key = (price, get_rarity_value(pc_rarity))
+                if best is None or key > best[0]:
+                    best = (key, (price, gpu, cpu, mb))
+        return best[1] if best is not None else None
+
+
+def plan_builds(parts: Dict[str, List[Card]], goal: str = GOAL_VALUE,
+                limit: Optional[int] = None) -> List[Tuple[int, Card, Card, Card]]:
+    """Greedily pick as many builds as the parts allow (at most `limit`), best first.
+
+    Returns (pc_price, gpu, cpu, motherboard) tuples.
+    """
+    count = min(len(parts.get(category, [])) for category in PART_CATEGORIES)
+    if limit is not None:
+        count = min(count, limit)
+    # A bucket can never give more parts than there are builds
+    pool = PartPool(parts, count)
+    builds = []
+    for _ in range(count):
+        build = pool.best_build(goal)
+        if build is None:
+            break
+        builds.append(build)
+        for card in build[1:]:
+            pool.take(card)
+    return builds
+
+
+def auto_build(tx, goal: str = GOAL_VALUE, limit: Optional[int] = 1) -> List[int]:
+    """Build the best PCs from the user's free parts in a transaction. Returns the new PCs' card_ids."""
+    parts = free_parts(tx.get_user_cards())
+    pc_ids = [assemble_pc(tx, gpu, cpu, mb) for _, gpu, cpu, mb in plan_builds(parts, goal, limit)]
+    return [pc_id for pc_id in pc_ids if pc_id is not None]
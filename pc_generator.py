@@ -1,13 +1,68 @@
 """
 PC specification generator based on component rarities.
+
+A PC's specs depend only on the highest rarity among its GPU, CPU and
+motherboard. The spec tiers below are declarative tables; every (gpu, cpu,
+motherboard) rarity combination is worked out from them once at import, so
+generating a PC's specs is a dictionary lookup.
 """
 
-import random
 from gadgets import (
     get_rarity_value, RARITY_TRASH, RARITY_COMMON, RARITY_UNCOMMON,
     RARITY_RARE, RARITY_EPIC, RARITY_LEGENDARY, RARITY_MYTHIC
 )
 
+RARITIES = [
+    RARITY_TRASH, RARITY_COMMON, RARITY_UNCOMMON, RARITY_RARE,
+    RARITY_EPIC, RARITY_LEGENDARY, RARITY_MYTHIC
+]
+
+# Spec tiers: (highest rarity the tier applies to, spec, price). A PC gets the
+# first tier whose rarity is at least the PC's rarity.
+RAM_TIERS = [
+    (RARITY_COMMON, "8GB DDR4", 40),
+    (RARITY_RARE, "16GB DDR4", 80),
+    (RARITY_LEGENDARY, "32GB DDR5", 150),
+    (RARITY_MYTHIC, "64GB DDR5", 300),
+]
+
+STORAGE_TIERS = [
+    (RARITY_COMMON, "256GB SATA SSD", 30),
+    (RARITY_RARE, "512GB NVMe SSD", 60),
+    (RARITY_EPIC, "1TB NVMe SSD", 100),
+    (RARITY_LEGENDARY, "2TB NVMe SSD", 180),
+    # Same price as 2TB: specs used to be priced by substring, and "2TB" matched "2TB+"
+    (RARITY_MYTHIC, "2TB+ NVMe SSD", 180),
+]
+
+PSU_TIERS = [
+    (RARITY_COMMON, "500W 80+ Bronze", 50),
+    (RARITY_RARE, "750W 80+ Gold", 100),
+    (RARITY_EPIC, "850W 80+ Gold", 130),
+    (RARITY_LEGENDARY, "1000W 80+ Platinum", 200),
+    (RARITY_MYTHIC, "1200W 80+ Titanium", 300),
+]
+
+CASE_TIERS = [
+    (RARITY_COMMON, "Budget ATX Case", 40),
+    (RARITY_RARE, "Mid-Tower ATX Case", 80),
+    (RARITY_EPIC, "Full-Tower ATX Case", 120),
+    (RARITY_LEGENDARY, "Premium Full-Tower Case", 200),
+    # Same price as the Premium case: substring pricing matched "Premium" here too
+    (RARITY_MYTHIC, "Ultimate Premium Case", 200),
+]
+
+# Spec key -> tiers, in the order specs are shown
+SPEC_TIERS = {
+    "ram": RAM_TIERS,
+    "storage": STORAGE_TIERS,
+    "psu": PSU_TIERS,
+    "case": CASE_TIERS,
+}
+
+# Spec -> price, for pricing specs that were generated earlier
+SPEC_PRICES = {spec: price for tiers in SPEC_TIERS.values() for _, spec, price in tiers}
+
 
 def get_highest_rarity(rarities):
     """Get the highest rarity from a list of rarities."""
@@ -23,137 +78,70 @@ def get_highest_rarity(rarities):
     return highest_rarity
 
 
+def get_tier(tiers, rarity):
+    """Get the (spec, price) of the tier a rarity falls into."""
+    rarity_value = get_rarity_value(rarity)
+    for max_rarity, spec, price in tiers:
+        if rarity_value <= get_rarity_value(max_rarity):
+            return spec, price
+    _, spec, price = tiers[-1]
+    return spec, price
+
+
 def generate_ram(rarity):
     """Generate RAM specification based on rarity."""
-    rarity_value = get_rarity_value(rarity)
-    
-    if rarity_value <= get_rarity_value(RARITY_COMMON):
-        return "8GB DDR4"
-    elif rarity_value <= get_rarity_value(RARITY_RARE):
-        return "16GB DDR4"
-    elif rarity_value == get_rarity_value(RARITY_EPIC):
-        return "32GB DDR5"
-    elif rarity_value == get_rarity_value(RARITY_LEGENDARY):
-        return "32GB DDR5"
-    else:  # Mythic
-        return "64GB DDR5"
+    return get_tier(RAM_TIERS, rarity)[0]
 
 
 def generate_storage(rarity):
     """Generate storage specification based on rarity."""
-    rarity_value = get_rarity_value(rarity)
-    
-    if rarity_value <= get_rarity_value(RARITY_COMMON):
-        return "256GB SATA SSD"
-    elif rarity_value <= get_rarity_value(RARITY_RARE):
-        return "512GB NVMe SSD"
-    elif rarity_value == get_rarity_value(RARITY_EPIC):
-        return "1TB NVMe SSD"
-    elif rarity_value == get_rarity_value(RARITY_LEGENDARY):
-        return "2TB NVMe SSD"
-    else:  # Mythic
-        return "2TB+ NVMe SSD"
+    return get_tier(STORAGE_TIERS, rarity)[0]
 
 
 def generate_psu(rarity):
     """Generate PSU specification based on rarity."""
-    rarity_value = get_rarity_value(rarity)
-    
-    if rarity_value <= get_rarity_value(RARITY_COMMON):
-        return "500W 80+ Bronze"
-    elif rarity_value <= get_rarity_value(RARITY_RARE):
-        return "750W 80+ Gold"
-    elif rarity_value == get_rarity_value(RARITY_EPIC):
-        return "850W 80+ Gold"
-    elif rarity_value == get_rarity_value(RARITY_LEGENDARY):
-        return "1000W 80+ Platinum"
-    else:  # Mythic
-        return "1200W 80+ Titanium"
+    return get_tier(PSU_TIERS, rarity)[0]
 
 
 def generate_case(rarity):
     """Generate case specification based on rarity."""
-    rarity_value = get_rarity_value(rarity)
-    
-    if rarity_value <= get_rarity_value(RARITY_COMMON):
-        return "Budget ATX Case"
-    elif rarity_value <= get_rarity_value(RARITY_RARE):
-        return "Mid-Tower ATX Case"
-    elif rarity_value == get_rarity_value(RARITY_EPIC):
-        return "Full-Tower ATX Case"
-    elif rarity_value == get_rarity_value(RARITY_LEGENDARY):
-        return "Premium Full-Tower Case"
-    else:  # Mythic
-        return "Ultimate Premium Case"
+    return get_tier(CASE_TIERS, rarity)[0]
 
 
 def calculate_spec_price(ram, storage, psu, case):
     """Calculate total price for generated specs."""
-    price = 0
-    
-    # RAM pricing
-    if "8GB" in ram:
-        price += 40
-    elif "16GB" in ram:
-        price += 80
-    elif "32GB" in ram:
-        price += 150
-    elif "64GB" in ram:
-        price += 300
-    
-    # Storage pricing
-    if "256GB" in storage:
-        price += 30
-    elif "512GB" in storage:
-        price += 60
-    elif "1TB" in storage:
-        price += 100
-    elif "2TB" in storage:
-        price += 180
-    
-    # PSU pricing
-    if "500W" in psu:
-        price += 50
-    elif "750W" in psu:
-        price += 100
-    elif "850W" in psu:
-        price += 130
-    elif "1000W" in psu:
-        price += 200
-    elif "1200W" in psu:
-        price += 300
-    
-    # Case pricing
-    if "Budget" in case:
-        price += 40
-    elif "Mid-Tower" in case:
-        price += 80
-    elif "Full-Tower" in case and "Premium" not in case:
-        price += 120
-    elif "Premium" in case:
-        price += 200
-    
-    return price
+    return sum(SPEC_PRICES.get(spec, 0) for spec in (ram, storage, psu, case))
 
 
-def generate_pc_specs(gpu_rarity, cpu_rarity, motherboard_rarity):
-    """Generate PC specifications based on component rarities."""
+def build_pc_specs(gpu_rarity, cpu_rarity, motherboard_rarity):
+    """Work out (specs, rarity, spec price) for a component rarity combination from the tier tables."""
     # Use highest rarity for spec generation
     highest_rarity = get_highest_rarity([gpu_rarity, cpu_rarity, motherboard_rarity])
     
-    ram = generate_ram(highest_rarity)
-    storage = generate_storage(highest_rarity)
-    psu = generate_psu(highest_rarity)
-    case = generate_case(highest_rarity)
-    
-    specs = {
-        "ram": ram,
-        "storage": storage,
-        "psu": psu,
-        "case": case
-    }
-    
-    spec_price = calculate_spec_price(ram, storage, psu, case)
+    specs = {}
+    spec_price = 0
+    for key, tiers in SPEC_TIERS.items():
+        specs[key], price = get_tier(tiers, highest_rarity)
+        spec_price += price
     
     return specs, highest_rarity, spec_price
 
+
+# (gpu rarity, cpu rarity, motherboard rarity) -> (specs, rarity, spec price)
+PC_SPECS_TABLE = {
+    (gpu_rarity, cpu_rarity, motherboard_rarity): build_pc_specs(gpu_rarity, cpu_rarity, motherboard_rarity)
+    for gpu_rarity in RARITIES
+    for cpu_rarity in RARITIES
+    for motherboard_rarity in RARITIES
+}
+
+
+def generate_pc_specs(gpu_rarity, cpu_rarity, motherboard_rarity):
+    """Generate PC specifications based on component rarities."""
+    entry = PC_SPECS_TABLE.get((gpu_rarity, cpu_rarity, motherboard_rarity))
+    if entry is None:
+        # Not one of the known rarities
+        entry = build_pc_specs(gpu_rarity, cpu_rarity, motherboard_rarity)
+    specs, highest_rarity, spec_price = entry
+    # Callers get their own specs dict; the table's stays untouched
+    return dict(specs), highest_rarity, spec_price
@@ -0,0 +1,263 @@
+"""
+Callback routing for the Telegram Gadget Card Bot.
+
+Every inline button's callback data is "<action>" or "<action>.<payload>".
+The action is a short code that picks a `Route` from the route table with one
+dict lookup. The payload is the route's values (card ids, enums, short
+strings) packed into bytes and base64url-encoded without padding. A card id
+takes 8 bytes, about 11 characters, instead of 16 digits, so even a button
+carrying three card ids stays well under Telegram's 64-byte limit.
+
+Routes and their payload fields are declared here so keyboards anywhere can
+build callback data with `Route.data`; handlers are registered on a `Router`
+(see callbacks.py).
+"""
+
+import base64
+from typing import Awaitable, Callable, Dict, Optional, Sequence, Tuple
+
+import collection
+import pc_builder
+from config import RARITY_ORDER
+
+# Telegram's limit on callback data, in bytes
+CALLBACK_DATA_LIMIT = 64
+SEPARATOR = "."
+
+
+class CallbackDataError(ValueError):
+    """Callback data that doesn't match any route, e.g. a button from an older version."""
+
+
+class UInt:
+    """A non-negative integer, e.g. a card id, as its length in one byte
+    followed by its big-endian bytes."""
+
+    def encode(self, value: int, out: bytearray):
+        if value < 0:
+            raise ValueError(f"UInt can't encode {value}")
+        length = (value.bit_length() + 7) // 8
+        out.append(length)
+        out += value.to_bytes(length, "big")
+
+    def decode(self, data: bytes, pos: int) -> Tuple[int, int]:
+        if pos >= len(data):
+            raise CallbackDataError("Truncated integer")
+        end = pos + 1 + data[pos]
+        if end > len(data):
+            raise CallbackDataError("Truncated integer")
+        return int.from_bytes(data[pos + 1:end], "big"), end
+
+
+class Enum:
+    """One of a fixed list of strings, as its index in one byte. The list may
+    only be appended to, or buttons already sent would change meaning."""
+
+    def __init__(self, values: Sequence[str]):
+        self.values = tuple(values)
+        self.indexes = {value: i for i, value in enumerate(self.values)}
+
+    def encode(self, value: str, out: bytearray):
+        out.append(self.indexes[value])
+
+    def decode(self, data: bytes, pos: int) -> Tuple[str, int]:
+        if pos >= len(data) or data[pos] >= len(self.values):
+            raise CallbackDataError("Bad enum value")
+        return self.values[data[pos]], pos + 1
+
+
+class Text:
+    """A short string, as its length in one byte followed by UTF-8."""
+
+    def encode(self, value: str, out: bytearray):
+        raw = value.encode("utf-8")
+        if len(raw) > 0xFF:
+            raise ValueError("Text is too long for callback data")
+        out.append(len(raw))
+        out += raw
+
+    def decode(self, data: bytes, pos: int) -> Tuple[str, int]:
+        if pos >= len(data):
+            raise CallbackDataError("Truncated text")
+        end = pos + 1 + data[pos]
+        if end > len(data):
+            raise CallbackDataError("Truncated text")
+        try:
+            return data[pos + 1:end].decode("utf-8"), end
+        except UnicodeDecodeError as e:
+            raise CallbackDataError(f"Bad text: {e}") from e
+
+
+class Fields:
+    """Several fields as one value (a tuple)."""
+
+    def __init__(self, *fields):
+        self.fields = fields
+
+    def encode(self, values: tuple, out: bytearray):
+        encode_fields(self.fields, values, out)
+
+    def decode(self, data: bytes, pos: int) -> Tuple[tuple, int]:
+        values = []
+        for field in self.fields:
+            value, pos = field.decode(data, pos)
+            values.append(value)
+        return tuple(values), pos
+
+
+class Opt:
+    """A field that may be None, as a presence byte followed by the field."""
+
+    def __init__(self, field):
+        self.field = field
+
+    def encode(self, value, out: bytearray):
+        out.append(value is not None)
+        if value is not None:
+            self.field.encode(value, out)
+
+    def decode(self, data: bytes, pos: int) -> Tuple[object, int]:
+        if pos >= len(data):
+            raise CallbackDataError("Truncated optional field")
+        if not data[pos]:
+            return None, pos + 1
+        return self.field.decode(data, pos + 1)
+
+
+class Bool:
+    """True or False, as one byte."""
+
+    def encode(self, value: bool, out: bytearray):
+        out.append(bool(value))
+
+    def decode(self, data: bytes, pos: int) -> Tuple[bool, int]:
+        if pos >= len(data) or data[pos] > 1:
+            raise CallbackDataError("Bad bool value")
+        return bool(data[pos]), pos + 1
+
+
+def encode_fields(fields: Sequence, values: Sequence, out: bytearray):
+    if len(values) != len(fields):
+        raise ValueError(f"Expected {len(fields)} values, got {len(values)}")
+    for field, value in zip(fields, values):
+        field.encode(value, out)
+
+
+def encode_payload(fields: Sequence, values: Sequence) -> str:
+    """Pack values into base64url without padding."""
+    out = bytearray()
+    encode_fields(fields, values, out)
+    return base64.urlsafe_b64encode(bytes(out)).rstrip(b"=").decode("ascii")
+
+
+def decode_payload(fields: Sequence, payload: str) -> tuple:
+    try:
+        data = base64.urlsafe_b64decode(payload + "=" * (-len(payload) % 4))
+    except ValueError as e:
+        raise CallbackDataError(f"Bad payload: {e}") from e
+    values = []
+    pos = 0
+    for field in fields:
+        value, pos = field.decode(data, pos)
+        values.append(value)
+    if pos != len(data):
+        raise CallbackDataError("Trailing payload bytes")
+    return tuple(values)
+
+
+class Route:
+    """A button action: its code and the fields of its payload."""
+
+    __slots__ = ("action", "fields")
+
+    def __init__(self, action: str, *fields):
+        if SEPARATOR in action:
+            raise ValueError(f"Action code can't contain {SEPARATOR!r}: {action}")
+        self.action = action
+        self.fields = fields
+
+    def data(self, *values) -> str:
+        """Build the callback data for a button."""
+        if not self.fields and values:
+            raise ValueError(f"{self.action} takes no payload")
+        data = f"{self.action}{SEPARATOR}{encode_payload(self.fields, values)}" if self.fields else self.action
+        if len(data.encode("utf-8")) > CALLBACK_DATA_LIMIT:
+            raise ValueError(f"Callback data for {self.action} is over {CALLBACK_DATA_LIMIT} bytes: {data}")
+        return data
+
+    def parse(self, payload: str) -> tuple:
+        if not self.fields:
+            if payload:
+                raise CallbackDataError(f"{self.action} takes no payload")
+            return ()
+        return decode_payload(self.fields, payload)
+
+    def __repr__(self):
+        return f"Route({self.action!r})"
+
+
+CARD_ID = UInt()
+RARITY = Enum(RARITY_ORDER)
+SORT = Enum(collection.SORTS)
+AUTO_BUILD_ALL = "all"
+AUTO_BUILD_MODE = Enum(pc_builder.GOALS + (AUTO_BUILD_ALL,))
+
+# The route table. Action codes and field lists are part of the buttons already
+# sent to users: don't reuse a code for something else.
+START = Route("st")
+HELP = Route("hp")
+PROFILE = Route("pf")
+GET_CARD = Route("gc", UInt())                                     # count
+VIEW_GADGETS = Route("vg")
+GADGET_TYPE = Route("gt", Text())                                  # gadget type
+# gadget type, rarity, sort, and (cursor card, backward) or None for the first page
+COLLECTION_PAGE = Route("cl", Text(), RARITY, SORT, Opt(Fields(CARD_ID, Bool())))
+# card, and the (gadget type, rarity, sort) of the collection page it was opened from
+VIEW_CARD = Route("vc", CARD_ID, Opt(Fields(Text(), RARITY, SORT)))
+CONFIRM_SELL = Route("cs", CARD_ID)
+SELL = Route("sl", CARD_ID)
+BUILD_PC = Route("bp")
+BUILD_GPU = Route("bg", CARD_ID)                                   # GPU chosen
+BUILD_CPU = Route("bc", CARD_ID, CARD_ID)                          # GPU and CPU chosen
+BUILD_MB = Route("bm", CARD_ID, CARD_ID, CARD_ID)                  # build it
+AUTO_BUILD = Route("ab", AUTO_BUILD_MODE)
+VIEW_PCS = Route("vp")
+VIEW_PC = Route("pc", CARD_ID)
+EJECT = Route("ej", CARD_ID, CARD_ID)                              # PC, component
+CONFIRM_SELL_PC = Route("cp", CARD_ID)
+SELL_PC = Route("sp", CARD_ID)
+
+Handler = Callable[..., Awaitable[None]]
+
+
+class Router:
+    """Maps action codes to routes and their handlers.
+
+    A handler is called as handler(update, context, query, *payload_values).
+    """
+
+    def __init__(self):
+        self.routes: Dict[str, Tuple[Route, Handler]] = {}
+
+    def handler(self, route: Route) -> Callable[[Handler], Handler]:
+        """Decorator registering the handler of a route."""
+        def register(func: Handler) -> Handler:
+            if route.action in self.routes:
+                raise ValueError(f"Route {route.action} already has a handler")
+            self.routes[route.action] = (route, func)
+            return func
+        return register
+
+    def resolve(self, data: str) -> Tuple[Handler, tuple]:
+        """Find the handler for callback data and decode its payload."""
+        action, _, payload = data.partition(SEPARATOR)
+        entry = self.routes.get(action)
+        if entry is None:
+            raise CallbackDataError(f"Unknown action: {action}")
+        route, func = entry
+        return func, route.parse(payload)
+
+    async def dispatch(self, update, context, query) -> Optional[bool]:
+        """Run the handler for a callback query. Raises CallbackDataError for data no route accepts."""
+        func, values = self.resolve(query.data)
+        return await func(update, context, query, *values)
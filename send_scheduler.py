@@ -0,0 +1,255 @@
+"""
+Outbound request scheduler: keeps the bot under Telegram's flood limits.
+
+Every Bot API request goes through `SendScheduler`, python-telegram-bot's
+rate limiter hook (see bot.py), so handlers keep calling `reply_*` and
+`edit_message_*` as before. A request that targets a chat waits for:
+
+1. the chat's token bucket: SEND_CHAT_RATE messages per second in private
+   chats, SEND_GROUP_RATE per minute in groups (negative chat ids), with
+   bursts of SEND_CHAT_BURST;
+2. the global token bucket, SEND_GLOBAL_RATE messages per second. Requests
+   waiting for it are granted by priority lane first, then in arrival order,
+   so interactive replies and edits go ahead of bulk sends (broadcasts).
+
+Requests that don't send to a chat (answering a callback query, getMe) are
+not throttled. A 429 RetryAfter pauses the chat (or, for requests without a
+chat, everything) for the time Telegram asks and retries the request, up to
+SEND_MAX_RETRIES times.
+
+Lane of a request: interactive unless the call passes
+`rate_limit_args={"priority": send_scheduler.PRIORITY_BULK}`.
+"""
+
+import asyncio
+import heapq
+import itertools
+import time
+from collections import deque
+from typing import Any, Callable, Coroutine, Deque, Dict, List, Optional, Tuple, Union
+
+from telegram.error import RetryAfter
+from telegram.ext import BaseRateLimiter
+
+import config
+
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BULK = 1
+LANES = {PRIORITY_INTERACTIVE: "interactive", PRIORITY_BULK: "bulk"}
+
+# Waits kept per lane for the percentiles in the metrics
+WAIT_SAMPLES = 1000
+
+
+class TokenBucket:
+    """`rate` tokens per second, up to `burst`. Taking a token never blocks:
+    the bucket goes into debt and returns how long the taker has to wait, so
+    takers are served in the order they took."""
+
+    __slots__ = ("rate", "burst", "tokens", "updated", "paused_until")
+
+    def __init__(self, rate: float, burst: float, now: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = now
+        self.paused_until = 0.0
+
+    def _refill(self, now: float):
+        if now > self.updated:
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+
+    def delay(self, now: float) -> float:
+        """Seconds until a token is available, without taking it."""
+        self._refill(now)
+        wait = 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+        return max(wait, self.paused_until - now)
+
+    def take(self, now: float) -> float:
+        """Take a token. Returns the seconds to wait before using it."""
+        self._refill(now)
+        self.tokens -= 1
+        wait = 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+        return max(wait, self.paused_until - now)
+
+    def pause(self, until: float):
+        self.paused_until = max(self.paused_until, until)
+
+    def idle(self, now: float) -> bool:
+        """Whether the bucket is full again, i.e. the same as a new one."""
+        self._refill(now)
+        return self.tokens >= self.burst and self.paused_until <= now
+
+
+class LaneMetrics:
+    __slots__ = ("depth", "sent", "retries", "waits", "max_wait")
+
+    def __init__(self):
+        # Requests waiting for a token right now
+        self.depth = 0
+        self.sent = 0
+        self.retries = 0
+        self.waits: Deque[float] = deque(maxlen=WAIT_SAMPLES)
+        self.max_wait = 0.0
+
+    def snapshot(self) -> Dict[str, float]:
+        waits = sorted(self.waits)
+
+        def percentile(fraction):
+            return waits[min(len(waits) - 1, int(fraction * len(waits)))] if waits else 0.0
+
+        return {
+            "depth": self.depth, "sent": self.sent, "retries": self.retries,
+            "wait_p50": percentile(0.5), "wait_p99": percentile(0.99), "wait_max": self.max_wait,
+        }
+
+
+def get_chat_id(data: Dict[str, Any]) -> Optional[Union[int, str]]:
+    return data.get("chat_id")
+
+
+class SendScheduler(BaseRateLimiter):
+    """Token-bucket throttling with priority lanes and RetryAfter handling."""
+
+    def __init__(self, global_rate: float = None, chat_rate: float = None, group_rate: float = None,
+                 chat_burst: float = None, max_retries: int = None, metrics_interval: float = None):
+        self.global_rate = global_rate if global_rate is not None else config.SEND_GLOBAL_RATE
+        self.chat_rate = chat_rate if chat_rate is not None else config.SEND_CHAT_RATE
+        self.group_rate = group_rate if group_rate is not None else config.SEND_GROUP_RATE / 60
+        self.chat_burst = chat_burst if chat_burst is not None else config.SEND_CHAT_BURST
+        self.max_retries = max_retries if max_retries is not None else config.SEND_MAX_RETRIES
+        self.metrics_interval = metrics_interval if metrics_interval is not None else config.SEND_METRICS_INTERVAL
+
+        self._global: Optional[TokenBucket] = None
+        self._chats: Dict[Union[int, str], TokenBucket] = {}
+        # (priority, arrival, grant) of requests waiting for a global token
+        self._queue: List[Tuple[int, int, asyncio.Future]] = []
+        self._arrivals = itertools.count()
+        self._queued: Optional[asyncio.Event] = None
+        self._tasks: List[asyncio.Task] = []
+        self.lanes = {priority: LaneMetrics() for priority in LANES}
+
+    async def initialize(self) -> None:
+        self._global = TokenBucket(self.global_rate, self.global_rate, time.monotonic())
+        self._queued = asyncio.Event()
+        self._tasks = [asyncio.create_task(self._grant_loop())]
+        if self.metrics_interval > 0:
+            self._tasks.append(asyncio.create_task(self._report_loop()))
+
+    async def shutdown(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        for _, _, grant in self._queue:
+            grant.cancel()
+        self._queue = []
+
+    def _chat_bucket(self, chat_id: Union[int, str], now: float) -> TokenBucket:
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            # Groups and channels have negative ids (or an @username)
+            group = isinstance(chat_id, str) or chat_id < 0
+            bucket = self._chats[chat_id] = TokenBucket(self.group_rate if group else self.chat_rate, self.chat_burst, now)
+        return bucket
+
+    async def _grant_loop(self):
+        """Hand out global tokens, best lane first."""
+        while True:
+            await self._queued.wait()
+            while self._queue:
+                delay = self._global.delay(time.monotonic())
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                    continue
+                _, _, grant = heapq.heappop(self._queue)
+                if grant.done():
+                    # Its handler was cancelled while waiting
+                    continue
+                self._global.take(time.monotonic())
+                grant.set_result(None)
+            self._queued.clear()
+
+    async def _report_loop(self):
+        reported = None
+        while True:
+            await asyncio.sleep(self.metrics_interval)
+            now = time.monotonic()
+            # Buckets that have refilled are the same as new ones
+            for chat_id in [chat_id for chat_id, bucket in self._chats.items() if bucket.idle(now)]:
+                del self._chats[chat_id]
+            activity = [(lane.sent, lane.depth) for lane in self.lanes.values()]
+            if activity != reported and any(sent or depth for sent, depth in activity):
+                print(f"[send] {self.format_stats()}")
+            reported = activity
+
+    def stats(self) -> Dict[str, Any]:
+        """Queue depth, requests sent and retried, and waits (seconds) per lane."""
+        return {
+            "lanes": {LANES[priority]: metrics.snapshot() for priority, metrics in self.lanes.items()},
+            "chats": len(self._chats),
+        }
+
+    def format_stats(self) -> str:
+        lanes = []
+        for name, lane in self.stats()["lanes"].items():
+            lanes.append(
+                f"{name}: {lane['depth']} queued, {lane['sent']} sent, {lane['retries']} retried, "
+                f"wait p50 {lane['wait_p50'] * 1000:.0f}ms p99 {lane['wait_p99'] * 1000:.0f}ms max {lane['wait_max'] * 1000:.0f}ms"
+            )
+        return "; ".join(lanes)
+
+    async def _wait_turn(self, chat_id, priority: int):
+        now = time.monotonic()
+        if chat_id is not None:
+            delay = self._chat_bucket(chat_id, now).take(now)
+            if delay > 0:
+                await asyncio.sleep(delay)
+        grant = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._queue, (priority, next(self._arrivals), grant))
+        self._queued.set()
+        await grant
+
+    async def process_request(
+        self,
+        callback: Callable[..., Coroutine[Any, Any, Union[bool, Dict[str, Any], List[Dict[str, Any]]]]],
+        args: Any,
+        kwargs: Dict[str, Any],
+        endpoint: str,
+        data: Dict[str, Any],
+        rate_limit_args: Optional[Dict[str, Any]],
+    ) -> Union[bool, Dict[str, Any], List[Dict[str, Any]]]:
+        chat_id = get_chat_id(data)
+        priority = (rate_limit_args or {}).get("priority", PRIORITY_INTERACTIVE)
+        if priority not in self.lanes:
+            priority = PRIORITY_BULK
+        lane = self.lanes[priority]
+
+        for attempt in range(self.max_retries + 1):
+            if chat_id is not None or self._global.paused_until > time.monotonic():
+                start = time.monotonic()
+                lane.depth += 1
+                try:
+                    await self._wait_turn(chat_id, priority)
+                finally:
+                    lane.depth -= 1
+                wait = time.monotonic() - start
+                lane.waits.append(wait)
+                lane.max_wait = max(lane.max_wait, wait)
+            try:
+                result = await callback(*args, **kwargs)
+            except RetryAfter as e:
+                if attempt == self.max_retries:
+                    raise
+                lane.retries += 1
+                retry_after = e.retry_after.total_seconds() if hasattr(e.retry_after, "total_seconds") else e.retry_after
+                until = time.monotonic() + retry_after
+                print(f"[send] {endpoint} to {chat_id} hit the flood limit, retrying in {retry_after}s")
+                if chat_id is not None:
+                    self._chat_bucket(chat_id, time.monotonic()).pause(until)
+                else:
+                    self._global.pause(until)
+                continue
+            lane.sent += 1
+            return result
@@ -0,0 +1,215 @@
+"""
+Per-user sharded storage backend.
+
+Each user's profile and cards live in their own file,
+data/users/<bucket>/<user_id>.json, where the bucket spreads users over 256
+directories. An operation only reads and writes the shard of the user it
+concerns.
+
+Existing users.json/cards.json data can be split into shards with:
+
+    python sharded_storage.py migrate [--data-dir data]
+"""
+
+import argparse
+import json
+import os
+import threading
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from models import User, Card, cards_from_json, cards_to_json
+from storage import (
+    Storage, atomic_write_json, apply_record, index_cards,
+    OP_ADD, OP_UPDATE, OP_DELETE
+)
+
+BUCKETS = 256
+
+
+def iter_json_object(path: str, chunk_size: int = 1 << 16) -> Iterator[Tuple[str, object]]:
+    """Yield the (key, value) pairs of a top-level JSON object one at a time.
+
+    Only one value is held in memory at once, so huge files can be processed
+    without loading them whole.
+    """
+    decoder = json.JSONDecoder()
+    with open(path, 'r') as f:
+        buffer = ""
+        pos = 0
+        eof = False
+
+        def fill() -> bool:
+            nonlocal buffer, pos, eof
+            if eof:
+                return False
+            chunk = f.read(chunk_size)
+            if not chunk:
+                eof = True
+                return False
+            buffer = buffer[pos:] + chunk
+            pos = 0
+            return True
+
+        def skip_whitespace():
+            nonlocal pos
+            while True:
+                while pos < len(buffer) and buffer[pos].isspace():
+                    pos += 1
+                if pos < len(buffer) or not fill():
+                    return
+
+        def expect(chars: str) -> str:
+            nonlocal pos
+            skip_whitespace()
+            if pos >= len(buffer) or buffer[pos] not in chars:
+                raise ValueError(f"Malformed JSON object in {path}: expected one of {chars!r}")
+            pos += 1
+            return buffer[pos - 1]
+
+        def decode():
+            nonlocal pos
+            skip_whitespace()
+            while True:
+                try:
+                    value, end = decoder.raw_decode(buffer, pos)
+                except json.JSONDecodeError:
+                    if not fill():
+                        raise
+                    continue
+                # A value ending exactly at the buffer end may be cut short (e.g. a number)
+                if end == len(buffer) and fill():
+                    continue
+                pos = end
+                return value
+
+        expect("{")
+        skip_whitespace()
+        if pos < len(buffer) and buffer[pos] == "}":
+            return
+        while True:
+            key = decode()
+            expect(":")
+            yield key, decode()
+            if expect(",}") == "}":
+                return
+
+
+class ShardedStorage(Storage):
+    """Stores every user in a separate JSON file."""
+
+    def __init__(self, shard_dir: str):
+        self.shard_dir = shard_dir
+        self._locks: Dict[int, threading.Lock] = {}
+        self._locks_lock = threading.Lock()
+
+    def shard_path(self, user_id: int) -> str:
+        """Get the path of a user's shard file."""
+        bucket = f"{int(user_id) % BUCKETS:02x}"
+        return os.path.join(self.shard_dir, bucket, f"{user_id}.json")
+
+    def _user_lock(self, user_id: int) -> threading.Lock:
+        with self._locks_lock:
+            return self._locks.setdefault(user_id, threading.Lock())
+
+    def _load_shard(self, user_id: int) -> Tuple[Optional[User], Dict[int, Card]]:
+        """Read a user's shard as (user, card_id -> card)."""
+        path = self.shard_path(user_id)
+        if not os.path.exists(path):
+            return None, {}
+        with open(path, 'r') as f:
+            shard = json.load(f)
+        user = User.from_dict(shard["user"]) if shard["user"] is not None else None
+        return user, index_cards(cards_from_json(shard["cards"]))
+
+    def _save_shard(self, user_id: int, user: Optional[User], cards: Dict[int, Card]):
+        path = self.shard_path(user_id)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        atomic_write_json(path, {
+            "user": user.to_dict() if user is not None else None,
+            "cards": cards_to_json(cards.values())
+        })
+
+    def load_user(self, user_id: int) -> Optional[User]:
+        return self._load_shard(user_id)[0]
+
+    def save_user(self, user_id: int, user: User):
+        with self._user_lock(user_id):
+            _, cards = self._load_shard(user_id)
+            self._save_shard(user_id, user, cards)
+
+    def get_user_cards(self, user_id: int) -> List[Card]:
+        return list(self._load_shard(user_id)[1].values())
+
+    def get_card(self, user_id: int, card_id: int) -> Optional[Card]:
+        return self._load_shard(user_id)[1].get(card_id)
+
+    def get_cards(self, user_id: int, card_ids: List[int]) -> List[Card]:
+        cards = self._load_shard(user_id)[1]
+        return [cards[card_id] for card_id in card_ids if card_id in cards]
+
+    def insert_card(self, user_id: int, card: Card):
+        self.apply(user_id, [{"op": OP_ADD, "c": card}])
+
+    def update_card(self, user_id: int, card_id: int, fields: Dict) -> bool:
+        return self._apply_to_card(user_id, card_id, {"op": OP_UPDATE, "id": card_id, "f": fields})
+
+    def delete_card(self, user_id: int, card_id: int) -> bool:
+        return self._apply_to_card(user_id, card_id, {"op": OP_DELETE, "id": card_id})
+
+    def _apply_to_card(self, user_id: int, card_id: int, record: Dict) -> bool:
+        with self._user_lock(user_id):
+            user, cards = self._load_shard(user_id)
+            if card_id not in cards:
+                return False
+            apply_record(user, cards, record)
+            self._save_shard(user_id, user, cards)
+            return True
+
+    def apply(self, user_id: int, records: List[Dict]):
+        with self._user_lock(user_id):
+            user, cards = self._load_shard(user_id)
+            for record in records:
+                user = apply_record(user, cards, record)
+            self._save_shard(user_id, user, cards)
+
+    def write_users(self, batch: Dict[int, Tuple[Optional[User], List[Card]]]):
+        for user_id, (user, cards) in batch.items():
+            with self._user_lock(user_id):
+                stored_user, _ = self._load_shard(user_id)
+                self._save_shard(user_id, user if user is not None else stored_user, index_cards(cards))
+
+
+def migrate(data_dir: str):
+    """Split users.json/cards.json in `data_dir` into per-user shards."""
+    storage = ShardedStorage(os.path.join(data_dir, "users"))
+    users_file = os.path.join(data_dir, "users.json")
+    cards_file = os.path.join(data_dir, "cards.json")
+
+    users = 0
+    if os.path.exists(users_file):
+        for user_id, user in iter_json_object(users_file):
+            storage.save_user(int(user_id), User.from_dict(user))
+            users += 1
+
+    cards = 0
+    if os.path.exists(cards_file):
+        for user_id, user_cards in iter_json_object(cards_file):
+            storage.write_users({int(user_id): (None, cards_from_json(user_cards))})
+            cards += len(user_cards)
+
+    print(f"Migrated {users} users and {cards} cards to {storage.shard_dir}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-user sharded storage tools")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    migrate_parser = subparsers.add_parser("migrate", help="split users.json/cards.json into shards")
+    migrate_parser.add_argument("--data-dir", default="data")
+    args = parser.parse_args()
+
+    if args.command == "migrate":
+        migrate(args.data_dir)
+
+
+if __name__ == "__main__":
+    main()
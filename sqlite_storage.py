@@ -0,0 +1,350 @@
+"""
+SQLite storage backend.
+
+Users and cards live in indexed tables, so a lookup or a one-field update
+touches a few rows instead of rewriting the whole dataset.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+from typing import Dict, List, Optional, Tuple
+
+import gadgets
+from collection import Page, CollectionSummary, SORT_KEYS, SORT_PRICE, SORT_DATE, SORT_NAME
+from models import User, Card
+from storage import Storage, OP_USER, OP_ADD, OP_UPDATE, OP_DELETE, OP_PUT
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    user_id INTEGER PRIMARY KEY,
+    coins INTEGER NOT NULL DEFAULT 0,
+    last_card_time REAL NOT NULL DEFAULT 0
+);
+
+CREATE TABLE IF NOT EXISTS cards (
+    user_id INTEGER NOT NULL,
+    card_id INTEGER NOT NULL,
+    gadget_name TEXT NOT NULL,
+    category TEXT NOT NULL,
+    purchase_price INTEGER NOT NULL,
+    rarity TEXT NOT NULL,
+    obtained_at REAL NOT NULL,
+    in_pc INTEGER,
+    draw_seed INTEGER,
+    components TEXT NOT NULL DEFAULT '[]',
+    specs TEXT NOT NULL DEFAULT '{}',
+    component_total INTEGER,
+    spec_price INTEGER,
+    PRIMARY KEY (user_id, card_id)
+);
+
+CREATE INDEX IF NOT EXISTS idx_cards_user_category_rarity
+    ON cards (user_id, category, rarity, in_pc);
+"""
+
+# Card count and value per (user, category, rarity, in a PC), kept current by
+# triggers so the collection summary never scans a user's cards
+SUMMARY_SCHEMA = """
+CREATE TABLE IF NOT EXISTS card_summary (
+    user_id INTEGER NOT NULL,
+    category TEXT NOT NULL,
+    rarity TEXT NOT NULL,
+    in_pc INTEGER NOT NULL,
+    cards INTEGER NOT NULL,
+    value INTEGER NOT NULL,
+    PRIMARY KEY (user_id, category, rarity, in_pc)
+);
+
+CREATE TRIGGER IF NOT EXISTS card_summary_insert AFTER INSERT ON cards BEGIN
+    INSERT INTO card_summary (user_id, category, rarity, in_pc, cards, value)
+    VALUES (NEW.user_id, NEW.category, NEW.rarity, NEW.in_pc IS NOT NULL, 1, NEW.purchase_price)
+    ON CONFLICT (user_id, category, rarity, in_pc)
+    DO UPDATE SET cards = cards + 1, value = value + excluded.value;
+END;
+
+CREATE TRIGGER IF NOT EXISTS card_summary_delete AFTER DELETE ON cards BEGIN
+    UPDATE card_summary SET cards = cards - 1, value = value - OLD.purchase_price
+    WHERE user_id = OLD.user_id AND category = OLD.category AND rarity = OLD.rarity
+    AND in_pc = (OLD.in_pc IS NOT NULL);
+    DELETE FROM card_summary WHERE user_id = OLD.user_id AND cards = 0;
+END;
+
+CREATE TRIGGER IF NOT EXISTS card_summary_update
+AFTER UPDATE OF category, rarity, in_pc, purchase_price ON cards BEGIN
+    UPDATE card_summary SET cards = cards - 1, value = value - OLD.purchase_price
+    WHERE user_id = OLD.user_id AND category = OLD.category AND rarity = OLD.rarity
+    AND in_pc = (OLD.in_pc IS NOT NULL);
+    INSERT INTO card_summary (user_id, category, rarity, in_pc, cards, value)
+    VALUES (NEW.user_id, NEW.category, NEW.rarity, NEW.in_pc IS NOT NULL, 1, NEW.purchase_price)
+    ON CONFLICT (user_id, category, rarity, in_pc)
+    DO UPDATE SET cards = cards + 1, value = value + excluded.value;
+    DELETE FROM card_summary WHERE user_id = OLD.user_id AND cards = 0;
+END;
+"""
+
+USER_COLUMNS = ("coins", "last_card_time")
+CARD_COLUMNS = (
+    "card_id", "gadget_name", "category", "purchase_price", "rarity",
+    "obtained_at", "in_pc", "draw_seed", "components", "specs", "component_total", "spec_price"
+)
+# Columns added after the first release: (column, definition)
+ADDED_CARD_COLUMNS = (
+    ("draw_seed", "INTEGER"),
+    ("component_total", "INTEGER"),
+    ("spec_price", "INTEGER"),
+)
+JSON_COLUMNS = ("components", "specs")
+# Expressions the collection browser orders by, matching collection.SORT_KEYS
+SORT_COLUMNS = {
+    SORT_PRICE: ("-purchase_price", "card_id"),
+    SORT_DATE: ("-obtained_at", "card_id"),
+    SORT_NAME: ("gadget_name", "card_id"),
+}
+INSERT_CARD_SQL = (
+    f"INSERT INTO cards (user_id, {', '.join(CARD_COLUMNS)}) "
+    f"VALUES (?, {', '.join('?' for _ in CARD_COLUMNS)})"
+)
+
+
+def _card_from_row(row) -> Card:
+    card = dict(zip(CARD_COLUMNS, row))
+    for column in JSON_COLUMNS:
+        card[column] = json.loads(card[column])
+    return Card.from_dict(card)
+
+
+def _column_value(column: str, value):
+    if column in JSON_COLUMNS:
+        return json.dumps(value, separators=(",", ":"))
+    return value
+
+
+def _card_values(card: Card) -> List:
+    data = card.to_dict()
+    return [_column_value(column, data[column]) for column in CARD_COLUMNS]
+
+
+class SqliteStorage(Storage):
+    """Stores users and cards in a SQLite database running in WAL mode."""
+
+    def __init__(self, path: str):
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        # Handlers may run on different threads, so the connection is shared
+        # behind a lock instead of being bound to the creating thread.
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.executescript(SCHEMA)
+            self._add_missing_columns()
+            self._create_summary()
+            self._conn.commit()
+
+    def _add_missing_columns(self):
+        """Bring databases created by older versions up to the current schema."""
+        existing = {row[1] for row in self._conn.execute("PRAGMA table_info(cards)")}
+        for column, definition in ADDED_CARD_COLUMNS:
+            if column not in existing:
+                self._conn.execute(f"ALTER TABLE cards ADD COLUMN {column} {definition}")
+
+    def _create_summary(self):
+        """Create the summary table and fill it from the cards already stored.
+
+        The triggers keep the table non-empty while there are cards, so an
+        empty one next to stored cards was just created.
+        """
+        self._conn.executescript(SUMMARY_SCHEMA)
+        empty = self._conn.execute("SELECT 1 FROM card_summary LIMIT 1").fetchone() is None
+        if empty and self._conn.execute("SELECT 1 FROM cards LIMIT 1").fetchone() is not None:
+            self._conn.execute(
+                "INSERT INTO card_summary (user_id, category, rarity, in_pc, cards, value) "
+                "SELECT user_id, category, rarity, in_pc IS NOT NULL, COUNT(*), SUM(purchase_price) "
+                "FROM cards GROUP BY user_id, category, rarity, in_pc IS NOT NULL"
+            )
+
+    def _query(self, sql: str, params=()) -> List[tuple]:
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    def _execute(self, sql: str, params=()) -> int:
+        with self._lock, self._conn:
+            return self._conn.execute(sql, params).rowcount
+
+    def load_user(self, user_id: int) -> Optional[User]:
+        rows = self._query(f"SELECT {', '.join(USER_COLUMNS)} FROM users WHERE user_id = ?", (user_id,))
+        if not rows:
+            return None
+        return User(*rows[0])
+
+    def save_user(self, user_id: int, user: User):
+        self._execute(
+            "INSERT OR REPLACE INTO users (user_id, coins, last_card_time) VALUES (?, ?, ?)",
+            (user_id, user.coins, user.last_card_time)
+        )
+
+    def get_user_cards(self, user_id: int) -> List[Card]:
+        rows = self._query(
+            f"SELECT {', '.join(CARD_COLUMNS)} FROM cards WHERE user_id = ? ORDER BY rowid",
+            (user_id,)
+        )
+        return [_card_from_row(row) for row in rows]
+
+    def count_user_cards(self, user_id: int) -> int:
+        return self._query("SELECT COUNT(*) FROM cards WHERE user_id = ?", (user_id,))[0][0]
+
+    def get_card(self, user_id: int, card_id: int) -> Optional[Card]:
+        rows = self._query(
+            f"SELECT {', '.join(CARD_COLUMNS)} FROM cards WHERE user_id = ? AND card_id = ?",
+            (user_id, card_id)
+        )
+        return _card_from_row(rows[0]) if rows else None
+
+    def get_cards(self, user_id: int, card_ids: List[int]) -> List[Card]:
+        if not card_ids:
+            return []
+        rows = self._query(
+            f"SELECT {', '.join(CARD_COLUMNS)} FROM cards "
+            f"WHERE user_id = ? AND card_id IN ({', '.join('?' for _ in card_ids)})",
+            [user_id, *card_ids]
+        )
+        cards = {card.card_id: card for card in map(_card_from_row, rows)}
+        return [cards[card_id] for card_id in card_ids if card_id in cards]
+
+    def find_cards(self, user_id: int, categories: Optional[List[str]] = None,
+                   rarity: Optional[str] = None, free_only: bool = False) -> List[Card]:
+        conditions = ["user_id = ?"]
+        params = [user_id]
+        if categories is not None:
+            conditions.append(f"category IN ({', '.join('?' for _ in categories)})")
+            params.extend(categories)
+        if rarity is not None:
+            conditions.append("rarity = ?")
+            params.append(rarity)
+        if free_only:
+            conditions.append("in_pc IS NULL")
+        rows = self._query(
+            f"SELECT {', '.join(CARD_COLUMNS)} FROM cards WHERE {' AND '.join(conditions)} ORDER BY rowid",
+            params
+        )
+        return [_card_from_row(row) for row in rows]
+
+    def browse_cards(self, user_id: int, gadget_type: str, rarity: str, sort: str,
+                     cursor_id: Optional[int] = None, backward: bool = False, limit: int = 20) -> Page:
+        # Keyset pagination: rows are compared with the cursor card's sort key,
+        # so a page fetches at most limit + 1 rows however deep it is
+        type_info = gadgets.get_gadget_type_groups().get(gadget_type)
+        categories = type_info["categories"] if type_info else []
+        bucket = f"user_id = ? AND category IN ({', '.join('?' for _ in categories)}) AND rarity = ? AND in_pc IS NULL"
+        bucket_params = [user_id, *categories, rarity]
+        sort_key = f"({', '.join(SORT_COLUMNS[sort])})"
+
+        def fetch(condition: str, key: tuple, descending: bool) -> List[Card]:
+            direction = " DESC" if descending else ""
+            order = ", ".join(column + direction for column in SORT_COLUMNS[sort])
+            rows = self._query(
+                f"SELECT {', '.join(CARD_COLUMNS)} FROM cards WHERE {bucket}{condition} ORDER BY {order} LIMIT ?",
+                [*bucket_params, *key, limit + 1]
+            )
+            return [_card_from_row(row) for row in rows]
+
+        def exists(condition: str, key: tuple) -> bool:
+            return bool(self._query(f"SELECT 1 FROM cards WHERE {bucket}{condition} LIMIT 1", [*bucket_params, *key]))
+
+        total = self._query(f"SELECT COUNT(*) FROM cards WHERE {bucket}", bucket_params)[0][0]
+        cursor = self.get_card(user_id, cursor_id) if cursor_id is not None else None
+        key = SORT_KEYS[sort](cursor) if cursor is not None else ()
+        if cursor is not None and backward:
+            cards = fetch(f" AND {sort_key} < (?, ?)", key, descending=True)
+            if len(cards) > limit:
+                return Page(cards[:limit][::-1], total, True, exists(f" AND {sort_key} >= (?, ?)", key))
+            # A short page at the start is filled up to a full first page
+            cursor, key = None, ()
+        if cursor is None:
+            cards = fetch("", key, descending=False)
+            return Page(cards[:limit], total, False, len(cards) > limit)
+        cards = fetch(f" AND {sort_key} > (?, ?)", key, descending=False)
+        return Page(cards[:limit], total, exists(f" AND {sort_key} <= (?, ?)", key), len(cards) > limit)
+
+    def get_summary(self, user_id: int) -> CollectionSummary:
+        return CollectionSummary.from_buckets(self._query(
+            "SELECT category, rarity, in_pc, cards, value FROM card_summary WHERE user_id = ?", (user_id,)
+        ))
+
+    def insert_card(self, user_id: int, card: Card):
+        self._execute(INSERT_CARD_SQL, (user_id, *_card_values(card)))
+
+    def update_card(self, user_id: int, card_id: int, fields: Dict) -> bool:
+        unknown = set(fields) - set(CARD_COLUMNS)
+        if unknown:
+            raise ValueError(f"Unknown card fields: {', '.join(sorted(unknown))}")
+        if not fields:
+            return self.get_card(user_id, card_id) is not None
+        assignments = ", ".join(f"{column} = ?" for column in fields)
+        values = [_column_value(column, value) for column, value in fields.items()]
+        return self._execute(
+            f"UPDATE cards SET {assignments} WHERE user_id = ? AND card_id = ?",
+            (*values, user_id, card_id)
+        ) > 0
+
+    def delete_card(self, user_id: int, card_id: int) -> bool:
+        return self._execute(
+            "DELETE FROM cards WHERE user_id = ? AND card_id = ?",
+            (user_id, card_id)
+        ) > 0
+
+    def _write_user(self, user_id: int, user: Optional[User], cards: List[Card]):
+        """Replace a user's profile and cards. Caller holds the lock and a transaction."""
+        if user is not None:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO users (user_id, coins, last_card_time) VALUES (?, ?, ?)",
+                (user_id, user.coins, user.last_card_time)
+            )
+        self._conn.execute("DELETE FROM cards WHERE user_id = ?", (user_id,))
+        self._conn.executemany(INSERT_CARD_SQL, [(user_id, *_card_values(card)) for card in cards])
+
+    def write_users(self, batch: Dict[int, Tuple[Optional[User], List[Card]]]):
+        with self._lock, self._conn:
+            for user_id, (user, cards) in batch.items():
+                self._write_user(user_id, user, cards)
+
+    def apply(self, user_id: int, records: List[Dict]):
+        # Run every record inside one SQL transaction so they commit together
+        with self._lock, self._conn:
+            for record in records:
+                op = record["op"]
+                if op == OP_USER:
+                    user = record["d"]
+                    self._conn.execute(
+                        "INSERT OR REPLACE INTO users (user_id, coins, last_card_time) VALUES (?, ?, ?)",
+                        (user_id, user.coins, user.last_card_time)
+                    )
+                elif op == OP_ADD:
+                    self._conn.execute(INSERT_CARD_SQL, (user_id, *_card_values(record["c"])))
+                elif op == OP_UPDATE:
+                    fields = record["f"]
+                    if not fields:
+                        continue
+                    assignments = ", ".join(f"{column} = ?" for column in fields)
+                    values = [_column_value(column, value) for column, value in fields.items()]
+                    self._conn.execute(
+                        f"UPDATE cards SET {assignments} WHERE user_id = ? AND card_id = ?",
+                        (*values, user_id, record["id"])
+                    )
+                elif op == OP_DELETE:
+                    self._conn.execute(
+                        "DELETE FROM cards WHERE user_id = ? AND card_id = ?",
+                        (user_id, record["id"])
+                    )
+                elif op == OP_PUT:
+                    self._write_user(user_id, record["d"], record["c"])
+                else:
+                    raise ValueError(f"Unknown mutation record: {op}")
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
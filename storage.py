@@ -0,0 +1,486 @@
+"""
+Storage backends for the Telegram Gadget Card Bot.
+
+A backend stores user profiles and cards. The `database` module picks one
+based on `config.STORAGE_BACKEND` and routes every call through it.
+
+Users and cards are `models.User`/`models.Card` objects. Those returned by a
+backend may be shared with its cache, so callers must not modify them; use
+`update_card`/`save_user` instead. JSON-based backends write cards in the
+packed form (see `models.Card.to_packed`).
+"""
+
+import json
+import os
+import threading
+from typing import Dict, List, Optional, Tuple
+
+import collection
+from models import User, Card, cards_from_json, cards_to_json
+
+# Mutation records. Records carry absolute values, so applying one twice is harmless.
+OP_USER = "user"      # {"op": "user", "d": user}
+OP_ADD = "add"        # {"op": "add", "c": card}
+OP_UPDATE = "upd"     # {"op": "upd", "id": card_id, "f": fields}
+OP_DELETE = "del"     # {"op": "del", "id": card_id}
+OP_PUT = "put"        # {"op": "put", "d": user or None, "c": cards}
+
+
+class CardMap(dict):
+    """A card_id -> card index that keeps the collection browser's sorted
+    indexes (`collection.CollectionIndex`) and the collection summary
+    (`collection.CollectionSummary`) up to date once they're built.
+
+    Only the mutations backends use (item assignment, `setdefault`, `pop`,
+    `clear` and `update`) are tracked.
+    """
+
+    __slots__ = ("_collection", "_summary")
+
+    def __init__(self, *args):
+        super().__init__(*args)
+        self._collection: Optional[collection.CollectionIndex] = None
+        self._summary: Optional[collection.CollectionSummary] = None
+
+    def collection_index(self) -> collection.CollectionIndex:
+        """Get the sorted indexes of the cards, building them on first use and
+        rebuilding them after a catalog reload (it may regroup categories)."""
+        if self._collection is None or not self._collection.is_current():
+            self._collection = collection.CollectionIndex(self.values())
+        return self._collection
+
+    def summary(self) -> collection.CollectionSummary:
+        """Get a copy of the collection summary, building it on first use."""
+        if self._summary is None:
+            self._summary = collection.CollectionSummary(self.values())
+        return self._summary.copy()
+
+    def browse(self, gadget_type: str, rarity: str, sort: str, cursor_id: Optional[int] = None,
+               backward: bool = False, limit: int = 20) -> collection.Page:
+        return collection.browse(self, self.collection_index(), gadget_type, rarity, sort, cursor_id, backward, limit)
+
+    def _track(self, old: Optional[Card], new: Optional[Card]):
+        """Move a card from `old` to `new` in whatever has been built."""
+        for view in (self._collection, self._summary):
+            if view is None:
+                continue
+            if old is not None:
+                view.remove(old)
+            if new is not None:
+                view.add(new)
+
+    def __setitem__(self, card_id: int, card: Card):
+        self._track(self.get(card_id), card)
+        super().__setitem__(card_id, card)
+
+    def setdefault(self, card_id: int, card: Card) -> Card:
+        if card_id not in self:
+            self[card_id] = card
+        return self[card_id]
+
+    def pop(self, card_id: int, *default):
+        self._track(self.get(card_id), None)
+        return super().pop(card_id, *default)
+
+    def clear(self):
+        super().clear()
+        self._collection = None
+        self._summary = None
+
+    def update(self, cards: Dict[int, Card]):
+        for card_id, card in cards.items():
+            self[card_id] = card
+
+
+def index_cards(cards: List[Card]) -> CardMap:
+    """Build a card_id -> card index. Dicts keep insertion order, so iterating
+    the index still yields cards in the order they were added."""
+    return CardMap((card.card_id, card) for card in cards)
+
+
+def apply_record(user: Optional[User], cards: Dict[int, Card], record: Dict) -> Optional[User]:
+    """Apply a mutation record to one user's profile and card index.
+
+    `cards` is modified in place; cards are replaced, never modified.
+    Returns the resulting profile.
+    """
+    op = record["op"]
+    if op == OP_USER:
+        return record["d"]
+    if op == OP_ADD:
+        card = record["c"]
+        cards.setdefault(card.card_id, card)
+    elif op == OP_UPDATE:
+        card = cards.get(record["id"])
+        if card is not None:
+            cards[record["id"]] = card.replace(**record["f"])
+    elif op == OP_DELETE:
+        cards.pop(record["id"], None)
+    elif op == OP_PUT:
+        cards.clear()
+        cards.update(index_cards(record["c"]))
+        if record["d"] is not None:
+            return record["d"]
+    else:
+        raise ValueError(f"Unknown mutation record: {op}")
+    return user
+
+
+def atomic_write_json(path: str, data, indent: Optional[int] = None):
+    """Write JSON to a temporary file and rename it over `path`.
+
+    A crash mid-write leaves the previous file intact instead of a truncated one.
+    """
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w') as f:
+        if indent is None:
+            json.dump(data, f, separators=(",", ":"))
+        else:
+            json.dump(data, f, indent=indent)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+class Storage:
+    """Base class for storage backends."""
+
+    def load_user(self, user_id: int) -> Optional[User]:
+        """Get user data, or None if the user doesn't exist."""
+        raise NotImplementedError
+
+    def save_user(self, user_id: int, user: User):
+        """Create or replace user data."""
+        raise NotImplementedError
+
+    def get_user_cards(self, user_id: int) -> List[Card]:
+        """Get all cards for a user, in the order they were added."""
+        raise NotImplementedError
+
+    def count_user_cards(self, user_id: int) -> int:
+        """Get the number of cards a user has."""
+        return len(self.get_user_cards(user_id))
+
+    def get_card(self, user_id: int, card_id: int) -> Optional[Card]:
+        """Get a specific card by ID."""
+        for card in self.get_user_cards(user_id):
+            if card.card_id == card_id:
+                return card
+        return None
+
+    def get_cards(self, user_id: int, card_ids: List[int]) -> List[Card]:
+        """Get several cards by ID in one read, in the order of `card_ids`. Missing IDs are skipped."""
+        cards = index_cards(self.get_user_cards(user_id))
+        return [cards[card_id] for card_id in card_ids if card_id in cards]
+
+    def get_pcs(self, user_id: int, pc_ids: Optional[List[int]] = None) -> List[Tuple[Card, List[Card]]]:
+        """Get user's PCs (all of them, or the given IDs) as (pc_card, component_cards) pairs.
+
+        Components of all requested PCs are resolved with a single bulk read.
+        """
+        if pc_ids is None:
+            pcs = self.find_cards(user_id, categories=["PC"])
+        else:
+            pcs = [card for card in self.get_cards(user_id, pc_ids) if card.category == "PC"]
+        component_ids = [comp_id for pc in pcs for comp_id in pc.components]
+        components = index_cards(self.get_cards(user_id, component_ids))
+        return [
+            (pc, [components[comp_id] for comp_id in pc.components if comp_id in components])
+            for pc in pcs
+        ]
+
+    def find_cards(self, user_id: int, categories: Optional[List[str]] = None,
+                   rarity: Optional[str] = None, free_only: bool = False) -> List[Card]:
+        """Get user's cards filtered by category, rarity and whether they are in a PC."""
+        return [
+            card for card in self.get_user_cards(user_id)
+            if (categories is None or card.category in categories)
+            and (rarity is None or card.rarity == rarity)
+            and (not free_only or card.in_pc is None)
+        ]
+
+    def browse_cards(self, user_id: int, gadget_type: str, rarity: str, sort: str,
+                     cursor_id: Optional[int] = None, backward: bool = False, limit: int = 20) -> collection.Page:
+        """Get a page of user's cards of a gadget type group and rarity that aren't
+        in a PC, sorted by `sort` (see `collection`).
+
+        Without `cursor_id` this is the first page; with it, the page right after
+        that card, or right before it if `backward`.
+        """
+        return index_cards(self.get_user_cards(user_id)).browse(gadget_type, rarity, sort, cursor_id, backward, limit)
+
+    def get_summary(self, user_id: int) -> collection.CollectionSummary:
+        """Get the card counts and values of user's collection (see `collection.CollectionSummary`)."""
+        return collection.CollectionSummary(self.get_user_cards(user_id))
+
+    def insert_card(self, user_id: int, card: Card):
+        """Append a new card to user's collection."""
+        raise NotImplementedError
+
+    def update_card(self, user_id: int, card_id: int, fields: Dict) -> bool:
+        """Update card fields. Returns True if the card exists."""
+        raise NotImplementedError
+
+    def delete_card(self, user_id: int, card_id: int) -> bool:
+        """Delete a card. Returns True if removed."""
+        raise NotImplementedError
+
+    def write_users(self, batch: Dict[int, Tuple[Optional[User], List[Card]]]):
+        """Replace the stored profile and full card list of several users at once.
+
+        `batch` maps user_id to (user, cards); a None user leaves the profile untouched.
+        """
+        for user_id, (user, cards) in batch.items():
+            if user is not None:
+                self.save_user(user_id, user)
+            for card in self.get_user_cards(user_id):
+                self.delete_card(user_id, card.card_id)
+            for card in cards:
+                self.insert_card(user_id, card)
+
+    def apply(self, user_id: int, records: List[Dict]):
+        """Apply several mutation records to one user as a single write.
+
+        Backends that can do so commit all records atomically.
+        """
+        for record in records:
+            op = record["op"]
+            if op == OP_USER:
+                self.save_user(user_id, record["d"])
+            elif op == OP_ADD:
+                self.insert_card(user_id, record["c"])
+            elif op == OP_UPDATE:
+                self.update_card(user_id, record["id"], record["f"])
+            elif op == OP_DELETE:
+                self.delete_card(user_id, record["id"])
+            elif op == OP_PUT:
+                self.write_users({user_id: (record["d"], record["c"])})
+            else:
+                raise ValueError(f"Unknown mutation record: {op}")
+
+    def flush(self):
+        """Write out any buffered changes."""
+
+    def close(self):
+        """Release resources held by the backend."""
+
+
+class JsonStorage(Storage):
+    """Stores everything in two JSON files: users.json and cards.json.
+
+    The parsed files are cached together with a per-user card_id index and
+    only re-read when they change on disk. Every write still rewrites the
+    whole file, so this backend is only suitable for small installations.
+    """
+
+    def __init__(self, data_dir: str):
+        self.data_dir = data_dir
+        self.users_file = os.path.join(data_dir, "users.json")
+        self.cards_file = os.path.join(data_dir, "cards.json")
+        # Writes are load-modify-save of a whole file, so they must not overlap
+        self._lock = threading.RLock()
+        self._users: Dict[str, User] = {}
+        self._cards: Dict[str, Dict[int, Card]] = {}
+        # (mtime, size) of each file when it was last read or written
+        self._stamps: Dict[str, Optional[Tuple[int, int]]] = {}
+
+    def ensure_data_dir(self):
+        """Create data directory if it doesn't exist."""
+        if not os.path.exists(self.data_dir):
+            os.makedirs(self.data_dir)
+
+    @staticmethod
+    def _stamp(path: str) -> Optional[Tuple[int, int]]:
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def _load(self, path: str) -> Dict:
+        self.ensure_data_dir()
+        if not os.path.exists(path):
+            return {}
+        try:
+            with open(path, 'r') as f:
+                return json.load(f)
+        except (json.JSONDecodeError, IOError):
+            return {}
+
+    def _save(self, path: str, data: Dict):
+        self.ensure_data_dir()
+        atomic_write_json(path, data)
+        self._stamps[path] = self._stamp(path)
+
+    def _refresh(self):
+        """Re-read files that changed on disk since we last saw them. Caller holds the lock."""
+        stamp = self._stamp(self.users_file)
+        if self.users_file not in self._stamps or stamp != self._stamps[self.users_file]:
+            self._users = {
+                user_id: User.from_dict(user) for user_id, user in self._load(self.users_file).items()
+            }
+            self._stamps[self.users_file] = stamp
+        stamp = self._stamp(self.cards_file)
+        if self.cards_file not in self._stamps or stamp != self._stamps[self.cards_file]:
+            self._cards = {
+                user_id: index_cards(cards_from_json(cards)) for user_id, cards in self._load(self.cards_file).items()
+            }
+            self._stamps[self.cards_file] = stamp
+
+    def load_users(self) -> Dict[str, User]:
+        """Load users data from JSON file."""
+        with self._lock:
+            self._refresh()
+            return dict(self._users)
+
+    def save_users(self, users: Dict[str, User]):
+        """Save users data to JSON file."""
+        with self._lock:
+            self._users = dict(users)
+            self._save_users()
+
+    def load_cards(self) -> Dict[str, List[Card]]:
+        """Load cards data from JSON file."""
+        with self._lock:
+            self._refresh()
+            return {user_id: list(cards.values()) for user_id, cards in self._cards.items()}
+
+    def save_cards(self, cards: Dict[str, List[Card]]):
+        """Save cards data to JSON file."""
+        with self._lock:
+            self._cards = {user_id: index_cards(user_cards) for user_id, user_cards in cards.items()}
+            self._save_cards()
+
+    def _save_users(self):
+        self._save(self.users_file, {user_id: user.to_dict() for user_id, user in self._users.items()})
+
+    def _save_cards(self):
+        self._save(self.cards_file, {user_id: cards_to_json(cards.values()) for user_id, cards in self._cards.items()})
+
+    def load_user(self, user_id: int) -> Optional[User]:
+        with self._lock:
+            self._refresh()
+            return self._users.get(str(user_id))
+
+    def save_user(self, user_id: int, user: User):
+        self.apply(user_id, [{"op": OP_USER, "d": user}])
+
+    def get_user_cards(self, user_id: int) -> List[Card]:
+        with self._lock:
+            self._refresh()
+            return list(self._cards.get(str(user_id), {}).values())
+
+    def count_user_cards(self, user_id: int) -> int:
+        with self._lock:
+            self._refresh()
+            return len(self._cards.get(str(user_id), {}))
+
+    def get_card(self, user_id: int, card_id: int) -> Optional[Card]:
+        with self._lock:
+            self._refresh()
+            return self._cards.get(str(user_id), {}).get(card_id)
+
+    def get_cards(self, user_id: int, card_ids: List[int]) -> List[Card]:
+        with self._lock:
+            self._refresh()
+            cards = self._cards.get(str(user_id), {})
+            return [cards[card_id] for card_id in card_ids if card_id in cards]
+
+    def browse_cards(self, user_id: int, gadget_type: str, rarity: str, sort: str,
+                     cursor_id: Optional[int] = None, backward: bool = False, limit: int = 20) -> collection.Page:
+        with self._lock:
+            self._refresh()
+            cards = self._cards.get(str(user_id)) or CardMap()
+            return cards.browse(gadget_type, rarity, sort, cursor_id, backward, limit)
+
+    def get_summary(self, user_id: int) -> collection.CollectionSummary:
+        with self._lock:
+            self._refresh()
+            return (self._cards.get(str(user_id)) or CardMap()).summary()
+
+    def insert_card(self, user_id: int, card: Card):
+        self.apply(user_id, [{"op": OP_ADD, "c": card}])
+
+    def _has_card(self, user_id: int, card_id: int) -> bool:
+        self._refresh()
+        return card_id in self._cards.get(str(user_id), {})
+
+    def update_card(self, user_id: int, card_id: int, fields: Dict) -> bool:
+        with self._lock:
+            if not self._has_card(user_id, card_id):
+                return False
+            self.apply(user_id, [{"op": OP_UPDATE, "id": card_id, "f": fields}])
+            return True
+
+    def delete_card(self, user_id: int, card_id: int) -> bool:
+        with self._lock:
+            if not self._has_card(user_id, card_id):
+                return False
+            self.apply(user_id, [{"op": OP_DELETE, "id": card_id}])
+            return True
+
+    def write_users(self, batch: Dict[int, Tuple[Optional[User], List[Card]]]):
+        with self._lock:
+            self._refresh()
+            for user_id, (user, cards) in batch.items():
+                if user is not None:
+                    self._users[str(user_id)] = user
+                self._cards[str(user_id)] = index_cards(cards)
+            self._commit(users_changed=True, cards_changed=True)
+
+    def apply(self, user_id: int, records: List[Dict]):
+        with self._lock:
+            self._refresh()
+            user_id_str = str(user_id)
+            user = self._users.get(user_id_str)
+            cards = self._cards.setdefault(user_id_str, CardMap())
+            for record in records:
+                user = apply_record(user, cards, record)
+            users_changed = user is not None and user is not self._users.get(user_id_str)
+            if users_changed:
+                self._users[user_id_str] = user
+            self._commit(users_changed, any(record["op"] != OP_USER for record in records))
+
+    def _commit(self, users_changed: bool, cards_changed: bool):
+        """Write the cached data back to disk. Caller holds the lock."""
+        try:
+            if users_changed:
+                self._save_users()
+            if cards_changed:
+                self._save_cards()
+        except Exception:
+            # The cache is ahead of the files now; re-read them on next access
+            self._stamps.clear()
+            raise
+
+
+def create_storage(backend: str) -> Storage:
+    """Create the storage backend selected by name."""
+    import config
+
+    if backend == "json":
+        return JsonStorage(config.DATA_DIR)
+    if backend == "sqlite":
+        from sqlite_storage import SqliteStorage
+        return SqliteStorage(config.SQLITE_PATH)
+    if backend == "memory":
+        from memory_storage import MemoryStorage
+        if config.MEMORY_BACKING_STORE == "memory":
+            raise ValueError("MEMORY_BACKING_STORE can't be \"memory\"")
+        return MemoryStorage(
+            create_storage(config.MEMORY_BACKING_STORE),
+            flush_interval=config.WRITE_BEHIND_FLUSH_INTERVAL,
+            max_dirty=config.WRITE_BEHIND_MAX_DIRTY,
+            durability=config.WRITE_BEHIND_DURABILITY
+        )
+    if backend == "wal":
+        from wal_storage import WalStorage
+        return WalStorage(
+            config.DATA_DIR,
+            fsync=config.WAL_FSYNC,
+            compact_records=config.WAL_COMPACT_RECORDS
+        )
+    if backend == "sharded":
+        from sharded_storage import ShardedStorage
+        return ShardedStorage(config.SHARD_DIR)
+    raise ValueError(f"Unknown storage backend: {backend}")
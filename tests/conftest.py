@@ -0,0 +1,6 @@
+import os
+import sys
+
+# The modules live at the repository root; config refuses to load without a token
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("BOT_TOKEN", "test")
@@ -0,0 +1,78 @@
+"""
+The precomputed PC spec table must give exactly what the old generator did.
+"""
+
+import pytest
+
+import pc_generator
+from gadgets import get_rarity_value, RARITY_COMMON, RARITY_RARE, RARITY_EPIC, RARITY_LEGENDARY
+
+
+def legacy_generate_pc_specs(gpu_rarity, cpu_rarity, motherboard_rarity):
+    """pc_generator.generate_pc_specs as it was before the spec tables: rarity
+    comparison chains and substring pricing."""
+    def pick(rarity, options):
+        value = get_rarity_value(rarity)
+        if value <= get_rarity_value(RARITY_COMMON):
+            return options[0]
+        elif value <= get_rarity_value(RARITY_RARE):
+            return options[1]
+        elif value == get_rarity_value(RARITY_EPIC):
+            return options[2]
+        elif value == get_rarity_value(RARITY_LEGENDARY):
+            return options[3]
+        return options[4]
+
+    def price_of(spec, prices):
+        for substring, price in prices:
+            if substring(spec) if callable(substring) else substring in spec:
+                return price
+        return 0
+
+    rarity = pc_generator.get_highest_rarity([gpu_rarity, cpu_rarity, motherboard_rarity])
+    ram = pick(rarity, ["8GB DDR4", "16GB DDR4", "32GB DDR5", "32GB DDR5", "64GB DDR5"])
+    storage = pick(rarity, ["256GB SATA SSD", "512GB NVMe SSD", "1TB NVMe SSD", "2TB NVMe SSD", "2TB+ NVMe SSD"])
+    psu = pick(rarity, ["500W 80+ Bronze", "750W 80+ Gold", "850W 80+ Gold", "1000W 80+ Platinum", "1200W 80+ Titanium"])
+    case = pick(rarity, ["Budget ATX Case", "Mid-Tower ATX Case", "Full-Tower ATX Case", "Premium Full-Tower Case", "Ultimate Premium Case"])
+    spec_price = (
+        price_of(ram, [("8GB", 40), ("16GB", 80), ("32GB", 150), ("64GB", 300)])
+        + price_of(storage, [("256GB", 30), ("512GB", 60), ("1TB", 100), ("2TB", 180)])
+        + price_of(psu, [("500W", 50), ("750W", 100), ("850W", 130), ("1000W", 200), ("1200W", 300)])
+        + price_of(case, [
+            ("Budget", 40), ("Mid-Tower", 80),
+            (lambda spec: "Full-Tower" in spec and "Premium" not in spec, 120), ("Premium", 200)
+        ])
+    )
+    return {"ram": ram, "storage": storage, "psu": psu, "case": case}, rarity, spec_price
+
+
+COMBINATIONS = [
+    (gpu_rarity, cpu_rarity, motherboard_rarity)
+    for gpu_rarity in pc_generator.RARITIES
+    for cpu_rarity in pc_generator.RARITIES
+    for motherboard_rarity in pc_generator.RARITIES
+]
+
+
+def test_table_covers_every_combination():
+    assert len(COMBINATIONS) == 343
+    assert set(pc_generator.PC_SPECS_TABLE) == set(COMBINATIONS)
+
+
+@pytest.mark.parametrize("combination", COMBINATIONS)
+def test_table_matches_legacy_generator(combination):
+    assert pc_generator.generate_pc_specs(*combination) == legacy_generate_pc_specs(*combination)
+
+
+@pytest.mark.parametrize("combination", [
+    ("Unknown", "Unknown", "Unknown"),
+    ("Unknown", RARITY_COMMON, RARITY_EPIC),
+])
+def test_unknown_rarity_matches_legacy_generator(combination):
+    assert pc_generator.generate_pc_specs(*combination) == legacy_generate_pc_specs(*combination)
+
+
+def test_callers_get_their_own_specs():
+    specs, _, _ = pc_generator.generate_pc_specs(RARITY_RARE, RARITY_RARE, RARITY_RARE)
+    specs["ram"] = "changed"
+    assert pc_generator.generate_pc_specs(RARITY_RARE, RARITY_RARE, RARITY_RARE)[0]["ram"] == "16GB DDR4"
@@ -3,7 +3,6 @@ Utility functions for the Telegram Gadget Card Bot.
 """
 
 import os
-import database
 
 
 # Image paths
@@ -20,37 +19,21 @@ IMAGE_PATHS = {
 
 async def send_or_edit_message(query, message_obj, message, reply_markup=None, parse_mode="HTML", photo_path=None):
     """Helper to send or edit message with optional photo."""
-    if photo_path and os.path.exists(photo_path):
+    import assets
+    import images
+    
+    if photo_path and assets.exists(photo_path):
         if query:
             # For callbacks, we need to edit the message with media
-            from telegram import InputMediaPhoto
-            with open(photo_path, 'rb') as photo:
-                media = InputMediaPhoto(media=photo, caption=message, parse_mode=parse_mode)
-                # Try to edit as media (works even if current message is text)
-                await query.edit_message_media(media=media, reply_markup=reply_markup)
+            # (uploaded once, then sent by its cached file_id)
+            await images.edit_photo(query, photo_path, message, reply_markup, parse_mode=parse_mode)
         else:
             # For new messages, send photo with caption
-            with open(photo_path, 'rb') as photo:
-                await message_obj.reply_photo(photo=photo, caption=message, reply_markup=reply_markup, parse_mode=parse_mode)
+            await images.reply_photo(message_obj, photo_path, message, reply_markup, parse_mode=parse_mode)
     else:
         # Fallback to text only if no photo or photo doesn't exist
         if query:
-            # Check if message has media by checking message attributes
-            has_media = (query.message.photo is not None and len(query.message.photo) > 0) or \
-                       query.message.video is not None or \
-                       query.message.document is not None
-            
-            if has_media:
-                # Message has media - try to edit caption first
-                try:
-                    await query.edit_message_caption(caption=message, reply_markup=reply_markup, parse_mode=parse_mode)
-                except Exception:
-                    # If caption edit fails, delete and resend as text
-                    await query.message.delete()
-                    await query.message.reply_text(message, reply_markup=reply_markup, parse_mode=parse_mode)
-            else:
-                # Message is text - edit normally
-                await query.edit_message_text(message, reply_markup=reply_markup, parse_mode=parse_mode)
+            await safe_edit_message(query, message, reply_markup, parse_mode=parse_mode)
         else:
             await message_obj.reply_text(message, reply_markup=reply_markup, parse_mode=parse_mode)
 
@@ -58,59 +41,125 @@ async def send_or_edit_message(query, message_obj, message, reply_markup=None, p
 async def safe_edit_message(query, message, reply_markup=None, parse_mode="HTML", remove_media=False):
     """Safely edit a message, handling both text and media messages.
     
+    Edits go through edit_coalescer: rapid taps on the same message send
+    only the latest state, and an edit that changes nothing is skipped.
+    
     Args:
         remove_media: If True, remove media and send as text only (delete and resend)
     """
-    # Check if message has media
-    has_media = (query.message.photo is not None and len(query.message.photo) > 0) or \
-                query.message.video is not None or \
-                query.message.document is not None
+    import edit_coalescer
     
-    if has_media and remove_media:
-        # Remove media and send as text - delete and resend
-        await query.message.delete()
-        await query.message.reply_text(message, reply_markup=reply_markup, parse_mode=parse_mode)
-    elif has_media:
-        # Message has media - try to edit caption
-        try:
-            await query.edit_message_caption(caption=message, reply_markup=reply_markup, parse_mode=parse_mode)
-        except Exception:
-            # If caption edit fails, delete and resend as text
+    async def edit():
+        # Check if message has media
+        has_media = (query.message.photo is not None and len(query.message.photo) > 0) or \
+                    query.message.video is not None or \
+                    query.message.document is not None
+        
+        if has_media and remove_media:
+            # Remove media and send as text - delete and resend
             await query.message.delete()
             await query.message.reply_text(message, reply_markup=reply_markup, parse_mode=parse_mode)
-    else:
-        # Message is text - edit normally
-        await query.edit_message_text(message, reply_markup=reply_markup, parse_mode=parse_mode)
+        elif has_media:
+            # Message has media - try to edit caption
+            try:
+                await query.edit_message_caption(caption=message, reply_markup=reply_markup, parse_mode=parse_mode)
+            except Exception as e:
+                if edit_coalescer.is_not_modified_error(e):
+                    raise
+                # If caption edit fails, delete and resend as text
+                await query.message.delete()
+                await query.message.reply_text(message, reply_markup=reply_markup, parse_mode=parse_mode)
+        else:
+            # Message is text - edit normally
+            await query.edit_message_text(message, reply_markup=reply_markup, parse_mode=parse_mode)
+    
+    digest = edit_coalescer.content_digest("text", message, parse_mode, remove_media, reply_markup=reply_markup)
+    await edit_coalescer.edit(query, digest, edit)
+
+
+def get_draw_count(text: str):
+    """Parse a draw size (1, "10", "100"). Returns None if it isn't an allowed one."""
+    from config import MULTI_PULL_SIZES
+    
+    try:
+        count = int(text)
+    except (TypeError, ValueError):
+        return None
+    return count if count == 1 or count in MULTI_PULL_SIZES else None
+
+
+def get_draw_keyboard():
+    """Get the buttons offered under a drawn card."""
+    from telegram import InlineKeyboardButton
+    from config import MULTI_PULL_SIZES
+    import routes
+    
+    return [
+        [InlineKeyboardButton("Ещё карточку 🎴", callback_data=routes.GET_CARD.data(1))]
+        + [InlineKeyboardButton(f"x{count} 🎴", callback_data=routes.GET_CARD.data(count)) for count in MULTI_PULL_SIZES],
+        [InlineKeyboardButton("Мои Гаджеты 📚", callback_data=routes.VIEW_GADGETS.data())]
+    ]
+
 
+async def draw_cards(user_id: int, count: int = 1):
+    """Draw `count` random gadgets into the user's collection in one write.
+    
+    Returns a list of (gadget, card_id) pairs.
+    """
+    import time
+    import gadgets
+    import async_database
+    
+    draws = gadgets.draw_gadgets(count)
+    drawn_gadgets = [gadget for gadget, _ in draws]
+    
+    def draw(tx):
+        card_ids = tx.add_cards(drawn_gadgets, [seed for _, seed in draws])
+        tx.update_user(last_card_time=time.time())
+        return card_ids
+    
+    card_ids = await async_database.transaction(user_id, draw)
+    return list(zip(drawn_gadgets, card_ids))
 
-def calculate_pc_sale_price(user_id: int, pc_card: dict):
-    """Calculate PC sale price (115% of component total, then 85% when selling)."""
-    components = pc_card.get("components", [])
-    component_total = 0
-    for comp_id in components:
-        comp_card = database.get_card(user_id, comp_id)
-        if comp_card:
-            component_total += comp_card["purchase_price"]
-    # Get spec price from PC price
-    spec_price = pc_card["purchase_price"] - int(component_total * 1.15)
-    component_total_with_specs = component_total + spec_price
-    return int(component_total_with_specs * 1.15 * 0.85)  # 15% premium, then 85% when selling
+
+async def send_draw_result(message_obj, drawn: list, reply_markup=None):
+    """Reply with the drawn cards: the full card for a single draw, one summary message for a multi-pull."""
+    import assets
+    import images
+    import messages
+    
+    if len(drawn) == 1:
+        gadget, card_id = drawn[0]
+        message = messages.get_card_display_message(gadget, card_id, title="🎴 <b>Ты получил новую карточку!</b> 🎉")
+    else:
+        message = messages.get_multi_card_message(drawn)
+    
+    # Send with image
+    photo_path = IMAGE_PATHS["new_card"]
+    if assets.exists(photo_path):
+        await images.reply_photo(message_obj, photo_path, message, reply_markup, parse_mode="HTML")
+    else:
+        await message_obj.reply_text(message, reply_markup=reply_markup, parse_mode="HTML")
 
 
 async def grant_initial_gadgets(user_id: int):
     """Grant initial gadgets to user if they don't have them."""
     import gadgets
+    import async_database
     from config import INIT_GADGETS
     
-    for gadget_name in INIT_GADGETS:
-        if not database.user_has_gadget(user_id, gadget_name):
-            gadget = gadgets.get_gadget_by_name(gadget_name)
-            if gadget:
-                database.add_card(
-                    user_id,
-                    gadget["name"],
-                    gadget["category"],
-                    gadget["price"],
-                    gadget["rarity"]
-                )
+    def grant(tx):
+        owned = {card.gadget_name for card in tx.get_user_cards()}
+        for gadget_name in INIT_GADGETS:
+            if gadget_name not in owned:
+                gadget = gadgets.get_gadget_by_name(gadget_name)
+                if gadget:
+                    tx.add_card(
+                        gadget["name"],
+                        gadget["category"],
+                        gadget["price"],
+                        gadget["rarity"]
+                    )
+    
+    await async_database.transaction(user_id, grant)
 
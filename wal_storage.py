@@ -0,0 +1,252 @@
+"""
+Journaled JSON storage backend.
+
+The users.json/cards.json files act as a snapshot. Every mutation is appended
+as one line to data/journal.log and applied to the in-memory copy, so a write
+costs as much as the change itself. On startup the journal is replayed on top
+of the snapshot; once it grows past a threshold it is compacted into a new
+snapshot in the background.
+"""
+
+import json
+import os
+import shutil
+import threading
+from typing import Dict, List, Optional, Tuple
+
+from collection import Page, CollectionSummary
+from models import User, Card, cards_from_json, cards_to_json
+from storage import (
+    Storage, CardMap, atomic_write_json, apply_record, index_cards,
+    OP_USER, OP_ADD, OP_UPDATE, OP_DELETE, OP_PUT
+)
+
+JOURNAL_NAME = "journal.log"
+
+# Journal lines are the mutation records from storage.py plus the user they
+# belong to ("u"). A transaction is journaled as one line holding all its
+# records: {"op": "batch", "u": user_id, "r": [records]}. Users are written as
+# dicts and cards in packed form.
+OP_BATCH = "batch"
+
+
+def encode_record(record: Dict) -> Dict:
+    """Convert a mutation record to its JSON form."""
+    op = record["op"]
+    if op == OP_BATCH:
+        return {**record, "r": [encode_record(sub_record) for sub_record in record["r"]]}
+    if op == OP_USER:
+        return {**record, "d": record["d"].to_dict()}
+    if op == OP_ADD:
+        return {**record, "c": record["c"].to_packed()}
+    if op == OP_PUT:
+        user = record["d"]
+        return {**record, "d": user.to_dict() if user is not None else None, "c": cards_to_json(record["c"])}
+    return record
+
+
+def decode_record(data: Dict) -> Dict:
+    """Convert a journal line back into a mutation record."""
+    op = data["op"]
+    if op == OP_BATCH:
+        return {**data, "r": [decode_record(sub_record) for sub_record in data["r"]]}
+    if op == OP_USER:
+        return {**data, "d": User.from_dict(data["d"])}
+    if op == OP_ADD:
+        return {**data, "c": Card.from_json(data["c"])}
+    if op == OP_PUT:
+        user = data["d"]
+        return {**data, "d": User.from_dict(user) if user is not None else None, "c": cards_from_json(data["c"])}
+    return data
+
+
+def replay_record(users: Dict[str, User], cards: Dict[str, Dict[int, Card]], record: Dict):
+    """Apply one journal line to the users dict and the per-user card indexes."""
+    user_id_str = str(record["u"])
+    user_cards = cards.setdefault(user_id_str, CardMap())
+    user = users.get(user_id_str)
+    for sub_record in record["r"] if record["op"] == OP_BATCH else [record]:
+        user = apply_record(user, user_cards, sub_record)
+    if user is not None:
+        users[user_id_str] = user
+
+
+class WalStorage(Storage):
+    """Keeps all data in memory, persisted as snapshot + append-only journal."""
+
+    def __init__(self, data_dir: str, fsync: bool = False, compact_records: int = 1000):
+        self.data_dir = data_dir
+        self.users_file = os.path.join(data_dir, "users.json")
+        self.cards_file = os.path.join(data_dir, "cards.json")
+        self.journal_file = os.path.join(data_dir, JOURNAL_NAME)
+        # Journal being folded into a snapshot by the compactor
+        self.old_journal_file = self.journal_file + ".old"
+        self.fsync = fsync
+        self.compact_records = compact_records
+
+        self._lock = threading.RLock()
+        self._compacting = False
+        self._compactor = None
+
+        if not os.path.exists(data_dir):
+            os.makedirs(data_dir)
+        self._users = {user_id: User.from_dict(user) for user_id, user in self._load_json(self.users_file).items()}
+        # user_id -> card_id -> card
+        self._cards = {
+            user_id: index_cards(cards_from_json(user_cards))
+            for user_id, user_cards in self._load_json(self.cards_file).items()
+        }
+        replayed = self._replay(self.old_journal_file) + self._replay(self.journal_file)
+        if replayed:
+            # Fold whatever survived the last run into the snapshot right away
+            self._write_snapshot(self._users, self._cards)
+            for path in (self.old_journal_file, self.journal_file):
+                if os.path.exists(path):
+                    os.remove(path)
+        self._journal = open(self.journal_file, 'a')
+        self._records = 0
+
+    @staticmethod
+    def _load_json(path: str) -> Dict:
+        if not os.path.exists(path):
+            return {}
+        with open(path, 'r') as f:
+            return json.load(f)
+
+    def _replay(self, path: str) -> int:
+        if not os.path.exists(path):
+            return 0
+        count = 0
+        with open(path, 'r') as f:
+            for line in f:
+                try:
+                    record = decode_record(json.loads(line))
+                except json.JSONDecodeError:
+                    # A torn last line from a crash mid-append; nothing follows it
+                    print(f"Skipping incomplete journal record in {path}")
+                    break
+                replay_record(self._users, self._cards, record)
+                count += 1
+        return count
+
+    def _write_snapshot(self, users: Dict, cards: Dict):
+        atomic_write_json(self.users_file, {user_id: user.to_dict() for user_id, user in users.items()})
+        atomic_write_json(self.cards_file, {user_id: cards_to_json(user_cards.values()) for user_id, user_cards in cards.items()})
+
+    def _append(self, record: Dict):
+        """Apply a record in memory and append it to the journal. Caller holds the lock."""
+        replay_record(self._users, self._cards, record)
+        self._journal.write(json.dumps(encode_record(record), separators=(",", ":")) + "\n")
+        self._journal.flush()
+        if self.fsync:
+            os.fsync(self._journal.fileno())
+        self._records += 1
+        if self._records >= self.compact_records and not self._compacting:
+            self._start_compaction()
+
+    def _start_compaction(self):
+        """Rotate the journal and write a snapshot in a background thread. Caller holds the lock."""
+        self._compacting = True
+        self._journal.close()
+        if os.path.exists(self.old_journal_file):
+            # An earlier compaction failed and its journal was never folded
+            # into a snapshot. Append to it instead of replacing it; the
+            # snapshot below covers the records of both.
+            with open(self.journal_file, 'rb') as src, open(self.old_journal_file, 'ab') as dst:
+                shutil.copyfileobj(src, dst)
+                dst.flush()
+                os.fsync(dst.fileno())
+            os.remove(self.journal_file)
+        else:
+            os.replace(self.journal_file, self.old_journal_file)
+        self._journal = open(self.journal_file, 'a')
+        self._records = 0
+        # Records replace cards and users instead of modifying them, so shallow
+        # copies are a consistent view of the data at this point in the journal.
+        users = dict(self._users)
+        cards = {user_id: dict(user_cards) for user_id, user_cards in self._cards.items()}
+        self._compactor = threading.Thread(
+            target=self._compact, args=(users, cards), name="wal-compactor", daemon=True
+        )
+        self._compactor.start()
+
+    def _compact(self, users: Dict, cards: Dict):
+        try:
+            self._write_snapshot(users, cards)
+            os.remove(self.old_journal_file)
+        except Exception as e:
+            # The old journal stays and is replayed on next startup
+            print(f"Journal compaction failed: {e}")
+        finally:
+            with self._lock:
+                self._compacting = False
+
+    def load_user(self, user_id: int) -> Optional[User]:
+        with self._lock:
+            return self._users.get(str(user_id))
+
+    def save_user(self, user_id: int, user: User):
+        with self._lock:
+            self._append({"op": OP_USER, "u": user_id, "d": user})
+
+    def get_user_cards(self, user_id: int) -> List[Card]:
+        with self._lock:
+            return list(self._cards.get(str(user_id), {}).values())
+
+    def count_user_cards(self, user_id: int) -> int:
+        with self._lock:
+            return len(self._cards.get(str(user_id), {}))
+
+    def get_card(self, user_id: int, card_id: int) -> Optional[Card]:
+        with self._lock:
+            return self._cards.get(str(user_id), {}).get(card_id)
+
+    def get_cards(self, user_id: int, card_ids: List[int]) -> List[Card]:
+        with self._lock:
+            cards = self._cards.get(str(user_id), {})
+            return [cards[card_id] for card_id in card_ids if card_id in cards]
+
+    def browse_cards(self, user_id: int, gadget_type: str, rarity: str, sort: str,
+                     cursor_id: Optional[int] = None, backward: bool = False, limit: int = 20) -> Page:
+        with self._lock:
+            cards = self._cards.get(str(user_id)) or CardMap()
+            return cards.browse(gadget_type, rarity, sort, cursor_id, backward, limit)
+
+    def get_summary(self, user_id: int) -> CollectionSummary:
+        with self._lock:
+            return (self._cards.get(str(user_id)) or CardMap()).summary()
+
+    def insert_card(self, user_id: int, card: Card):
+        with self._lock:
+            self._append({"op": OP_ADD, "u": user_id, "c": card})
+
+    def update_card(self, user_id: int, card_id: int, fields: Dict) -> bool:
+        with self._lock:
+            if card_id not in self._cards.get(str(user_id), {}):
+                return False
+            self._append({"op": OP_UPDATE, "u": user_id, "id": card_id, "f": fields})
+            return True
+
+    def delete_card(self, user_id: int, card_id: int) -> bool:
+        with self._lock:
+            if card_id not in self._cards.get(str(user_id), {}):
+                return False
+            self._append({"op": OP_DELETE, "u": user_id, "id": card_id})
+            return True
+
+    def write_users(self, batch: Dict[int, Tuple[Optional[User], List[Card]]]):
+        with self._lock:
+            for user_id, (user, cards) in batch.items():
+                self._append({"op": OP_PUT, "u": user_id, "d": user, "c": list(cards)})
+
+    def apply(self, user_id: int, records: List[Dict]):
+        with self._lock:
+            self._append({"op": OP_BATCH, "u": user_id, "r": records})
+
+    def close(self):
+        with self._lock:
+            compactor = self._compactor
+        if compactor is not None:
+            compactor.join()
+        with self._lock:
+            self._journal.close()